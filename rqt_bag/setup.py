@@ -6,7 +6,7 @@ from catkin_pkg.python_setup import generate_distutils_setup
 d = generate_distutils_setup(
     packages=['rqt_bag', 'rqt_bag.plugins'],
     package_dir={'': 'src'},
-    scripts=['scripts/rqt_bag']
+    scripts=['scripts/rqt_bag', 'scripts/rqt_bag_benchmark']
 )
 
 setup(**d)
@@ -31,6 +31,7 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 from rqt_bag import bag_helper
+from rqt_bag.lazy_message               import LazyMessage
 from rqt_bag.plugins.message_view       import MessageView
 from rqt_bag.plugins.topic_message_view import TopicMessageView
 from rqt_bag.plugins.timeline_renderer  import TimelineRenderer
@@ -32,7 +32,6 @@
 
 import os
 import argparse
-import threading
 
 from qt_gui.plugin import Plugin
 
@@ -56,12 +55,8 @@ class Bag(Plugin):
             self._widget.setWindowTitle(self._widget.windowTitle() + (' (%d)' % context.serial_number()))
         context.add_widget(self._widget)
 
-        def load_bags():
-            for bagfile in args.bagfiles:
-                self._widget.load_bag(bagfile)
-        
-        load_thread = threading.Thread(target=load_bags)
-        load_thread.start()
+        # the bags are loaded in the background
+        self._widget.load_bags(args.bagfiles)
 
     def _parse_args(self, argv):
         parser = argparse.ArgumentParser(prog='rqt_bag', add_help=False)
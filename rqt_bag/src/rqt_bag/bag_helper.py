@@ -35,6 +35,7 @@ Helper functions for bag files and timestamps.
 """
 
 import math
+import os
 import time
 import rospy
 
@@ -73,9 +74,13 @@ def get_start_stamp(bag):
     @rtype:  rospy.Time
     """
     start_stamp = None
-    for connection_start_stamp in [index[0].time for index in bag._connection_indexes.values()]:
+    for connection_start_stamp in [index[0].time for index in bag._connection_indexes.values() if index]:
         if not start_stamp or connection_start_stamp < start_stamp:
             start_stamp = connection_start_stamp
+    # While its index is being read, the time range of a bag is known from its chunks
+    for chunk_info in getattr(bag, '_chunks', []):
+        if not start_stamp or chunk_info.start_time < start_stamp:
+            start_stamp = chunk_info.start_time
     return start_stamp
 
 
@@ -89,9 +94,13 @@ def get_end_stamp(bag):
     @rtype:  rospy.Time
     """
     end_stamp = None
-    for connection_end_stamp in [index[-1].time for index in bag._connection_indexes.values()]:
+    for connection_end_stamp in [index[-1].time for index in bag._connection_indexes.values() if index]:
         if not end_stamp or connection_end_stamp > end_stamp:
             end_stamp = connection_end_stamp
+    # While its index is being read, the time range of a bag is known from its chunks
+    for chunk_info in getattr(bag, '_chunks', []):
+        if not end_stamp or chunk_info.end_time > end_stamp:
+            end_stamp = chunk_info.end_time
 
     return end_stamp
 
@@ -127,6 +136,20 @@ def get_datatype(bag, topic):
     return None
 
 
+def get_file_size(bag):
+    """
+    Get the size of the bag file, also when the file is closed.
+
+    @param bag: bag file
+    @type  bag: rosbag.Bag
+    @return: size in bytes
+    @rtype:  int
+    """
+    if bag._file is not None and not bag._file.closed:
+        return bag.size
+    return os.path.getsize(bag.filename)
+
+
 def filesize_to_str(size):
     size_name = ('B', 'KB', 'MB', 'GB', 'TB', 'PB', 'EB', 'ZB', 'YB')
     i = int(math.floor(math.log(size, 1024)))
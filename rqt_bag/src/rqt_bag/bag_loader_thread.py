@@ -0,0 +1,221 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Opens bags in the background.
+"""
+
+import threading
+import time
+
+import rosbag
+from rosbag.bag import _skip_record
+
+from python_qt_binding.QtCore import qWarning
+
+
+class BagLoaderThread(threading.Thread):
+    """
+    Opens bags and reads their index, reindexing the ones that aren't indexed.
+
+    A bag is added to the timeline as soon as its connections and chunks are known, the timeline is then updated
+    while the rest of the index is read. In lazy mode only the connections and chunks of indexed bags are read, the
+    timeline reads the index of a bag when it is first needed.
+    The bags of one thread are loaded one after the other.
+    """
+    def __init__(self, timeline, filenames, listener=None, update_interval=0.25, lazy=False):
+        """
+        :param timeline: timeline to add the bags to, ''BagTimeline''
+        :param filenames: paths of the bags, ''list(str)''
+        :param listener: gets bag_opened(bag), bag_progress(bag, fraction), bag_loaded(bag) and bag_failed(filename,
+                         message) calls from this thread, ''object''
+        :param update_interval: secs between updates of the timeline while the index is read, ''float''
+        :param lazy: add the indexed bags without reading their index, ''bool''
+        """
+        threading.Thread.__init__(self)
+
+        self.timeline = timeline
+        if not isinstance(filenames, (list, tuple)):
+            filenames = [filenames]
+        self.filenames = list(filenames)
+        self.filename = None
+        self.listener = listener
+        self.update_interval = update_interval
+        self.lazy = lazy
+
+        self._stop_flag = False
+
+        self.setDaemon(True)
+        self.start()
+
+    def run(self):
+        for filename in self.filenames:
+            if self._stop_flag:
+                return
+            self.filename = filename
+            self._load(filename)
+
+    def _load(self, filename):
+        try:
+            bag = rosbag.Bag(filename, skip_index=True, allow_unindexed=True)
+        except Exception as ex:
+            self._failed('Error opening %s: %s' % (filename, str(ex)))
+            return
+
+        index_deferred = False
+        try:
+            if bag.version != 200:
+                # the index of older bag formats is read when opening them
+                self._add_bag(bag)
+            elif bag._index_data_pos == 0:
+                self._reindex(bag)
+            elif self.lazy:
+                index_deferred = True
+                if not self._stop_flag:
+                    self.timeline.add_lazy_bag(bag)
+                    if self.listener:
+                        self.listener.bag_opened(bag)
+            else:
+                self._read_index(bag)
+        except Exception as ex:
+            self._failed('Error loading %s: %s' % (filename, str(ex)))
+            return
+
+        if self._stop_flag:
+            if bag not in self.timeline._bags:
+                bag.close()
+            return
+        if index_deferred:
+            return
+        self.timeline.bag_loaded(bag)
+        if self.listener:
+            self.listener.bag_loaded(bag)
+
+    def _read_index(self, bag):
+        """
+        Reads the connection index records of the chunks one chunk at a time, like rosbag does when not skipping them.
+        """
+        self._add_bag(bag)
+
+        chunk_count = len(bag._chunks)
+        last_update = time.time()
+        for chunk_num, chunk_info in enumerate(bag._chunks):
+            if self._stop_flag:
+                return
+            with self.timeline._bag_lock:
+                self.timeline._bag_pool.acquire(bag)
+                read_chunk_index(bag, chunk_info)
+            last_update = self._progress(bag, float(chunk_num + 1) / chunk_count, last_update)
+
+        with self.timeline._bag_lock:
+            finish_index(bag)
+
+    def _reindex(self, bag):
+        """
+        Rebuilds the index of an unindexed bag, e.g. one that wasn't closed, one chunk at a time.
+        """
+        qWarning('Reindexing %s' % bag.filename)
+        reindex = bag.reindex()
+        bag_added = False
+        last_update = time.time()
+        while not self._stop_flag:
+            with self.timeline._bag_lock:
+                try:
+                    offset = next(reindex)
+                except StopIteration:
+                    break
+                except Exception as ex:
+                    # a truncated last chunk can't be read; the messages before it can
+                    qWarning('Error reindexing %s: %s' % (bag.filename, str(ex)))
+                    break
+            if not bag_added and any(bag._connection_indexes.values()):
+                self._add_bag(bag)
+                bag_added = True
+            if bag_added:
+                last_update = self._progress(bag, float(offset) / max(1, bag.size), last_update)
+
+        if not bag_added and not self._stop_flag:
+            self._add_bag(bag)
+
+    def _add_bag(self, bag):
+        if self._stop_flag:
+            return
+        self.timeline.add_bag(bag, loaded=False)
+        if self.listener:
+            self.listener.bag_opened(bag)
+
+    def _progress(self, bag, fraction, last_update):
+        """
+        :returns: time of the last update of the timeline, ''float''
+        """
+        now = time.time()
+        if now - last_update < self.update_interval:
+            return last_update
+        self.timeline.bag_index_updated(bag)
+        if self.listener:
+            self.listener.bag_progress(bag, fraction)
+        return now
+
+    def _failed(self, message):
+        qWarning(message)
+        if self.listener:
+            self.listener.bag_failed(self.filename, message)
+
+    def stop(self):
+        self._stop_flag = True
+
+
+def read_chunk_index(bag, chunk_info):
+    """
+    Reads the connection index records following a chunk, like rosbag does when not skipping them.
+    The caller must hold the lock of the bag.
+    :param bag: bag format 2.0 bag opened with skip_index, ''rosbag.Bag''
+    :param chunk_info: the chunk, ''ChunkInfo''
+    """
+    # the index entries are made with the position of the current chunk
+    bag._curr_chunk_info = chunk_info
+    bag._file.seek(chunk_info.pos)
+    _skip_record(bag._file)
+    for _ in range(len(chunk_info.connection_counts)):
+        connection_id, index = bag._reader.read_connection_index_record()
+        bag._connection_indexes[connection_id].extend(index)
+
+
+def finish_index(bag):
+    """
+    Removes any connections without entries, like rosbag does, once all the chunk indexes are read.
+    The caller must hold the lock of the bag.
+    """
+    for connection_id in [c_id for c_id, index in bag._connection_indexes.items() if not index]:
+        del bag._connections[connection_id]
+        del bag._connection_indexes[connection_id]
+    bag._connection_indexes_read = True
@@ -0,0 +1,126 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Bounded pool of open bag files.
+"""
+
+from collections import OrderedDict
+
+
+class BagFilePool(object):
+    """
+    Keeps at most max_open_files of the bags opened for reading open, closing the least recently used one when
+    another one is opened.
+
+    A closed bag keeps its connections, chunks and index, only its file is closed. The file is opened again by
+    acquire() when a message is read from it. The pool doesn't lock, callers must hold the lock of the bags.
+    """
+    def __init__(self, max_open_files=64, on_close=None):
+        """
+        :param max_open_files: number of bag files to keep open, ''int''
+        :param on_close: called with a bag after its file was closed, ''function''
+        """
+        self.max_open_files = max_open_files
+        self.on_close = on_close
+        self._open_bags = OrderedDict()  # id(bag) -> bag, least recently used first
+        self._bags = {}  # id(bag) -> bag
+        self.opened_count = 0
+        self.closed_count = 0
+
+    def add(self, bag):
+        """
+        Puts a bag opened for reading in the pool. Bags opened for writing aren't pooled.
+        :param bag: bag to add, ''rosbag.Bag''
+        """
+        if bag.mode != 'r':
+            return
+        self._bags[id(bag)] = bag
+        if _is_open(bag):
+            self._open_bags[id(bag)] = bag
+            self._close_unused()
+
+    def remove(self, bag):
+        self._bags.pop(id(bag), None)
+        self._open_bags.pop(id(bag), None)
+
+    def acquire(self, bag):
+        """
+        Makes sure the file of the bag is open, opening it again if it was closed by the pool.
+        :param bag: bag to read from, ''rosbag.Bag''
+        """
+        if id(bag) not in self._bags:
+            return
+        if id(bag) in self._open_bags:
+            if _is_open(bag):
+                # move to the most recently used end
+                del self._open_bags[id(bag)]
+                self._open_bags[id(bag)] = bag
+                return
+            del self._open_bags[id(bag)]
+
+        bag._file = open(bag.filename, 'rb')
+        self.opened_count += 1
+        self._open_bags[id(bag)] = bag
+        self._close_unused()
+
+    def is_open(self, bag):
+        return id(bag) in self._open_bags and _is_open(bag)
+
+    def get_open_count(self):
+        return len(self._open_bags)
+
+    def get_statistics(self):
+        """
+        :returns: number of pooled bags, of open files and how many times files were opened and closed, ''dict''
+        """
+        return {
+            'bags': len(self._bags),
+            'open_files': len(self._open_bags),
+            'max_open_files': self.max_open_files,
+            'opened': self.opened_count,
+            'closed': self.closed_count,
+        }
+
+    def _close_unused(self):
+        while len(self._open_bags) > max(1, self.max_open_files):
+            _, bag = self._open_bags.popitem(last=False)
+            if _is_open(bag):
+                bag._file.close()
+                self.closed_count += 1
+            if self.on_close:
+                self.on_close(bag)
+
+
+def _is_open(bag):
+    return bag._file is not None and not bag._file.closed
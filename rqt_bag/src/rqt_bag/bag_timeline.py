@@ -32,21 +32,30 @@
 
 import rospy
 import rosbag
+import itertools
 import time
 import threading
 
 
 from python_qt_binding.QtCore import Qt, QTimer, qWarning, Signal
-from python_qt_binding.QtWidgets import QGraphicsScene, QMessageBox
+from python_qt_binding.QtWidgets import QDockWidget, QGraphicsScene, QMessageBox
 
 from rqt_bag import bag_helper
 
+from .bag_loader_thread import finish_index, read_chunk_index
+from .bag_pool import BagFilePool
+from .chunk_cache import get_chunk_cache
+from .diagnostics import DiagnosticsWidget, InstrumentedLock, get_list_bytes, get_thread_statistics, get_total_bytes
+from .mmap_reader import open_mmap_reader
 from .timeline_frame import TimelineFrame
 from .message_listener_thread import MessageListenerThread
 from .message_loader_thread import MessageLoaderThread
+from .message_search import MessagePredicate, MessageSearchThread
 from .player import Player
 from .recorder import Recorder
+from .stamp_index import StampIndex
 from .timeline_menu import TimelinePopupMenu
+from .update_coordinator import UpdateCoordinator
 
 
 class BagTimeline(QGraphicsScene):
@@ -63,7 +72,13 @@ class BagTimeline(QGraphicsScene):
         """
         super(BagTimeline, self).__init__()
         self._bags = []
-        self._bag_lock = threading.RLock()
+        self._bag_lock = InstrumentedLock()  # an RLock measuring the time threads wait for it
+        self.use_mmap = True  # read uncompressed chunks from memory mapped bags
+        self._mmap_readers = {}  # id(bag) -> MmapBagReader or None
+        # Keeps the number of open files bounded when many bags are loaded, a bag that is memory mapped uses two
+        self._bag_pool = BagFilePool(on_close=self._bag_file_closed)
+        self._lazy_bags = set()  # bags of which only the connections and chunks have been read
+        self._stamp_index = StampIndex()  # the stamps of all bags, for stepping to the next and previous message
 
         self.background_task = None  # Display string
         self.background_task_cancel = False
@@ -97,11 +112,13 @@ class BagTimeline(QGraphicsScene):
         self.popups = {}
         self._views = []
         self._listeners = {}
+        self._diagnostics_widget = None
 
         # Initialize scene
         # the timeline renderer fixes use of black pens and fills, so ensure we fix white here for contrast.
         # otherwise a dark qt theme will default it to black and the frame render pen will be unreadable
         self.setBackgroundBrush(Qt.white)
+        self._update_coordinator = UpdateCoordinator(self)
         self._timeline_frame = TimelineFrame(self)
         self._timeline_frame.setPos(0, 0)
         self.addItem(self._timeline_frame)
@@ -124,6 +141,7 @@ class BagTimeline(QGraphicsScene):
         else:
             self.__closed = True
         self._play_timer.stop()
+        self._update_coordinator.stop()
         for topic in self._get_topics():
             self.stop_publishing(topic)
             self._message_loaders[topic].stop()
@@ -134,50 +152,163 @@ class BagTimeline(QGraphicsScene):
         if self.background_task is not None:
             self.background_task_cancel = True
         self._timeline_frame.handle_close()
+        with self._bag_lock:
+            for mmap_reader in self._mmap_readers.values():
+                if mmap_reader is not None:
+                    mmap_reader.close()
+            self._mmap_readers.clear()
+            for bag in self._bags:
+                self._bag_pool.remove(bag)
+            self._stamp_index.clear()
         for bag in self._bags:
             bag.close()
         for frame in self._views:
             if frame.parent():
                 self._context.remove_widget(frame)
+        if self._diagnostics_widget is not None and self._diagnostics_widget.parent():
+            self._context.remove_widget(self._diagnostics_widget)
 
     # Bag Management and access
-    def add_bag(self, bag):
+    def add_bag(self, bag, loaded=True):
         """
         creates an indexing thread for each new topic in the bag
         fixes the boarders and notifies the indexing thread to index the new items bags
         :param bag: ros bag file, ''rosbag.bag''
+        :param loaded: False if the index of the bag is still being read, bag_loaded() is called when it is, ''bool''
         """
-        self._bags.append(bag)
+        with self._bag_lock:
+            self._bags.append(bag)
 
-        bag_topics = bag_helper.get_topics(bag)
+        self._update_bag(bag)
 
-        new_topics = set(bag_topics) - set(self._timeline_frame.topics)
+        if loaded:
+            self._notify_renderers(bag)
 
-        for topic in new_topics:
-            self._playhead_positions_cvs[topic] = threading.Condition()
-            self._messages_cvs[topic] = threading.Condition()
-            self._message_loaders[topic] = MessageLoaderThread(self, topic)
+    def bag_index_updated(self, bag):
+        """
+        Updates the timeline while the index of a bag is being read
+        :param bag: ros bag file, ''rosbag.bag''
+        """
+        self._update_bag(bag, keep_index_cache=True)
+        self.request_update()
 
-        self._timeline_frame._start_stamp = self._get_start_stamp()
-        self._timeline_frame._end_stamp = self._get_end_stamp()
-        self._timeline_frame.topics = self._get_topics()
-        self._timeline_frame._topics_by_datatype = self._get_topics_by_datatype()
-        # If this is the first bag, reset the timeline
-        if self._timeline_frame._stamp_left is None:
+    def bag_loaded(self, bag):
+        """
+        Updates the timeline once the whole index of a bag has been read
+        :param bag: ros bag file, ''rosbag.bag''
+        """
+        with self._bag_lock:
+            self._bag_pool.add(bag)
+        self._update_bag(bag)
+        self.request_update()
+        self._notify_renderers(bag)
+
+    def add_lazy_bag(self, bag):
+        """
+        Adds a bag of which only the connections and chunks have been read, its index is read the first time entries
+        in its time range are needed. The file of the bag is closed until then.
+        :param bag: ros bag file in bag format 2.0 opened with skip_index, ''rosbag.bag''
+        """
+        with self._bag_lock:
+            self._bags.append(bag)
+            if bag._chunks:
+                self._lazy_bags.add(bag)
+            self._bag_pool.add(bag)
+            if bag._file is not None:
+                bag._file.close()
+
+        self._update_bag(bag, keep_index_cache=True)
+        self.request_update()
+
+    def _get_lazy_bags(self, start_stamp=None, end_stamp=None):
+        """
+        :returns: the bags without an index overlapping the time range, ''list(rosbag.bag)''
+        """
+        with self._bag_lock:
+            if not self._lazy_bags:
+                return []
+            return [bag for bag in self._bags if bag in self._lazy_bags and
+                    (end_stamp is None or bag_helper.get_start_stamp(bag) <= end_stamp) and
+                    (start_stamp is None or bag_helper.get_end_stamp(bag) >= start_stamp)]
+
+    def _load_lazy_bags(self, bags):
+        """
+        Reads the index of bags added with add_lazy_bag. The lock is held while reading the index of one bag.
+        :param bags: ros bag files, ''list(rosbag.bag)''
+        """
+        for bag in bags:
+            with self._bag_lock:
+                if bag not in self._lazy_bags:
+                    continue
+                try:
+                    self._bag_pool.acquire(bag)
+                    for chunk_info in bag._chunks:
+                        read_chunk_index(bag, chunk_info)
+                    finish_index(bag)
+                except Exception as ex:
+                    qWarning('Error reading the index of %s: %s' % (bag.filename, str(ex)))
+                    for index in bag._connection_indexes.values():
+                        del index[:]
+                self._lazy_bags.discard(bag)
+
+            self._update_bag(bag, keep_index_cache=True)
+            self.request_update()
+            self._notify_renderers(bag)
+
+    def _bag_file_closed(self, bag):
+        """
+        Called by the bag pool, with the lock held, after closing the file of a bag.
+        """
+        mmap_reader = self._mmap_readers.pop(id(bag), None)
+        if mmap_reader is not None:
+            mmap_reader.close()
+
+    def _notify_renderers(self, bag):
+        for renderer in self._timeline_frame._timeline_renderers.values():
+            renderer.bag_added(bag)
+
+    def _update_bag(self, bag, keep_index_cache=False):
+        """
+        :param keep_index_cache: extend the index cache of the bag's topics instead of rebuilding it, ''bool''
+        """
+        # Bags can be loaded by several threads at once
+        with self._bag_lock:
+            self._stamp_index.update(bag)
+            bag_topics = bag_helper.get_topics(bag)
+
+            new_topics = set(bag_topics) - set(self._timeline_frame.topics)
+
+            for topic in new_topics:
+                self._playhead_positions_cvs[topic] = threading.Condition()
+                self._messages_cvs[topic] = threading.Condition()
+                self._message_loaders[topic] = MessageLoaderThread(self, topic)
+
+            self._timeline_frame._start_stamp = self._get_start_stamp()
+            self._timeline_frame._end_stamp = self._get_end_stamp()
+            self._timeline_frame.topics = self._get_topics()
+            self._timeline_frame._topics_by_datatype = self._get_topics_by_datatype()
+            first_bag = self._timeline_frame._stamp_left is None
+
+        # If this is the first bag, reset the timeline. Not with the lock held: moving the playhead may read the index
+        # of a lazy bag, which updates the index cache below.
+        if first_bag:
             self._timeline_frame.reset_timeline()
 
+        # The message sizes shown as bandwidths are gathered again when bags change, rather than checked on each paint
+        self._timeline_frame._density.bags_updated()
+
         # Invalidate entire index cache for all topics in this bag
         with self._timeline_frame.index_cache_cv:
             for topic in bag_topics:
                 self._timeline_frame.invalidated_caches.add(topic)
-                if topic in self._timeline_frame.index_cache:
+                if topic in self._timeline_frame.index_cache and not keep_index_cache:
                     del self._timeline_frame.index_cache[topic]
 
             self._timeline_frame.index_cache_cv.notify()
 
     def file_size(self):
         with self._bag_lock:
-            return sum(b.size for b in self._bags)
+            return sum(bag_helper.get_file_size(b) for b in self._bags)
 
     #TODO Rethink API and if these need to be visible
     def _get_start_stamp(self):
@@ -249,6 +380,7 @@ class BagTimeline(QGraphicsScene):
         :param end_stamp: stamp to end at, ''rospy,Time''
         :returns: entries the bag file, ''msg''
         """
+        self._load_lazy_bags(self._get_lazy_bags(start_stamp, end_stamp))
         with self._bag_lock:
             from rosbag import bag  # for _mergesort
             bag_entries = []
@@ -275,6 +407,7 @@ class BagTimeline(QGraphicsScene):
         :param end_stamp: stamp to end at, ''rospy,Time''
         :returns: tuple of (bag, entry) for the entries in the bag file, ''(rosbag.bag, msg)''
         """
+        self._load_lazy_bags(self._get_lazy_bags(start_stamp, end_stamp))
         with self._bag_lock:
             from rosbag import bag  # for _mergesort
 
@@ -304,14 +437,20 @@ class BagTimeline(QGraphicsScene):
         :param topic: the topic to be accessed, ''str''
         :return: tuple of (bag, entry) corisponding to time t and topic, ''(rosbag.bag, msg)''
         """
-        with self._bag_lock:
-            entry_bag, entry = None, None
-            for bag in self._bags:
-                bag_entry = bag._get_entry(t, bag._get_connections(topic))
-                if bag_entry and (not entry or bag_entry.time > entry.time):
-                    entry_bag, entry = bag, bag_entry
-
-            return entry_bag, entry
+        self._load_lazy_bags(self._get_lazy_bags(t, t))
+        while True:
+            with self._bag_lock:
+                entry_bag, entry = None, None
+                for bag in self._bags:
+                    bag_entry = bag._get_entry(t, bag._get_connections(topic))
+                    if bag_entry and (not entry or bag_entry.time > entry.time):
+                        entry_bag, entry = bag, bag_entry
+
+            # An earlier bag without an index may have a later entry
+            lazy_bags = self._get_lazy_bags(entry.time if entry else None, t)
+            if not lazy_bags:
+                return entry_bag, entry
+            self._load_lazy_bags([max(lazy_bags, key=bag_helper.get_end_stamp)])
 
     def get_entry_before(self, t):
         """
@@ -319,14 +458,16 @@ class BagTimeline(QGraphicsScene):
         :param t: time, ''rospy.Time''
         :return: tuple of (bag, entry) corresponding to time t, ''(rosbag.bag, msg)''
         """
-        with self._bag_lock:
-            entry_bag, entry = None, None
-            for bag in self._bags:
-                bag_entry = bag._get_entry(t-rospy.Duration(0,1), bag._get_connections())
-                if bag_entry and (not entry or bag_entry.time < entry.time):
-                    entry_bag, entry = bag, bag_entry
+        self._load_lazy_bags(self._get_lazy_bags(t, t))
+        while True:
+            with self._bag_lock:
+                entry_bag, entry = self._stamp_index.get_entry_before(t)
 
-            return entry_bag, entry
+            # An earlier bag without an index may have a later entry
+            lazy_bags = self._get_lazy_bags(entry.time if entry else None, t)
+            if not lazy_bags:
+                return entry_bag, entry
+            self._load_lazy_bags([max(lazy_bags, key=bag_helper.get_end_stamp)])
 
     def get_entry_after(self, t):
         """
@@ -334,14 +475,16 @@ class BagTimeline(QGraphicsScene):
         :param t: time, ''rospy.Time''
         :return: tuple of (bag, entry) corisponding to time t, ''(rosbag.bag, msg)''
         """
-        with self._bag_lock:
-            entry_bag, entry = None, None
-            for bag in self._bags:
-                bag_entry = bag._get_entry_after(t, bag._get_connections())
-                if bag_entry and (not entry or bag_entry.time < entry.time):
-                    entry_bag, entry = bag, bag_entry
+        self._load_lazy_bags(self._get_lazy_bags(t, t))
+        while True:
+            with self._bag_lock:
+                entry_bag, entry = self._stamp_index.get_entry_after(t)
 
-            return entry_bag, entry
+            # A later bag without an index may have an earlier entry
+            lazy_bags = self._get_lazy_bags(t, entry.time if entry else None)
+            if not lazy_bags:
+                return entry_bag, entry
+            self._load_lazy_bags([min(lazy_bags, key=bag_helper.get_start_stamp)])
 
     def get_next_message_time(self):
         """
@@ -391,6 +534,32 @@ class BagTimeline(QGraphicsScene):
     def stop_background_task(self):
         self.background_task = None
 
+    def cancel_background_task(self):
+        if self.background_task is not None:
+            self.background_task_cancel = True
+
+    ### Search
+
+    def search_messages(self, topic, predicate, start_stamp=None, end_stamp=None, processes=None):
+        """
+        Starts searching the messages of a topic in worker processes, the stamps of the matching messages are added
+        to the timeline as search markers while the search runs.
+        :param topic: topic to search, ''str''
+        :param predicate: field, operator and value, e.g. "linear.x > 2", ''str''
+        :param start_stamp: start of the range to search, the start of the play region by default, ''rospy.Time''
+        :param end_stamp: end of the range to search, the end of the play region by default, ''rospy.Time''
+        :param processes: number of worker processes, the number of CPUs by default, ''int''
+        :returns: the search thread or None if another background task is running, ''MessageSearchThread''
+        :raises: if the predicate can't be parsed, ''ValueError''
+        """
+        predicate = MessagePredicate(predicate)
+        if start_stamp is None or end_stamp is None:
+            start_stamp, end_stamp = self._timeline_frame.play_region
+        if not self.start_background_task('Searching %s for %s' % (topic, predicate)):
+            return None
+        self._timeline_frame.clear_search_markers(topic)
+        return MessageSearchThread(self, topic, predicate, start_stamp, end_stamp, processes)
+
     def copy_region_to_bag(self, filename):
         if len(self._bags) > 0:
             self._export_region(filename, self._timeline_frame.topics, self._timeline_frame.play_region[0], self._timeline_frame.play_region[1])
@@ -463,22 +632,121 @@ class BagTimeline(QGraphicsScene):
                     progress = new_progress
                     if not self.background_task_cancel:
                         self.background_progress = progress
-                        self.status_bar_changed_signal.emit()
+                        self.request_status_update()
 
             message_num += 1
 
         # Close the bag
         try:
             self.background_progress = 0
-            self.status_bar_changed_signal.emit()
+            self.request_status_update()
             export_bag.close()
         except Exception as ex:
             QMessageBox(QMessageBox.Warning, 'rqt_bag', 'Error closing bag file [%s]: %s' % (export_bag.filename, str(ex)), QMessageBox.Ok).exec_()
         self.stop_background_task()
 
-    def read_message(self, bag, position):
+    ### Coalesced updates
+
+    def request_update(self, rect=None):
+        """
+        Requests a repaint of the scene, which is merged with other requests into at most one repaint per display frame.
+        Can be called from any thread.
+        :param rect: area of the scene to repaint, or None for the whole scene, ''QRectF''
+        """
+        self._update_coordinator.request_update(rect)
+
+    def request_status_update(self):
+        """
+        Requests status_bar_changed_signal, which is merged with other requests into at most one emission per display frame.
+        Can be called from any thread.
+        """
+        self._update_coordinator.request_status_update()
+
+    def get_update_statistics(self):
+        """
+        :returns: numbers of requested, performed and skipped repaints and status updates, ''dict''
+        """
+        return self._update_coordinator.get_statistics()
+
+    def read_message(self, bag, position, raw=False):
+        """
+        :param raw: if True, msg is (datatype, serialized message, md5sum, position, message class) like in rosbag, ''bool''
+        :returns: (topic, msg, t), ''(str, genpy.Message, rospy.Time)''
+        """
+        # Messages in uncompressed chunks are read from the memory mapped file, which doesn't need the lock
+        mmap_reader = self._get_mmap_reader(bag)
+        if mmap_reader is not None:
+            try:
+                msg_data = mmap_reader.read_message(position, raw)
+            except ValueError:
+                # the mapping was closed by the bag pool
+                msg_data = None
+            if msg_data is not None:
+                return msg_data
+
         with self._bag_lock:
-            return bag._read_message(position)
+            self._bag_pool.acquire(bag)
+            get_chunk_cache().prepare(bag, position)
+            return bag._read_message(position, raw)
+
+    def _get_mmap_reader(self, bag):
+        """
+        :returns: the reader of the memory mapped bag or None if the bag isn't mapped, ''MmapBagReader''
+        """
+        if not self.use_mmap:
+            return None
+        try:
+            return self._mmap_readers[id(bag)]
+        except KeyError:
+            with self._bag_lock:
+                if self.__closed:
+                    return None
+                if id(bag) not in self._mmap_readers:
+                    self._bag_pool.acquire(bag)
+                    self._mmap_readers[id(bag)] = open_mmap_reader(bag)
+                return self._mmap_readers[id(bag)]
+
+    def get_chunk_cache_statistics(self):
+        """
+        :returns: hit rate and decompression time saved by the decompressed chunk cache shared by all timelines, ''dict''
+        """
+        return get_chunk_cache().get_statistics()
+
+    def read_messages(self, bag_positions, raw=False):
+        """
+        generator function reading many messages in the order they are stored in the bag files, so that the reads are
+        sequential and each chunk is read and decompressed only once. The lock is only held while reading a chunk
+        through the bag.
+        :param bag_positions: (bag, position) of each message to read, ''list((rosbag.bag, position))''
+        :param raw: if True, msg is (datatype, serialized message, md5sum, position, message class) like in rosbag, ''bool''
+        :returns: tuples of (bag, position, (topic, msg, t)) in file order, ''generator''
+        """
+        ordered = sorted(bag_positions, key=lambda bag_position: (id(bag_position[0]), bag_position[1]))
+
+        for _, chunk_positions in itertools.groupby(ordered, key=lambda bag_position: (id(bag_position[0]), _get_chunk_pos(bag_position[1]))):
+            chunk_positions = list(chunk_positions)
+            chunk_messages = {}
+            mmap_reader = self._get_mmap_reader(chunk_positions[0][0])
+            if mmap_reader is not None:
+                try:
+                    for bag, position in chunk_positions:
+                        if position not in chunk_messages:
+                            chunk_messages[position] = mmap_reader.read_message(position, raw)
+                except ValueError:
+                    # the mapping was closed by the bag pool
+                    chunk_messages = {}
+                if None in chunk_messages.values():
+                    # compressed chunk
+                    chunk_messages = {}
+            if not chunk_messages:
+                with self._bag_lock:
+                    for bag, position in chunk_positions:
+                        if position not in chunk_messages:
+                            self._bag_pool.acquire(bag)
+                            get_chunk_cache().prepare(bag, position)
+                            chunk_messages[position] = bag._read_message(position, raw)
+            for bag, position in chunk_positions:
+                yield bag, position, chunk_messages[position]
 
     ### Mouse events
     def on_mouse_down(self, event):
@@ -694,6 +962,9 @@ class BagTimeline(QGraphicsScene):
             self.update()
 
     def _message_recorded(self, topic, msg, t):
+        with self._bag_lock:
+            self._stamp_index.update(self._recorder.bag)
+
         if self._timeline_frame._start_stamp is None:
             self._timeline_frame._start_stamp = t
             self._timeline_frame._end_stamp = t
@@ -724,6 +995,85 @@ class BagTimeline(QGraphicsScene):
                 except Exception as ex:
                     qWarning('Error calling timeline_changed on %s: %s' % (type(listener), str(ex)))
 
+    ### Diagnostics
+
+    def get_diagnostics(self):
+        """
+        Get the sizes of the caches and queues of the timeline per topic, of the caches of the renderers and views,
+        the number of threads and the time spent waiting for the bag lock. Sizes in bytes are estimates.
+        :returns: nested dict of sizes, ''dict''
+        """
+        frame = self._timeline_frame
+        topics = {}
+        for topic in list(frame.topics):
+            topic_cache = frame.index_cache.get(topic, [])
+            stamp_array = frame._stamp_arrays.get(topic)
+            topic_diagnostics = {
+                'index_cache': {
+                    'entries': len(topic_cache),
+                    'bytes': get_list_bytes(topic_cache),
+                    'array_bytes': stamp_array[1].nbytes if stamp_array else 0,
+                },
+                'search_markers': len(frame.search_markers.get(topic, [])),
+            }
+            message_loader = self._message_loaders.get(topic)
+            if message_loader is not None:
+                topic_diagnostics['message_cache'] = message_loader.get_statistics()
+            views = {}
+            for listener in list(self._listeners.get(topic, [])):
+                try:
+                    views[type(listener).__name__] = listener.get_statistics()
+                except Exception as ex:
+                    qWarning('Error calling get_statistics on %s: %s' % (type(listener), str(ex)))
+            if views:
+                topic_diagnostics['views'] = views
+            topics[topic] = topic_diagnostics
+
+        if self._recorder:
+            for topic, queue_size in self._recorder.get_queue_sizes().items():
+                topics.setdefault(topic, {})['recorder_queue'] = queue_size
+
+        renderers = {}
+        for renderer in set(frame._timeline_renderers.values()):
+            try:
+                renderers[type(renderer).__name__] = renderer.get_statistics()
+            except Exception as ex:
+                qWarning('Error calling get_statistics on %s: %s' % (type(renderer), str(ex)))
+
+        with self._bag_lock:
+            bags = {
+                'bags': len(self._bags),
+                'lazy_bags': len(self._lazy_bags),
+                'mmap_readers': len([reader for reader in self._mmap_readers.values() if reader is not None]),
+                'file_pool': self._bag_pool.get_statistics(),
+                'stamp_index': self._stamp_index.get_statistics(),
+            }
+
+        diagnostics = {
+            'topics': topics,
+            'renderers': renderers,
+            'bags': bags,
+            'chunk_cache': get_chunk_cache().get_statistics(),
+            'threads': get_thread_statistics(),
+            'bag_lock': self._bag_lock.get_statistics(),
+        }
+        diagnostics['total_bytes'] = get_total_bytes(diagnostics)
+        return diagnostics
+
+    def show_diagnostics(self):
+        """
+        Shows the diagnostics in a dockable panel.
+        """
+        if self._diagnostics_widget is None:
+            self._diagnostics_widget = DiagnosticsWidget(self)
+        if not self._diagnostics_widget.parent():
+            self._context.add_widget(self._diagnostics_widget)
+            # make the dock widget closable, even if it normally isn't
+            dock_features = self._diagnostics_widget.parent().features()
+            dock_features |= QDockWidget.DockWidgetClosable
+            self._diagnostics_widget.parent().setFeatures(dock_features)
+        self._diagnostics_widget.show()
+
     ### Views / listeners
     def add_view(self, topic, frame):
         self._views.append(frame)
@@ -832,3 +1182,13 @@ class BagTimeline(QGraphicsScene):
 
     def navigate_end(self):
         self._timeline_frame.playhead = self._timeline_frame.play_region[1]
+
+
+def _get_chunk_pos(position):
+    """
+    :returns: the position of the chunk of a message position, which is a (chunk position, offset) tuple in bag format
+              2.0 and a file offset in bag format 1.2 which has no chunks, ''int''
+    """
+    if isinstance(position, tuple):
+        return position[0]
+    return position
@@ -41,8 +41,8 @@ from python_qt_binding.QtCore import Qt, qWarning, Signal
 from python_qt_binding.QtGui import QIcon
 from python_qt_binding.QtWidgets import QFileDialog, QGraphicsView, QWidget
 
-import rosbag
 from rqt_bag import bag_helper
+from .bag_loader_thread import BagLoaderThread
 from .bag_timeline import BagTimeline
 from .topic_selection import TopicSelection
 
@@ -58,6 +58,7 @@ class BagWidget(QWidget):
     """
 
     set_status_text = Signal(str)
+    bag_opened_signal = Signal()
 
     def __init__(self, context, publish_clock):
         """
@@ -131,9 +132,12 @@ class BagWidget(QWidget):
         self.save_button.setEnabled(False)
 
         self._recording = False
+        self._bag_loaders = []
+        self.lazy_load_threshold = 16  # number of bags from which their indexes are read on demand
 
         self._timeline.status_bar_changed_signal.connect(self._update_status_bar)
         self.set_status_text.connect(self._set_status_text)
+        self.bag_opened_signal.connect(self._handle_bag_opened)
 
     def graphics_view_on_key_press(self, event):
         key = event.key()
@@ -259,11 +263,29 @@ class BagWidget(QWidget):
 
 
     def _handle_load_clicked(self):
-        filename = QFileDialog.getOpenFileName(self, self.tr('Load from File'), '.', self.tr('Bag files {.bag} (*.bag)'))
-        if filename[0] != '':
-            self.load_bag(filename[0])
+        filenames = QFileDialog.getOpenFileNames(self, self.tr('Load from File'), '.', self.tr('Bag files {.bag} (*.bag)'))
+        if filenames[0]:
+            self.load_bags(filenames[0])
+
+    def load_bags(self, filenames):
+        """
+        Opens the bags in the background, one after the other. When there are many, e.g. the files of a split
+        recording, only their connections and chunks are read and the timeline reads the index of a bag when it is
+        first needed.
+        """
+        if len(filenames) < self.lazy_load_threshold:
+            for filename in filenames:
+                self.load_bag(filename)
+            return
+
+        qWarning("Loading %d bags" % len(filenames))
+        self._bag_loaders.append(BagLoaderThread(self._timeline, filenames, self, lazy=True))
 
     def load_bag(self, filename):
+        """
+        Opens the bag in the background; the timeline shows it as soon as its connections are known and fills in
+        while its index is read.
+        """
         qWarning("Loading %s" % filename)
 
         # QProgressBar can EITHER: show text or show a bouncing loading bar,
@@ -276,7 +298,29 @@ class BagWidget(QWidget):
         #self.progress_bar.setFormat("Loading %s" % filename)
         #self.progress_bar.setTextVisible(True)
 
-        bag = rosbag.Bag(filename)
+        self._bag_loaders.append(BagLoaderThread(self._timeline, filename, self))
+
+    # Bag loader listener, called from the loader threads
+
+    def bag_opened(self, bag):
+        self.bag_opened_signal.emit()
+
+    def bag_progress(self, bag, fraction):
+        self.set_status_text.emit("Loading %s %d%%" % (bag.filename, int(100 * fraction)))
+
+    def bag_loaded(self, bag):
+        qWarning("Done loading %s" % bag.filename)
+        # put the progress bar back the way it was
+        self.set_status_text.emit("")
+        #self.progress_bar.setFormat(progress_format)
+        #self.progress_bar.setTextVisible(progress_text_visible) # causes a segfault :(
+        #self.progress_bar.setRange(0, 100)
+        # self clear loading filename
+
+    def bag_failed(self, filename, message):
+        self.set_status_text.emit(message)
+
+    def _handle_bag_opened(self):
         self.play_button.setEnabled(True)
         self.thumbs_button.setEnabled(True)
         self.zoom_in_button.setEnabled(True)
@@ -290,14 +334,6 @@ class BagWidget(QWidget):
         self.end_button.setEnabled(True)
         self.save_button.setEnabled(True)
         self.record_button.setEnabled(False)
-        self._timeline.add_bag(bag)
-        qWarning("Done loading %s" % filename )
-        # put the progress bar back the way it was
-        self.set_status_text.emit("")
-        #self.progress_bar.setFormat(progress_format)
-        #self.progress_bar.setTextVisible(progress_text_visible) # causes a segfault :(
-        #self.progress_bar.setRange(0, 100)
-        # self clear loading filename
 
     def _handle_save_clicked(self):
         filename = QFileDialog.getSaveFileName(self, self.tr('Save selected region to file...'), '.', self.tr('Bag files {.bag} (*.bag)'))
@@ -354,4 +390,6 @@ class BagWidget(QWidget):
     # Shutdown all members
 
     def shutdown_all(self):
+        for bag_loader in self._bag_loaders:
+            bag_loader.stop()
         self._timeline.handle_close()
@@ -0,0 +1,257 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Benchmarks for the core rqt_bag operations on synthetic bags.
+
+The bags are generated locally, so no ROS master is needed. The results are
+written as JSON so that they can be compared between versions, e.g.:
+
+    rqt_bag_benchmark --bags 4 --topics 10 --rate 100 --duration 60 --output results.json
+"""
+
+from __future__ import print_function
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import rosbag
+import rospy
+from std_msgs.msg import String
+
+from python_qt_binding.QtWidgets import QApplication
+
+
+class BenchmarkResults(object):
+    """
+    Collects the timings of the benchmarked operations.
+    """
+    def __init__(self, parameters):
+        self.parameters = parameters
+        self.results = {}
+
+    def add(self, name, seconds, count=1, **extra):
+        """
+        :param name: name of the operation, ''str''
+        :param seconds: total time the operation took, ''float''
+        :param count: number of times the operation was repeated in that time, ''int''
+        """
+        result = {
+            'seconds': seconds,
+            'count': count,
+            'seconds_per_op': seconds / count if count else None,
+        }
+        result.update(extra)
+        self.results[name] = result
+        print('%-28s %10.4fs  %8d ops  %12.1f us/op' % (name, seconds, count, 1e6 * seconds / max(1, count)))
+
+    def to_dict(self):
+        return {
+            'parameters': self.parameters,
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'time': time.time(),
+            'results': self.results,
+        }
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, sort_keys=True)
+
+
+def generate_bags(directory, bag_count, topic_count, rate, duration, payload, compression=rosbag.Compression.NONE):
+    """
+    Write synthetic bags with std_msgs/String messages.
+
+    The bags are consecutive in time, each covering duration secs, with topic_count topics published at rate Hz.
+
+    :returns: paths of the bags, ''list(str)''
+    """
+    msg = String(data='x' * payload)
+    start = 1000.0
+    period = 1.0 / rate
+    paths = []
+    for bag_index in range(bag_count):
+        path = os.path.join(directory, 'synthetic_%d.bag' % bag_index)
+        with rosbag.Bag(path, 'w', compression=compression) as bag:
+            bag_start = start + bag_index * duration
+            for message_index in range(int(duration * rate)):
+                stamp = rospy.Time.from_sec(bag_start + message_index * period)
+                for topic_index in range(topic_count):
+                    bag.write('/synthetic/topic_%d' % topic_index, msg, stamp)
+        paths.append(path)
+    return paths
+
+
+def _timed(function, *args):
+    start = time.time()
+    value = function(*args)
+    return time.time() - start, value
+
+
+def benchmark_timeline(results, paths, scrub_steps, export_path):
+    from .bag_timeline import BagTimeline
+    timeline = BagTimeline(None, False)
+    frame = timeline._timeline_frame
+    try:
+        # Opening
+        seconds, bags = _timed(lambda: [rosbag.Bag(path) for path in paths])
+        results.add('open_bags', seconds, len(bags))
+
+        # Indexing; the index cache thread is kept waiting while the caches are built here
+        start = time.time()
+        with frame.index_cache_cv:
+            for bag in bags:
+                timeline.add_bag(bag)
+            indexed = 0
+            for topic in frame.topics:
+                indexed += frame._update_index_cache(topic)
+        results.add('add_bag_indexing', time.time() - start, len(bags), messages=indexed)
+
+        # Scrubbing the playhead across the whole timeline
+        start_stamp, end_stamp = frame.start_stamp.to_sec(), frame.end_stamp.to_sec()
+        stamps = [rospy.Time.from_sec(start_stamp + (end_stamp - start_stamp) * i / float(scrub_steps)) for i in range(scrub_steps)]
+        random.Random(0).shuffle(stamps)
+        start = time.time()
+        for stamp in stamps:
+            frame.playhead = stamp
+        results.add('set_playhead_scrub', time.time() - start, len(stamps))
+
+        # Stepping through every message, as when playing all messages
+        start = time.time()
+        steps = 0
+        stamp = frame.start_stamp - rospy.Duration(0, 1)
+        while steps < 10 * scrub_steps:
+            _, entry = timeline.get_entry_after(stamp)
+            if entry is None:
+                break
+            stamp = entry.time
+            steps += 1
+        results.add('get_entry_after_steps', time.time() - start, steps)
+
+        # Merging entries of all bags
+        seconds, entries = _timed(lambda: list(timeline.get_entries(frame.topics, frame.start_stamp, frame.end_stamp)))
+        results.add('get_entries_merge', seconds, len(entries))
+
+        # Exporting everything to a new bag
+        timeline.start_background_task('Benchmark export')
+        bag_entries = list(timeline.get_entries_with_bags(frame.topics, frame.start_stamp, frame.end_stamp))
+        export_bag = rosbag.Bag(export_path, 'w')
+        seconds, _ = _timed(timeline._run_export_region, export_bag, frame.topics, frame.start_stamp, frame.end_stamp, bag_entries)
+        results.add('export_region', seconds, len(bag_entries), bytes=os.path.getsize(export_path))
+
+        # Reading random messages from many chunks, as when scrubbing with several views open
+        rng = random.Random(0)
+        bag_positions = [(bag, entry.position) for bag, entry in bag_entries]
+        sample = [rng.choice(bag_positions) for _ in range(min(len(bag_positions), 10 * scrub_steps))]
+        start_statistics = timeline.get_chunk_cache_statistics()
+        start = time.time()
+        for bag, position in sample:
+            timeline.read_message(bag, position)
+        statistics = timeline.get_chunk_cache_statistics()
+        results.add('read_message_random', time.time() - start, len(sample),
+                    chunk_cache_hits=statistics['hits'] - start_statistics['hits'],
+                    chunk_cache_misses=statistics['misses'] - start_statistics['misses'],
+                    chunk_cache_saved_secs=statistics['saved_secs'] - start_statistics['saved_secs'])
+    finally:
+        timeline.handle_close()
+
+
+def benchmark_timeline_cache(results, topic_count, item_count, max_cache_size, lookups):
+    from .timeline_cache import TimelineCache
+
+    def loader(topic, stamp, item_details):
+        return rospy.Time.from_sec(stamp), 'item %d' % item_details
+
+    cache = TimelineCache(loader, max_cache_size=max_cache_size)
+    try:
+        topics = ['/synthetic/topic_%d' % i for i in range(topic_count)]
+
+        start = time.time()
+        for topic in topics:
+            for i in range(item_count):
+                cache.enqueue((topic, float(i), 0.0, i))
+        cache.queue.join()
+        results.add('timeline_cache_load', time.time() - start, topic_count * item_count)
+
+        rng = random.Random(0)
+        hits = 0
+        start = time.time()
+        for _ in range(lookups):
+            if cache.get_item(rng.choice(topics), rng.uniform(0, item_count), 0.5) is not None:
+                hits += 1
+        results.add('timeline_cache_get_item', time.time() - start, lookups, hit_rate=hits / float(lookups))
+    finally:
+        cache.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='rqt_bag_benchmark', description='Benchmark rqt_bag on synthetic bags')
+    parser.add_argument('--bags', type=int, default=2, help='number of bags')
+    parser.add_argument('--topics', type=int, default=5, help='number of topics per bag')
+    parser.add_argument('--rate', type=float, default=100.0, help='messages per second per topic')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds covered by each bag')
+    parser.add_argument('--payload', type=int, default=100, help='bytes per message')
+    parser.add_argument('--compression', choices=[rosbag.Compression.NONE, rosbag.Compression.BZ2, rosbag.Compression.LZ4],
+                        default=rosbag.Compression.NONE, help='chunk compression of the generated bags')
+    parser.add_argument('--scrub-steps', type=int, default=500, help='number of playhead positions to set')
+    parser.add_argument('--cache-size', type=int, default=100, help='max items per topic of the benchmarked TimelineCache')
+    parser.add_argument('--directory', help='directory for the generated bags, a temporary one is used by default')
+    parser.add_argument('--output', help='file to write the JSON report to')
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+
+    directory = args.directory or tempfile.mkdtemp(prefix='rqt_bag_benchmark_')
+    results = BenchmarkResults(dict((k, v) for k, v in vars(args).items() if k not in ('directory', 'output')))
+    try:
+        seconds, paths = _timed(generate_bags, directory, args.bags, args.topics, args.rate, args.duration, args.payload, args.compression)
+        results.add('generate_bags', seconds, len(paths), bytes=sum(os.path.getsize(p) for p in paths))
+
+        benchmark_timeline(results, paths, args.scrub_steps, os.path.join(directory, 'export.bag'))
+        benchmark_timeline_cache(results, args.topics, int(args.duration * args.rate), args.cache_size, 10 * args.scrub_steps)
+    finally:
+        if not args.directory:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    if args.output:
+        results.write(args.output)
+    else:
+        json.dump(results.to_dict(), sys.stdout, indent=2, sort_keys=True)
+        print()
+    return 0
@@ -0,0 +1,173 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Process-wide cache of decompressed bag chunks.
+"""
+
+import bz2
+import collections
+import io
+import os
+import threading
+import time
+
+from rosbag.bag import Compression
+
+try:
+    import roslz4
+except ImportError:
+    roslz4 = None
+
+
+class ChunkCache(object):
+    """
+    LRU of decompressed chunks of compressed bags, bounded by the total size of the chunks.
+
+    rosbag's reader only keeps the chunk it decompressed last, so readers taking turns on different chunks of the
+    same bag (message loaders, thumbnails, plots) decompress them again and again. Before a message is read, the
+    cache hands the decompressed chunk of its position to the bag's reader.
+    """
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        """
+        :param max_bytes: maximum total size of the cached decompressed chunks, ''int''
+        """
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._chunks = collections.OrderedDict()  # (bag filename, chunk position) -> (decompressed chunk, secs to decompress)
+        self._bytes = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._decompression_secs = 0.0
+        self._saved_secs = 0.0
+
+    def prepare(self, bag, position):
+        """
+        Makes the bag's reader use the cached decompressed chunk of the message position, decompressing and caching
+        the chunk first if needed. The caller must hold the lock of the bag.
+        :param bag: bag the message is read from, ''rosbag.Bag''
+        :param position: position of the message in the bag, ''(int, int)''
+        """
+        reader = getattr(bag, '_reader', None)
+        if not isinstance(position, tuple) or not hasattr(reader, 'decompressed_chunk_pos'):
+            # only bag format 2.0 has chunks
+            return
+        chunk_pos = position[0]
+        if reader.decompressed_chunk_pos == chunk_pos:
+            return
+        chunk_header = bag._chunk_headers.get(chunk_pos)
+        if chunk_header is None or chunk_header.compression == Compression.NONE:
+            return
+
+        key = (os.path.abspath(bag.filename), chunk_pos)
+        with self._lock:
+            cached = self._chunks.pop(key, None)
+            if cached is not None:
+                self._chunks[key] = cached
+                self._hits += 1
+                self._saved_secs += cached[1]
+
+        if cached is None:
+            start = time.time()
+            bag._file.seek(chunk_header.data_pos)
+            decompressed_chunk = _decompress(bag._file.read(chunk_header.compressed_size), chunk_header.compression)
+            cached = (decompressed_chunk, time.time() - start)
+            self._add(key, cached)
+
+        if reader.decompressed_chunk_io:
+            reader.decompressed_chunk_io.close()
+        reader.decompressed_chunk = cached[0]
+        reader.decompressed_chunk_io = io.BytesIO(cached[0])
+        reader.decompressed_chunk_pos = chunk_pos
+
+    def clear(self):
+        with self._lock:
+            self._chunks.clear()
+            self._bytes = 0
+
+    def get_statistics(self):
+        """
+        :returns: hits, misses, hit rate, evictions, cached chunks and bytes, secs spent decompressing and secs saved
+                  by hits, ''dict''
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / float(lookups) if lookups else 0.0,
+                'evictions': self._evictions,
+                'chunks': len(self._chunks),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'decompression_secs': self._decompression_secs,
+                'saved_secs': self._saved_secs,
+            }
+
+    def _add(self, key, cached):
+        with self._lock:
+            self._misses += 1
+            self._decompression_secs += cached[1]
+            if len(cached[0]) > self.max_bytes:
+                return
+            self._chunks[key] = cached
+            self._bytes += len(cached[0])
+            while self._bytes > self.max_bytes:
+                _, (evicted_chunk, _) = self._chunks.popitem(last=False)
+                self._bytes -= len(evicted_chunk)
+                self._evictions += 1
+
+
+def _decompress(compressed_chunk, compression):
+    if compression == Compression.BZ2:
+        return bz2.decompress(compressed_chunk)
+    if compression == Compression.LZ4 and roslz4 is not None:
+        return roslz4.decompress(compressed_chunk)
+    raise ValueError('Unsupported chunk compression: %s' % compression)
+
+
+_chunk_cache = None
+_chunk_cache_lock = threading.Lock()
+
+
+def get_chunk_cache():
+    """
+    :returns: the chunk cache shared by all timelines of the process, ''ChunkCache''
+    """
+    global _chunk_cache
+    with _chunk_cache_lock:
+        if _chunk_cache is None:
+            _chunk_cache = ChunkCache()
+        return _chunk_cache
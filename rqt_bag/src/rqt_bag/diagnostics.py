@@ -0,0 +1,195 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Memory and thread diagnostics of a timeline.
+"""
+
+import sys
+import threading
+import time
+
+from python_qt_binding.QtCore import Qt, QTimer
+from python_qt_binding.QtWidgets import QTreeWidget, QTreeWidgetItem, QVBoxLayout, QWidget
+
+
+class InstrumentedLock(object):
+    """
+    A re-entrant lock which measures how long threads wait to acquire it.
+
+    Uncontended acquisitions are not timed, so the lock costs about the same as an RLock when it isn't contended.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.acquisitions = 0
+        self.contentions = 0
+        self.wait_secs = 0.0
+        self.max_wait_secs = 0.0
+
+    def acquire(self, blocking=True):
+        if self._lock.acquire(False):
+            self.acquisitions += 1
+            return True
+        if not blocking:
+            return False
+        start = time.time()
+        self._lock.acquire()
+        wait_secs = time.time() - start
+        # the counters are only changed while holding the lock
+        self.acquisitions += 1
+        self.contentions += 1
+        self.wait_secs += wait_secs
+        self.max_wait_secs = max(self.max_wait_secs, wait_secs)
+        return True
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def get_statistics(self):
+        """
+        :returns: number of acquisitions, how many had to wait and the total and longest wait in secs, ''dict''
+        """
+        return {
+            'acquisitions': self.acquisitions,
+            'contentions': self.contentions,
+            'wait_secs': self.wait_secs,
+            'max_wait_secs': self.max_wait_secs,
+        }
+
+
+def get_thread_statistics():
+    """
+    :returns: number of threads of the process, in total and by class, ''dict''
+    """
+    by_type = {}
+    threads = threading.enumerate()
+    for thread in threads:
+        by_type[type(thread).__name__] = by_type.get(type(thread).__name__, 0) + 1
+    return {'count': len(threads), 'by_type': by_type}
+
+
+def get_list_bytes(values, item_bytes=sys.getsizeof(0.0)):
+    """
+    :returns: estimated bytes of a list and of its items, which are assumed to be the same size, ''int''
+    """
+    return sys.getsizeof(values) + len(values) * item_bytes
+
+
+def get_total_bytes(diagnostics):
+    """
+    :returns: sum of the values of the keys ending in "bytes" of the nested dicts, ''int''
+    """
+    total = 0
+    for key, value in diagnostics.items():
+        if isinstance(value, dict):
+            total += get_total_bytes(value)
+        elif str(key).endswith('bytes') and key != 'max_bytes' and isinstance(value, (int, float)):
+            total += value
+    return total
+
+
+class DiagnosticsWidget(QWidget):
+    """
+    Dockable panel showing the diagnostics of a timeline, refreshed every refresh_interval secs while it is visible.
+    """
+    def __init__(self, timeline, refresh_interval=1.0):
+        super(DiagnosticsWidget, self).__init__()
+        self.setObjectName('BagDiagnostics')
+        self.setWindowTitle('Bag Diagnostics')
+
+        self.timeline = timeline
+
+        self._tree = QTreeWidget(self)
+        self._tree.setHeaderLabels(['Name', 'Value'])
+        self._tree.setColumnWidth(0, 320)
+        layout = QVBoxLayout()
+        layout.addWidget(self._tree)
+        self.setLayout(layout)
+
+        self._items = {}  # path of keys -> QTreeWidgetItem
+
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setInterval(int(refresh_interval * 1000))
+        self._refresh_timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        self.refresh()
+        self._refresh_timer.start()
+        super(DiagnosticsWidget, self).showEvent(event)
+
+    def hideEvent(self, event):
+        self._refresh_timer.stop()
+        super(DiagnosticsWidget, self).hideEvent(event)
+
+    def refresh(self):
+        diagnostics = self.timeline.get_diagnostics()
+        seen = set()
+        self._update_items(self._tree.invisibleRootItem(), (), diagnostics, seen)
+        # Remove the items of topics, bags or views which are gone
+        for path in sorted([path for path in self._items if path not in seen], key=len, reverse=True):
+            item = self._items.pop(path)
+            (item.parent() or self._tree.invisibleRootItem()).removeChild(item)
+
+    def _update_items(self, parent, path, values, seen):
+        for key in sorted(values, key=str):
+            value = values[key]
+            item_path = path + (key,)
+            seen.add(item_path)
+            item = self._items.get(item_path)
+            if item is None:
+                item = QTreeWidgetItem(parent, [str(key), ''])
+                item.setTextAlignment(1, Qt.AlignRight)
+                self._items[item_path] = item
+            if isinstance(value, dict):
+                item.setText(1, '')
+                self._update_items(item, item_path, value, seen)
+            else:
+                item.setText(1, _format_value(key, value))
+
+
+def _format_value(key, value):
+    if str(key).endswith('bytes') and isinstance(value, (int, float)):
+        for unit in ('B', 'KB', 'MB'):
+            if abs(value) < 1024:
+                return '%.1f %s' % (value, unit)
+            value /= 1024.0
+        return '%.1f GB' % value
+    if isinstance(value, float):
+        return '%.4f' % value
+    return str(value)
@@ -69,13 +69,13 @@ class IndexCacheThread(threading.Thread):
                             progress = new_progress
                             if not self._stop_flag:
                                 self.timeline.scene().background_progress = progress
-                                self.timeline.scene().status_bar_changed_signal.emit()
+                                self.timeline.scene().request_status_update()
                     topic_num += 1
 
             if updated:
                 self.timeline.scene().background_progress = 0
-                self.timeline.scene().status_bar_changed_signal.emit()
-                self.timeline.scene().update()
+                self.timeline.scene().request_status_update()
+                self.timeline.scene().request_update()
                 # Give the GUI some time to update
                 time.sleep(1.0)
 
@@ -0,0 +1,344 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Field-level access to serialized messages, without deserializing the whole message.
+"""
+
+import struct
+import sys
+import threading
+
+import roslib.message
+import rospy
+
+# struct formats of the primitive types, see genpy
+_primitive_formats = {
+    'bool': '<B',
+    'int8': '<b',
+    'uint8': '<B',
+    'byte': '<b',
+    'char': '<B',
+    'int16': '<h',
+    'uint16': '<H',
+    'int32': '<i',
+    'uint32': '<I',
+    'int64': '<q',
+    'uint64': '<Q',
+    'float32': '<f',
+    'float64': '<d',
+}
+_primitive_structs = dict((field_type, struct.Struct(fmt)) for field_type, fmt in _primitive_formats.items())
+_time_structs = {'time': struct.Struct('<2I'), 'duration': struct.Struct('<2i')}
+_time_types = {'time': rospy.Time, 'duration': rospy.Duration}
+_time_field_types = {'time': 'uint32', 'duration': 'int32'}
+_struct_I = _primitive_structs['uint32']
+
+
+class FieldAccessor(object):
+    """
+    Unpacks one field from serialized messages of a type.
+
+    The position of the field is compiled from the message definition into a list of steps: fixed-size fields in
+    front of it are skipped by a constant offset, strings and arrays of fixed-size elements by reading their length.
+    """
+    def __init__(self, msg_class, path):
+        """
+        :param msg_class: generated message class, ''type''
+        :param path: path of the field, e.g. 'pose.position.x' or 'ranges[3]', ''str''
+        :raises: ValueError if the field can't be located without deserializing, e.g. after an array of strings
+        """
+        self.path = path
+        self._msg_class = msg_class
+        self._steps = []  # ('fixed', size), ('string', None), ('array', element size) or ('index', (index, element size))
+        self._unpack = None
+
+        field_type = msg_class._type
+        fields = _split_path(path)
+        for field_index, (field, index) in enumerate(fields):
+            field_type = self._add_field_steps(field_type, field)
+            if index is not None:
+                field_type = self._add_index_steps(field_type, index)
+            if field_type in _time_types and field_index == len(fields) - 2 and fields[-1][0] in ('secs', 'nsecs') \
+                    and fields[-1][1] is None:
+                # Time and Duration are primitives in the serialization but have secs and nsecs fields
+                if fields[-1][0] == 'nsecs':
+                    self._add_fixed(4)
+                field_type = _time_field_types[field_type]
+                break
+        self._unpack = self._get_unpack(field_type)
+
+    def get(self, data):
+        """
+        :param data: serialized message, ''str'' or ''memoryview''
+        :returns: value of the field
+        """
+        pos = 0
+        for step, arg in self._steps:
+            if step == 'fixed':
+                pos += arg
+            elif step == 'string':
+                pos += 4 + _struct_I.unpack_from(data, pos)[0]
+            elif step == 'array':
+                pos += 4 + _struct_I.unpack_from(data, pos)[0] * arg
+            else:
+                index, element_size = arg
+                if index >= _struct_I.unpack_from(data, pos)[0]:
+                    raise IndexError('%s: index out of range' % self.path)
+                pos += 4 + index * element_size
+        return self._unpack(data, pos)
+
+    def _add_fixed(self, size):
+        if self._steps and self._steps[-1][0] == 'fixed':
+            self._steps[-1] = ('fixed', self._steps[-1][1] + size)
+        else:
+            self._steps.append(('fixed', size))
+
+    def _add_field_steps(self, msg_type, field):
+        """
+        Adds the steps skipping the fields of msg_type in front of field.
+        :returns: the type of field, ''str''
+        """
+        msg_class = _get_message_class(msg_type, self._msg_class)
+        if msg_class is None or field not in msg_class.__slots__:
+            raise ValueError('%s has no field %s' % (msg_type, field))
+        for slot, slot_type in zip(msg_class.__slots__, msg_class._slot_types):
+            if slot == field:
+                return slot_type
+            self._add_skip_steps(slot_type)
+
+    def _add_index_steps(self, array_type, index):
+        """
+        Adds the steps to the element at index of an array of fixed-size elements.
+        :returns: the type of the elements, ''str''
+        """
+        element_type, is_array, length = _parse_array_type(array_type)
+        if not is_array:
+            raise ValueError('%s: %s is not an array' % (self.path, array_type))
+        element_size = _get_fixed_size(element_type, self._msg_class)
+        if element_size is None:
+            raise ValueError('%s: %s has elements of variable size' % (self.path, array_type))
+        if length is None:
+            self._steps.append(('index', (index, element_size)))
+        else:
+            if index >= length:
+                raise ValueError('%s: index out of range' % self.path)
+            self._add_fixed(index * element_size)
+        return element_type
+
+    def _add_skip_steps(self, field_type):
+        """
+        Adds the steps skipping a field of field_type.
+        """
+        size = _get_fixed_size(field_type, self._msg_class)
+        if size is not None:
+            self._add_fixed(size)
+            return
+        if field_type == 'string':
+            self._steps.append(('string', None))
+            return
+
+        element_type, is_array, length = _parse_array_type(field_type)
+        if is_array:
+            element_size = _get_fixed_size(element_type, self._msg_class)
+            if length is None:
+                if element_size is None:
+                    raise ValueError('%s: can\'t skip %s' % (self.path, field_type))
+                self._steps.append(('array', element_size))
+            else:
+                for _ in range(length):
+                    self._add_skip_steps(element_type)
+            return
+
+        msg_class = _get_message_class(field_type, self._msg_class)
+        if msg_class is None:
+            raise ValueError('%s: unknown type %s' % (self.path, field_type))
+        for slot_type in msg_class._slot_types:
+            self._add_skip_steps(slot_type)
+
+    def _get_unpack(self, field_type):
+        if field_type in _primitive_structs:
+            unpack_from = _primitive_structs[field_type].unpack_from
+            if field_type == 'bool':
+                return lambda data, pos: bool(unpack_from(data, pos)[0])
+            return lambda data, pos: unpack_from(data, pos)[0]
+        if field_type in _time_types:
+            time_type = _time_types[field_type]
+            time_unpack_from = _time_structs[field_type].unpack_from
+            return lambda data, pos: time_type(*time_unpack_from(data, pos))
+        if field_type == 'string':
+            def unpack_string(data, pos):
+                length = _struct_I.unpack_from(data, pos)[0]
+                value = bytes(data[pos + 4:pos + 4 + length])
+                if sys.version_info[0] >= 3:
+                    # like generated messages, which only decode strings on Python 3
+                    value = value.decode('utf-8', 'replace')
+                return value
+            return unpack_string
+        raise ValueError('%s: %s is not a primitive type' % (self.path, field_type))
+
+
+class LazyMessage(object):
+    """
+    View of a serialized message, unpacking only the fields that are asked for.
+
+    Fields which can't be located in the serialized message are read from the message deserialized on first use.
+    """
+    def __init__(self, msg_class, data):
+        """
+        :param msg_class: generated message class, ''type''
+        :param data: serialized message, ''str'' or ''memoryview''
+        """
+        self.msg_class = msg_class
+        self.data = data
+        self._msg = None
+
+    def get_field(self, path):
+        """
+        :param path: path of the field, e.g. 'pose.position.x' or 'ranges[3]', ''str''
+        :returns: value of the field
+        """
+        accessor = get_field_accessor(self.msg_class, path)
+        if accessor is not None:
+            return accessor.get(self.data)
+
+        value = self.get_message()
+        for field, index in _split_path(path):
+            value = getattr(value, field)
+            if index is not None:
+                value = value[index]
+        return value
+
+    def get_message(self):
+        """
+        :returns: the deserialized message, ''genpy.Message''
+        """
+        if self._msg is None:
+            msg = self.msg_class()
+            msg.deserialize(self.data.tobytes() if isinstance(self.data, memoryview) else self.data)
+            self._msg = msg
+        return self._msg
+
+
+_accessors = {}  # (message class, path) -> FieldAccessor or None
+_accessors_lock = threading.Lock()
+
+
+def get_field_accessor(msg_class, path):
+    """
+    :returns: the accessor of the field of the message type or None if it must be deserialized, ''FieldAccessor''
+    """
+    key = (msg_class, path)
+    with _accessors_lock:
+        if key in _accessors:
+            return _accessors[key]
+    try:
+        accessor = FieldAccessor(msg_class, path)
+    except ValueError:
+        accessor = None
+    with _accessors_lock:
+        _accessors[key] = accessor
+    return accessor
+
+
+def _split_path(path):
+    """
+    :returns: (field, index or None) for each component of the path, ''list((str, int))''
+    """
+    fields = []
+    for field in path.replace(' ', '').split('.'):
+        index = None
+        if field.endswith(']'):
+            field, _, index = field[:-1].rpartition('[')
+            index = int(index)
+        fields.append((field, index))
+    return fields
+
+
+def _parse_array_type(field_type):
+    """
+    :returns: (element type, is array, length or None if variable), ''(str, bool, int)''
+    """
+    if not field_type.endswith(']'):
+        return field_type, False, None
+    element_type, _, length = field_type[:-1].rpartition('[')
+    return element_type, True, int(length) if length else None
+
+
+def _get_fixed_size(field_type, root_class):
+    """
+    :returns: serialized size of the type or None if it varies, ''int''
+    """
+    if field_type in _primitive_structs:
+        return _primitive_structs[field_type].size
+    if field_type in _time_structs:
+        return _time_structs[field_type].size
+    if field_type == 'string':
+        return None
+    element_type, is_array, length = _parse_array_type(field_type)
+    if is_array:
+        element_size = _get_fixed_size(element_type, root_class)
+        if length is None or element_size is None:
+            return None
+        return length * element_size
+    msg_class = _get_message_class(field_type, root_class)
+    if msg_class is None:
+        return None
+    size = 0
+    for slot_type in msg_class._slot_types:
+        slot_size = _get_fixed_size(slot_type, root_class)
+        if slot_size is None:
+            return None
+        size += slot_size
+    return size
+
+
+def _get_message_class(msg_type, root_class):
+    """
+    Get the class of a message type used in the definition of root_class.
+
+    The classes of messages read from bags are generated from the definitions in the bag, together with the classes
+    of the messages they use, so these are looked up next to root_class first.
+    """
+    if msg_type == 'Header':
+        msg_type = 'std_msgs/Header'
+    if msg_type == root_class._type:
+        return root_class
+    module = sys.modules.get(root_class.__module__)
+    # name given to dynamically generated classes by genpy.dynamic
+    msg_class = getattr(module, '_%s' % msg_type.replace('/', '__'), None)
+    if msg_class is not None:
+        return msg_class
+    try:
+        return roslib.message.get_message_class(msg_type)
+    except Exception:
+        return None
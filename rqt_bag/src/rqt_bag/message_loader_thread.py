@@ -105,6 +105,12 @@ class MessageLoaderThread(threading.Thread):
 
         return msg_data
 
+    def get_statistics(self):
+        """
+        :returns: number of cached messages and the capacity of the cache, ''dict''
+        """
+        return {'messages': len(self._message_cache), 'capacity': self._message_cache_capacity}
+
     def stop(self):
         self._stop_flag = True
         cv = self.timeline._playhead_positions_cvs[self.topic]
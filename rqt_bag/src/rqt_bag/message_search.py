@@ -0,0 +1,359 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Searches the messages of a topic for the ones matching a field predicate, in worker processes.
+"""
+
+import ast
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+import multiprocessing
+import os
+try:
+    from queue import Empty, Queue
+except ImportError:
+    from Queue import Empty, Queue
+import re
+import subprocess
+import sys
+import threading
+
+import rosbag
+import rospy
+
+from python_qt_binding.QtCore import qWarning
+
+from rqt_bag import bag_helper
+
+_OPERATORS = {
+    '==': lambda value, other: value == other,
+    '!=': lambda value, other: value != other,
+    '<': lambda value, other: value < other,
+    '<=': lambda value, other: value <= other,
+    '>': lambda value, other: value > other,
+    '>=': lambda value, other: value >= other,
+    'contains': lambda value, other: other in value,
+}
+
+_predicate_re = re.compile(r'^\s*([A-Za-z_][\w\.\[\]\*]*)\s*(==|!=|<=|>=|<|>|contains)\s*(.+?)\s*$')
+_step_re = re.compile(r'([A-Za-z_]\w*)|\[(\d+|\*)\]')
+
+
+class MessagePredicate(object):
+    """
+    A field of a message compared to a value, e.g. "linear.x > 2" or "status[*].level == 2".
+
+    An array field without an index, or with a [*] index, matches if any of its elements matches.
+    The predicate is picklable so that it can be sent to the worker processes.
+    """
+    def __init__(self, text):
+        """
+        :param text: field path, operator (==, !=, <, <=, >, >= or contains) and value, ''str''
+        :raises: if the predicate can't be parsed, ''ValueError''
+        """
+        match = _predicate_re.match(text)
+        if match is None:
+            raise ValueError('Expected "field operator value", e.g. "linear.x > 2": %s' % text)
+        self.text = text.strip()
+        self.path, self.operator, value = match.groups()
+        self.steps = _parse_path(self.path)
+        try:
+            self.value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            # unquoted strings
+            self.value = value
+
+    def __str__(self):
+        return self.text
+
+    def matches(self, msg):
+        """
+        :returns: True if a value of the field matches, False if none does or the message doesn't have the field, ''bool''
+        """
+        compare = _OPERATORS[self.operator]
+        for value in _get_values(msg, self.steps):
+            try:
+                if compare(value, self.value):
+                    return True
+            except TypeError:
+                pass
+        return False
+
+
+def _parse_path(path):
+    """
+    :returns: the attribute names and indexes of the path, None for [*], ''list''
+    """
+    steps = []
+    position = 0
+    for match in _step_re.finditer(path):
+        if match.start() != position and path[position:match.start()] != '.':
+            raise ValueError('Invalid field path: %s' % path)
+        name, index = match.groups()
+        if name is not None:
+            steps.append(str(name))
+        else:
+            steps.append(None if index == '*' else int(index))
+        position = match.end()
+    if position != len(path):
+        raise ValueError('Invalid field path: %s' % path)
+    return steps
+
+
+def _get_values(value, steps):
+    """
+    Generator for the values of the field at the path of steps, one for each element of the arrays it crosses.
+    """
+    if not steps:
+        yield value
+        return
+    step = steps[0]
+    # indexes are ints, or None for [*]; anything else, e.g. unicode on Python 2, is a field name
+    if step is None or isinstance(step, int):
+        if not isinstance(value, (list, tuple, bytes)):
+            return
+        if step is None:
+            for element in value:
+                for element_value in _get_values(element, steps[1:]):
+                    yield element_value
+        elif step < len(value):
+            for element_value in _get_values(value[step], steps[1:]):
+                yield element_value
+    elif isinstance(value, (list, tuple)):
+        # any element of an array without an index
+        for element in value:
+            for element_value in _get_values(element, steps):
+                yield element_value
+    elif hasattr(value, step):
+        for field_value in _get_values(getattr(value, step), steps[1:]):
+            yield field_value
+
+
+class MessageSearchThread(threading.Thread):
+    """
+    Splits a time range into slices, searches the slices in worker processes and adds the stamps of the matching
+    messages to the timeline as search markers as each slice is done.
+
+    The workers are started with "python -m rqt_bag.message_search" rather than forked, forking a process running Qt
+    and reader threads isn't safe. Each worker is given its next slice when it is done with one.
+    The search is shown as the background task of the timeline, cancelling the task terminates the workers.
+    """
+    def __init__(self, timeline, topic, predicate, start_stamp, end_stamp, processes=None, slices_per_process=4):
+        """
+        :param timeline: timeline of the bags to search, ''BagTimeline''
+        :param topic: topic of the messages, ''str''
+        :param predicate: the messages to find, ''MessagePredicate''
+        :param start_stamp: start of the range to search, ''rospy.Time''
+        :param end_stamp: end of the range to search, ''rospy.Time''
+        :param processes: number of worker processes, the number of CPUs by default, ''int''
+        :param slices_per_process: number of time slices per process, more slices give more frequent progress, ''int''
+        """
+        threading.Thread.__init__(self)
+
+        self.timeline = timeline
+        self.topic = topic
+        self.predicate = predicate
+        self.start_stamp = start_stamp
+        self.end_stamp = end_stamp
+        self.processes = processes or multiprocessing.cpu_count()
+        self.slices_per_process = slices_per_process
+
+        self.match_count = 0
+        self.errors = []
+
+        self.setDaemon(True)
+        self.start()
+
+    def run(self):
+        timeline = self.timeline
+        workers = []
+        try:
+            slices = self._get_slices()
+            results = Queue()
+            for _ in range(min(self.processes, len(slices))):
+                workers.append(_start_worker(results))
+
+            next_slice = 0
+            for worker in workers:
+                _send(worker, slices[next_slice])
+                next_slice += 1
+
+            done = 0
+            while done < len(slices) and not timeline.background_task_cancel:
+                try:
+                    worker, result = results.get(timeout=0.1)
+                except Empty:
+                    continue
+                if result is None:
+                    self.errors.append('Search worker exited with %s' % str(worker.wait()))
+                    break
+
+                stamps, error = result
+                if error:
+                    self.errors.append(error)
+                if stamps:
+                    self.match_count += len(stamps)
+                    timeline._timeline_frame.add_search_markers(self.topic, stamps)
+                    timeline.request_update()
+                done += 1
+                timeline.background_progress = int(100.0 * done / len(slices))
+                timeline.request_status_update()
+
+                _send(worker, slices[next_slice] if next_slice < len(slices) else None)
+                next_slice += 1
+        except Exception as ex:
+            self.errors.append('Error searching %s: %s' % (self.topic, str(ex)))
+        finally:
+            for worker in workers:
+                if worker.poll() is None:
+                    worker.terminate()
+                worker.wait()
+            for error in self.errors:
+                qWarning(error)
+            timeline.background_progress = 0
+            timeline.request_status_update()
+            timeline.stop_background_task()
+
+    def _get_slices(self):
+        """
+        :returns: the arguments of search_slice for each slice, with the files of the bags overlapping the slice,
+                  ''list(tuple)''
+        """
+        with self.timeline._bag_lock:
+            bag_ranges = [(bag.filename, bag_helper.get_start_stamp(bag), bag_helper.get_end_stamp(bag))
+                          for bag in self.timeline._bags if bag.mode == 'r']
+
+        slice_count = max(1, self.processes * self.slices_per_process)
+        start, end = self.start_stamp.to_sec(), self.end_stamp.to_sec()
+        slice_duration = (end - start) / slice_count
+        slices = []
+        for slice_num in range(slice_count):
+            slice_start = start + slice_num * slice_duration
+            last_slice = slice_num == slice_count - 1 or slice_duration <= 0
+            slice_end = end if last_slice else slice_start + slice_duration
+            filenames = [filename for filename, bag_start, bag_end in bag_ranges
+                         if bag_start is not None and bag_start.to_sec() <= slice_end and bag_end.to_sec() >= slice_start]
+            if filenames:
+                slices.append((filenames, self.topic, self.predicate, slice_start, slice_end, last_slice))
+            if last_slice:
+                break
+        return slices
+
+
+def _start_worker(results):
+    """
+    Starts a worker process and a thread putting its results in the queue, (worker, None) once it exits.
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(path for path in sys.path if path)
+    worker = subprocess.Popen([sys.executable, '-m', 'rqt_bag.message_search'], env=env,
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def read_results():
+        while True:
+            try:
+                result = pickle.load(worker.stdout)
+            except Exception:
+                results.put((worker, None))
+                return
+            results.put((worker, result))
+
+    reader = threading.Thread(target=read_results)
+    reader.setDaemon(True)
+    reader.start()
+    return worker
+
+
+def _send(worker, task):
+    try:
+        pickle.dump(task, worker.stdin, 2)
+        worker.stdin.flush()
+    except EnvironmentError:
+        # the worker exited, its reader reports it
+        pass
+
+
+_worker_bags = {}  # filename -> rosbag.Bag, the bags opened by a worker process
+
+
+def search_slice(args):
+    """
+    Searches one time slice.
+    :param args: (filenames, topic, predicate, start secs, end secs, whether the end is included), ''tuple''
+    :returns: (sorted stamps in secs of the matching messages, error message or None), ''(list(float), str)''
+    """
+    filenames, topic, predicate, start, end, include_end = args
+    stamps = []
+    try:
+        for filename in filenames:
+            bag = _worker_bags.get(filename)
+            if bag is None:
+                bag = rosbag.Bag(filename)
+                _worker_bags[filename] = bag
+            for _, msg, t in bag.read_messages(topics=[topic], start_time=rospy.Time.from_sec(start),
+                                               end_time=rospy.Time.from_sec(end)):
+                stamp = t.to_sec()
+                # the slices share their bounds
+                if stamp >= end and not include_end:
+                    continue
+                if predicate.matches(msg):
+                    stamps.append(stamp)
+    except Exception as ex:
+        return sorted(stamps), 'Error searching %s: %s' % (topic, str(ex))
+    return sorted(stamps), None
+
+
+def main():
+    """
+    Worker process: searches the slices read from stdin until it reads None, writing the result of each to stdout.
+    """
+    tasks = getattr(sys.stdin, 'buffer', sys.stdin)
+    results = getattr(sys.stdout, 'buffer', sys.stdout)
+    # keep anything printed while reading the bags out of the results
+    sys.stdout = sys.stderr
+    while True:
+        try:
+            task = pickle.load(tasks)
+        except EOFError:
+            break
+        if task is None:
+            break
+        pickle.dump(search_slice(task), results, 2)
+        results.flush()
+
+
+if __name__ == '__main__':
+    main()
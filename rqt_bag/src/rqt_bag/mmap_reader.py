@@ -0,0 +1,196 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Memory-mapped read path for uncompressed bags.
+"""
+
+import mmap
+import struct
+import threading
+
+import rospy
+from rosbag.bag import Compression, _get_message_type
+
+_OP_MSG_DATA = 0x02
+_OP_CONNECTION = 0x07
+
+_struct_I = struct.Struct('<I')
+_struct_2I = struct.Struct('<2I')
+
+
+def open_mmap_reader(bag):
+    """
+    Maps the bag into memory if it can be read from the mapping.
+    :param bag: bag to map, ''rosbag.Bag''
+    :returns: reader or None if the bag isn't an indexed bag format 2.0 file opened for reading, ''MmapBagReader''
+    """
+    if bag.mode != 'r' or getattr(bag, 'version', None) != 200:
+        return None
+    try:
+        return MmapBagReader(bag)
+    except (EnvironmentError, ValueError):
+        return None
+
+
+class MmapBagReader(object):
+    """
+    Reads the messages of the uncompressed chunks of a bag from a read-only memory mapping of the file.
+
+    Reading from the mapping doesn't move the file position of the bag, so readers don't need to take turns on it.
+    Messages in compressed chunks aren't read, they must be read through the bag.
+    Closing the reader while messages are read from it closes the mapping once the last of these reads is done.
+    """
+    def __init__(self, bag):
+        self.bag = bag
+        self._lock = threading.Lock()
+        self._reads = 0  # number of reads running
+        self._closed = False
+        self._mapping = mmap.mmap(bag._file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._view = memoryview(self._mapping)
+        except TypeError:
+            # Python 2 mmap objects don't support memoryview, slices of them are copies
+            self._view = self._mapping
+
+    def read_raw_message(self, position):
+        """
+        :param position: position of the message in the bag, ''(int, int)''
+        :returns: (connection info, serialized message, t) with the serialized message sliced from the mapping without
+                  copying it where supported, or None if the message isn't in an uncompressed chunk,
+                  ''(ConnectionInfo, memoryview, rospy.Time)''
+        :raises: if the reader is closed, ''ValueError''
+        """
+        self._begin_read()
+        try:
+            return self._read_raw_message(position)
+        finally:
+            self._end_read()
+
+    def _read_raw_message(self, position):
+        chunk_pos, offset = position
+        chunk_header = self.bag._chunk_headers.get(chunk_pos)
+        if chunk_header is None or chunk_header.compression != Compression.NONE:
+            return None
+
+        record_pos = chunk_header.data_pos + offset
+        while True:
+            header, data_pos = self._read_header(record_pos)
+            data_size = _struct_I.unpack_from(self._mapping, data_pos)[0]
+            data_pos += 4
+            if ord(header['op'][:1]) != _OP_CONNECTION:
+                break
+            # Skip the CONNECTION records in front of the message
+            record_pos = data_pos + data_size
+
+        if ord(header['op'][:1]) != _OP_MSG_DATA:
+            return None
+
+        connection_info = self.bag._connections[_struct_I.unpack(header['conn'])[0]]
+        secs, nsecs = _struct_2I.unpack(header['time'])
+        return connection_info, self._view[data_pos:data_pos + data_size], rospy.Time(secs, nsecs)
+
+    def read_message(self, position, raw=False):
+        """
+        :param position: position of the message in the bag, ''(int, int)''
+        :param raw: if True, msg is (datatype, serialized message, md5sum, position, message class) like in rosbag, ''bool''
+        :returns: (topic, msg, t) or None if the message isn't in an uncompressed chunk, ''(str, genpy.Message, rospy.Time)''
+        :raises: if the reader is closed, ''ValueError''
+        """
+        self._begin_read()
+        try:
+            raw_message = self._read_raw_message(position)
+            if raw_message is None:
+                return None
+            connection_info, data, t = raw_message
+
+            msg_type = _get_message_type(connection_info)
+            if raw:
+                return connection_info.topic, (connection_info.datatype, data, connection_info.md5sum, position, msg_type), t
+
+            msg = msg_type()
+            # generated messages deserialize from a str/bytes buffer
+            msg.deserialize(data.tobytes() if isinstance(data, memoryview) else data)
+            return connection_info.topic, msg, t
+        finally:
+            self._end_read()
+
+    def close(self):
+        """
+        Closes the mapping, or lets the last running read close it.
+        """
+        with self._lock:
+            self._closed = True
+            if self._reads == 0:
+                self._close_mapping()
+
+    def _begin_read(self):
+        with self._lock:
+            if self._closed:
+                raise ValueError('Memory mapping of %s is closed' % self.bag.filename)
+            self._reads += 1
+
+    def _end_read(self):
+        with self._lock:
+            self._reads -= 1
+            if self._closed and self._reads == 0:
+                self._close_mapping()
+
+    def _close_mapping(self):
+        """
+        The caller must hold the lock of the reader.
+        """
+        if self._view is None:
+            return
+        self._view = None
+        try:
+            self._mapping.close()
+        except BufferError:
+            # raw messages are still referenced, the mapping is closed when they are released
+            pass
+
+    def _read_header(self, pos):
+        """
+        :returns: (fields of the record header at pos, position after the header), ''(dict(str, bytes), int)''
+        """
+        header_size = _struct_I.unpack_from(self._mapping, pos)[0]
+        pos += 4
+        header_end = pos + header_size
+        fields = {}
+        while pos < header_end:
+            field_size = _struct_I.unpack_from(self._mapping, pos)[0]
+            pos += 4
+            field = self._mapping[pos:pos + field_size]
+            pos += field_size
+            name, _, value = field.partition(b'=')
+            fields[name.decode('ascii')] = value
+        return fields, header_end
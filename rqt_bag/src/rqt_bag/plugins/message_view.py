@@ -75,6 +75,16 @@ class MessageView(QObject):
         """
         pass
 
+    def get_statistics(self):
+        """
+        Get the sizes of the data the view holds, for the diagnostics of the timeline. Sizes in bytes go in keys
+        ending in "bytes".
+
+        @return: nested dict of sizes
+        @rtype:  dict
+        """
+        return {}
+
     def close(self):
         """
         Close the message view, releasing any resources.
@@ -36,8 +36,14 @@ import rospy
 import codecs
 import math
 
+try:
+    long
+except NameError:
+    long = int
+
 from python_qt_binding.QtCore import Qt
-from python_qt_binding.QtWidgets import QApplication, QAbstractItemView, QSizePolicy, QTreeWidget, QTreeWidgetItem, QWidget
+from python_qt_binding.QtGui import QStandardItem, QStandardItemModel
+from python_qt_binding.QtWidgets import QApplication, QAbstractItemView, QSizePolicy, QTreeView, QWidget
 from .topic_message_view import TopicMessageView
 
 
@@ -45,7 +51,7 @@ class RawView(TopicMessageView):
     name = 'Raw'
     """
     Plugin to view a message in a treeview window
-    The message is loaded into a custum treewidget
+    The message is loaded into a custom treeview
     """
     def __init__(self, timeline, parent, topic):
         """
@@ -69,15 +75,31 @@ class RawView(TopicMessageView):
         self.message_tree.set_message(None)
 
 
-class MessageTree(QTreeWidget):
+class MessageTree(QTreeView):
+    """
+    Tree of the fields of a message.
+
+    Items are kept between messages: only labels that changed are updated, and the children of an item are
+    only created once it is expanded. Large arrays are split into ranges of elements that are expanded separately.
+    """
+    # item data role holding the attribute name, array index or (start, end) element range of an item
+    _KEY_ROLE = Qt.UserRole + 1
+
     def __init__(self, parent):
         super(MessageTree, self).__init__(parent)
         self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         self.setHeaderHidden(True)
         self.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.setUniformRowHeights(True)
+        self._model = QStandardItemModel(self)
+        self.setModel(self._model)
         self._msg = None
 
-        self._expanded_paths = None
+        self._array_range_size = 1000  # arrays longer than this are split into ranges of this many elements
+        self._expanded_paths = set()
+        self._updating = False
+        self.expanded.connect(self._on_expanded)
+        self.collapsed.connect(self._on_collapsed)
         self.keyPressEvent = self.on_key_press
 
     @property
@@ -86,33 +108,20 @@ class MessageTree(QTreeWidget):
 
     def set_message(self, msg):
         """
-        Clears the tree view and displays the new message
+        Updates the tree view to display the new message
         :param msg: message object to display in the treeview, ''msg''
         """
-        # Remember whether items were expanded or not before deleting
-        if self._msg:
-            for item in self.get_all_items():
-                path = self.get_item_path(item)
-                if item.isExpanded():
-                    self._expanded_paths.add(path)
-                elif path in self._expanded_paths:
-                    self._expanded_paths.remove(path)
-            self.clear()
-        if msg:
-            # Populate the tree
-            self._add_msg_object(None, '', '', msg, msg._type)
-
-            if self._expanded_paths is None:
-                self._expanded_paths = set()
-            else:
-                # Expand those that were previously expanded, and collapse any paths that we've seen for the first time
-                for item in self.get_all_items():
-                    path = self.get_item_path(item)
-                    if path in self._expanded_paths:
-                        item.setExpanded(True)
-                    else:
-                        item.setExpanded(False)
         self._msg = msg
+        root = self._model.invisibleRootItem()
+        if msg:
+            self._updating = True
+            try:
+                self._update_children(root, '', msg, None)
+            finally:
+                self._updating = False
+        else:
+            # the expanded paths are kept so they are restored for the next message
+            root.removeRows(0, root.rowCount())
         QWidget.update(self)
 
     # Keyboard handler
@@ -128,60 +137,170 @@ class MessageTree(QTreeWidget):
                 self._select_all()
 
     def _select_all(self):
-        for i in self.get_all_items():
-            if not i.isSelected():
-                i.setSelected(True)
-                i.setExpanded(True)
+        self.selectAll()
 
     def _copy_text_to_clipboard(self):
         # Get tab indented text for all selected items
-        def get_distance(item, ancestor, distance=0):
+        def get_distance(item):
+            distance = 0
             parent = item.parent()
-            if parent == None:
-                return distance
-            else:
-                return get_distance(parent, ancestor, distance + 1)
+            while parent is not None:
+                distance += 1
+                parent = parent.parent()
+            return distance
+        selection = self.selectionModel()
         text = ''
         for i in self.get_all_items():
-            if i in self.selectedItems():
-                text += ('\t' * (get_distance(i, None))) + i.text(0) + '\n'
+            if selection.isSelected(i.index()):
+                text += ('\t' * get_distance(i)) + i.text() + '\n'
         # Copy the text to the clipboard
         clipboard = QApplication.clipboard()
         clipboard.setText(text)
 
     def get_item_path(self, item):
-        return item.data(0, Qt.UserRole)[0].replace(' ', '')  # remove spaces that may get introduced in indexing, e.g. [  3] is [3]
+        return item.data(Qt.UserRole)[0].replace(' ', '')  # remove spaces that may get introduced in indexing, e.g. [  3] is [3]
 
     def get_all_items(self):
+        """
+        :returns: all items that have been created, in tree order, ''list(QStandardItem)''
+        """
         items = []
-        try:
-            root = self.invisibleRootItem()
-            self.traverse(root, items.append)
-        except Exception:
-            # TODO: very large messages can cause a stack overflow due to recursion
-            pass
+        root = self._model.invisibleRootItem()
+        stack = [root.child(i) for i in reversed(range(root.rowCount()))]
+        while stack:
+            item = stack.pop()
+            if item.data(Qt.UserRole) is None:
+                continue  # placeholder of an item that hasn't been expanded yet
+            items.append(item)
+            stack.extend(item.child(i) for i in reversed(range(item.rowCount())))
         return items
 
-    def traverse(self, root, function):
-        for i in range(root.childCount()):
-            child = root.child(i)
-            function(child)
-            self.traverse(child, function)
+    def _on_expanded(self, index):
+        item = self._model.itemFromIndex(index)
+        if item.data(Qt.UserRole) is None:
+            return
+        path = self.get_item_path(item)
+        self._expanded_paths.add(path)
+        if self._updating or self._msg is None:
+            return
+        # Create or refresh the children of the item
+        self._updating = True
+        try:
+            self._update_children(item, item.data(Qt.UserRole)[0], self._get_item_object(item), item.data(self._KEY_ROLE))
+        finally:
+            self._updating = False
+
+    def _on_collapsed(self, index):
+        item = self._model.itemFromIndex(index)
+        if item.data(Qt.UserRole) is not None:
+            self._expanded_paths.discard(self.get_item_path(item))
 
-    def _add_msg_object(self, parent, path, name, obj, obj_type):
-        label = name
+    def _get_item_object(self, item):
+        keys = []
+        while item is not None:
+            keys.append(item.data(self._KEY_ROLE))
+            item = item.parent()
+        obj = self._msg
+        for key in reversed(keys):
+            if isinstance(key, (tuple, list)):
+                continue  # a range of elements refers to the same array
+            elif isinstance(key, (int, long)):
+                obj = obj[key]
+            else:
+                obj = getattr(obj, key)
+        return obj
+
+    def _update_children(self, parent, path, obj, key):
+        """
+        Updates the child items of parent to show the fields of obj, reusing the existing items
+        """
+        children = self._get_children(path, obj, key)
+
+        if parent.rowCount() > len(children):
+            parent.removeRows(len(children), parent.rowCount() - len(children))
+
+        for row, (child_key, name, subpath, subobj, subobj_type) in enumerate(children):
+            label = self._get_label(name, subobj)
+            item = parent.child(row)
+            if item is None:
+                item = QStandardItem(label)
+                item.setEditable(False)
+                parent.appendRow(item)
+            elif item.text() != label:
+                item.setText(label)
+            if item.data(self._KEY_ROLE) != child_key:
+                item.setData(child_key, self._KEY_ROLE)
+            item_data = item.data(Qt.UserRole)
+            if item_data is None or tuple(item_data) != (subpath, subobj_type):
+                item.setData((subpath, subobj_type), Qt.UserRole)
 
+            if not self._has_children(subobj):
+                if item.rowCount() > 0:
+                    item.removeRows(0, item.rowCount())
+            elif subpath.replace(' ', '') in self._expanded_paths:
+                self._update_children(item, subpath, subobj, child_key)
+                if not self.isExpanded(item.index()):
+                    self.setExpanded(item.index(), True)
+            elif item.rowCount() == 0:
+                # placeholder, so the item can be expanded; children are created on expansion
+                item.appendRow(QStandardItem())
+            # children of collapsed items that were created before are refreshed when the item is expanded again
+
+    def _has_children(self, obj):
+        if hasattr(obj, '__slots__'):
+            return len(obj.__slots__) > 0
+        return type(obj) in [list, tuple] and len(obj) > 0
+
+    def _get_children(self, path, obj, key):
+        """
+        :returns: list of (key, name, path, obj, obj_type) for the children of obj, ''list(tuple)''
+        """
         if hasattr(obj, '__slots__'):
-            subobjs = [(slot, getattr(obj, slot)) for slot in obj.__slots__]
+            subobjs = [(slot, slot, getattr(obj, slot)) for slot in obj.__slots__]
         elif type(obj) in [list, tuple]:
             len_obj = len(obj)
             if len_obj == 0:
-                subobjs = []
+                return []
+            w = int(math.ceil(math.log10(len_obj)))
+            if isinstance(key, (tuple, list)):
+                # elements of a range; their paths are relative to the array
+                start, end = key
+                path = path[:path.rfind('[')]
+            elif len_obj > self._array_range_size:
+                ranges = []
+                for start in range(0, len_obj, self._array_range_size):
+                    end = min(start + self._array_range_size, len_obj)
+                    name = '[%*d:%*d]' % (w, start, w, end)
+                    ranges.append(((start, end), name, '%s%s' % (path, name), obj, type(obj).__name__))
+                return ranges
             else:
-                w = int(math.ceil(math.log10(len_obj)))
-                subobjs = [('[%*d]' % (w, i), subobj) for (i, subobj) in enumerate(obj)]
+                start, end = 0, len_obj
+            subobjs = [(i, '[%*d]' % (w, i), obj[i]) for i in range(start, end)]
         else:
-            subobjs = []
+            return []
+
+        children = []
+        for subobj_key, subobj_name, subobj in subobjs:
+            if subobj is None:
+                continue
+
+            if path == '':
+                subpath = subobj_name  # root field
+            elif subobj_name.startswith('['):
+                subpath = '%s%s' % (path, subobj_name)  # list, dict, or tuple
+            else:
+                subpath = '%s.%s' % (path, subobj_name)  # attribute (prefix with '.')
+
+            if hasattr(subobj, '_type'):
+                subobj_type = subobj._type
+            else:
+                subobj_type = type(subobj).__name__
+
+            children.append((subobj_key, subobj_name, subpath, subobj, subobj_type))
+        return children
+
+    def _get_label(self, name, obj):
+        label = name
 
         if type(obj) in [int, long, float]:
             if type(obj) == float:
@@ -203,29 +322,4 @@ class MessageTree(QTreeWidget):
                 obj_repr = obj_repr[:50] + '...'
 
             label += ': ' + obj_repr
-        item = QTreeWidgetItem([label])
-        if name == '':
-            pass
-        elif path.find('.') == -1 and path.find('[') == -1:
-            self.addTopLevelItem(item)
-        else:
-            parent.addChild(item)
-        item.setData(0, Qt.UserRole, (path, obj_type))
-
-        for subobj_name, subobj in subobjs:
-            if subobj is None:
-                continue
-
-            if path == '':
-                subpath = subobj_name  # root field
-            elif subobj_name.startswith('['):
-                subpath = '%s%s' % (path, subobj_name)  # list, dict, or tuple
-            else:
-                subpath = '%s.%s' % (path, subobj_name)  # attribute (prefix with '.')
-
-            if hasattr(subobj, '_type'):
-                subobj_type = subobj._type
-            else:
-                subobj_type = type(subobj).__name__
-
-            self._add_msg_object(item, subpath, subobj_name, subobj, subobj_type)
+        return label
@@ -58,7 +58,7 @@ class TimelineRenderer(QObject):
 
     def draw_timeline_segment(self, painter, topic, stamp_start, stamp_end, x, y, width, height):
         """
-        Draw the timeline segment.
+        Draw the timeline segment. Called by the default draw_timeline_segments.
 
         @param painter: QPainter context to render into
         @param topic: topic name
@@ -73,6 +73,65 @@ class TimelineRenderer(QObject):
         """
         return False
 
+    def draw_timeline_segments(self, painter, topic, stamp_starts, stamp_ends, xs, y, widths, height):
+        """
+        Draw all the visible timeline segments of the topic in one call, so that the drawing can be batched and the
+        data for the whole view fetched at once. The default implementation calls draw_timeline_segment for each
+        segment.
+
+        @param painter: QPainter context to render into
+        @param topic: topic name
+        @param stamp_starts: starts of the intervals on the timeline
+        @type  stamp_starts: numpy.ndarray of float
+        @param stamp_ends: ends of the intervals on the timeline
+        @type  stamp_ends: numpy.ndarray of float
+        @param xs: x coordinates of the timeline intervals
+        @type  xs: numpy.ndarray of float
+        @param y: y coordinate of the timeline intervals
+        @param widths: widths in pixels of the timeline intervals
+        @type  widths: numpy.ndarray of float
+        @param height: height in pixels of the timeline intervals
+        @return: whether any interval was rendered
+        @rtype:  bool
+        """
+        rendered = False
+        for stamp_start, stamp_end, x, width in zip(stamp_starts.tolist(), stamp_ends.tolist(), xs.tolist(), widths.tolist()):
+            if self.draw_timeline_segment(painter, topic, stamp_start, stamp_end, x, y, width, height):
+                rendered = True
+        return rendered
+
+    def get_output_version(self, topic):
+        """
+        Get the version of what the renderer draws for the topic. The timeline caches the drawn segments until the
+        version changes (or the timeline view does), so a renderer must change it whenever draw_timeline_segment would
+        draw something different, e.g. after loading data asynchronously.
+
+        @param topic: topic name
+        @type  topic: str
+        @return: version of the output, or None if the output must not be cached
+        @rtype:  object
+        """
+        return None
+
+    def get_statistics(self):
+        """
+        Get the sizes of what the renderer caches, for the diagnostics of the timeline. Sizes in bytes go in keys
+        ending in "bytes".
+
+        @return: nested dict of sizes
+        @rtype:  dict
+        """
+        return {}
+
+    def bag_added(self, bag):
+        """
+        Notify the renderer that a bag has been added to the timeline.
+
+        @param bag: the bag that was added
+        @type  bag: rosbag.Bag
+        """
+        pass
+
     def close(self):
         """
         Close the renderer, releasing any resources.
@@ -102,6 +102,20 @@ class Recorder(object):
     def bag(self):
         return self._bag
 
+    def get_queue_sizes(self):
+        """
+        Get the number of messages of each topic waiting to be written.
+
+        @return: number of messages by topic
+        @rtype:  dict of str to int
+        """
+        queue_sizes = {}
+        with self._write_queue.mutex:
+            for item in self._write_queue.queue:
+                if isinstance(item, tuple):
+                    queue_sizes[item[0]] = queue_sizes.get(item[0], 0) + 1
+        return queue_sizes
+
     def add_listener(self, listener):
         """
         Add a listener which gets called whenever a message is recorded.
@@ -0,0 +1,187 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Merged index of the message stamps of all the bags of a timeline.
+"""
+
+import numpy
+
+
+class StampIndex(object):
+    """
+    The stamps of the messages of all bags and connections merged into one sorted array, so that the message before
+    or after a stamp is found with one binary search instead of a search of every connection of every bag.
+
+    The index is extended with the entries appended to the connection indexes of a bag since it was last updated,
+    which is amortized O(1) per entry while recording. It is rebuilt when entries were inserted in between.
+    Not thread-safe, callers must hold the lock of the bags.
+    """
+    def __init__(self):
+        self._stamps = numpy.empty(0, dtype=numpy.int64)  # nsecs, sorted, capacity grown by doubling
+        self._bag_nums = numpy.empty(0, dtype=numpy.int32)
+        self._entries = numpy.empty(0, dtype=object)
+        self._size = 0
+        self._bags = []  # bag number -> bag
+        self._bag_nums_by_id = {}  # id(bag) -> bag number
+        self._seen = {}  # (bag number, connection id) -> (number of entries, last entry) indexed
+        self._updated_bags = {}  # id(bag) -> bag, the bags whose index has changed since the last update
+        self.rebuild_count = 0
+
+    def update(self, bag):
+        """
+        Marks the index of a bag as changed, the stamp index is updated when it is next queried.
+        :param bag: ros bag file, ''rosbag.bag''
+        """
+        self._updated_bags[id(bag)] = bag
+
+    def clear(self):
+        self._size = 0
+        self._bags = []
+        self._bag_nums_by_id = {}
+        self._seen = {}
+        self._updated_bags = {}
+
+    def __len__(self):
+        self._update()
+        return self._size
+
+    def get_statistics(self):
+        """
+        :returns: number of indexed messages and bytes of the index arrays, ''dict''
+        """
+        return {
+            'entries': self._size,
+            'bytes': self._stamps.nbytes + self._bag_nums.nbytes + self._entries.nbytes,
+        }
+
+    def get_entry_after(self, t):
+        """
+        :param t: time, ''rospy.Time''
+        :returns: tuple of (bag, entry) of the first message after t or (None, None), ''(rosbag.bag, entry)''
+        """
+        self._update()
+        index = numpy.searchsorted(self._stamps[:self._size], _to_nsec(t), side='right')
+        if index >= self._size:
+            return None, None
+        return self._get(index)
+
+    def get_entry_before(self, t):
+        """
+        :param t: time, ''rospy.Time''
+        :returns: tuple of (bag, entry) of the last message before t or (None, None), ''(rosbag.bag, entry)''
+        """
+        self._update()
+        index = numpy.searchsorted(self._stamps[:self._size], _to_nsec(t), side='left') - 1
+        if index < 0:
+            return None, None
+        return self._get(index)
+
+    def _get(self, index):
+        return self._bags[self._bag_nums[index]], self._entries[index]
+
+    def _update(self):
+        if not self._updated_bags:
+            return
+        updated_bags = list(self._updated_bags.values())
+        self._updated_bags = {}
+
+        new_stamps, new_bag_nums, new_entries = [], [], []
+        for bag in updated_bags:
+            bag_num = self._bag_nums_by_id.get(id(bag))
+            if bag_num is None:
+                bag_num = len(self._bags)
+                self._bags.append(bag)
+                self._bag_nums_by_id[id(bag)] = bag_num
+            for connection_id, index in list(bag._connection_indexes.items()):
+                count, last_entry = self._seen.get((bag_num, connection_id), (0, None))
+                if count > len(index) or (count > 0 and index[count - 1] is not last_entry):
+                    # entries were inserted in between or removed
+                    self._rebuild()
+                    return
+                if count == len(index):
+                    continue
+                entries = index[count:]
+                new_stamps.append(numpy.fromiter((_to_nsec(entry.time) for entry in entries),
+                                                 dtype=numpy.int64, count=len(entries)))
+                new_bag_nums.append(numpy.full(len(entries), bag_num, dtype=numpy.int32))
+                entries_array = numpy.empty(len(entries), dtype=object)
+                entries_array[:] = entries
+                new_entries.append(entries_array)
+                self._seen[(bag_num, connection_id)] = (len(index), index[-1])
+
+        if new_stamps:
+            self._add(numpy.concatenate(new_stamps), numpy.concatenate(new_bag_nums), numpy.concatenate(new_entries))
+
+    def _rebuild(self):
+        bags = self._bags
+        self.clear()
+        for bag in bags:
+            self.update(bag)
+        self.rebuild_count += 1
+        self._update()
+
+    def _add(self, stamps, bag_nums, entries):
+        order = numpy.argsort(stamps, kind='mergesort')
+        stamps, bag_nums, entries = stamps[order], bag_nums[order], entries[order]
+
+        size = self._size
+        if size > 0 and stamps[0] < self._stamps[size - 1]:
+            # merge with the entries already indexed, e.g. a bag from the middle of the timeline
+            stamps = numpy.concatenate((self._stamps[:size], stamps))
+            bag_nums = numpy.concatenate((self._bag_nums[:size], bag_nums))
+            entries = numpy.concatenate((self._entries[:size], entries))
+            order = numpy.argsort(stamps, kind='mergesort')
+            stamps, bag_nums, entries = stamps[order], bag_nums[order], entries[order]
+            size = 0
+
+        new_size = size + len(stamps)
+        if new_size > len(self._stamps):
+            capacity = max(new_size, 2 * len(self._stamps), 1024)
+            self._stamps = _resize(self._stamps, size, capacity)
+            self._bag_nums = _resize(self._bag_nums, size, capacity)
+            self._entries = _resize(self._entries, size, capacity)
+        self._stamps[size:new_size] = stamps
+        self._bag_nums[size:new_size] = bag_nums
+        self._entries[size:new_size] = entries
+        self._size = new_size
+
+
+def _resize(array, size, capacity):
+    resized = numpy.empty(capacity, dtype=array.dtype)
+    resized[:size] = array[:size]
+    return resized
+
+
+def _to_nsec(t):
+    return t.secs * 1000000000 + t.nsecs
@@ -33,9 +33,9 @@
 
 import bisect
 try:
-    from queue import Queue
+    from queue import Empty, Queue
 except ImportError:
-    from Queue import Queue
+    from Queue import Empty, Queue
 import threading
 import time
 
@@ -43,11 +43,16 @@ import time
 class TimelineCache(threading.Thread):
     """
     Caches items for timeline renderers
+
+    If a batch_loader is given, the entries queued at the same time are loaded together with it, so that it can read
+    their messages in file order.
     """
-    def __init__(self, loader, listener=None, max_cache_size=100):
+    def __init__(self, loader, listener=None, max_cache_size=100, batch_loader=None, max_batch_size=100):
         threading.Thread.__init__(self)
 
         self.loader = loader
+        self.batch_loader = batch_loader  # [(topic, stamp, time_threshold, item_details), ...] -> [(topic, stamp, item), ...]
+        self.max_batch_size = max_batch_size
         self.listener = listener
         self.stop_flag = False
         self.lock = threading.RLock()
@@ -55,6 +60,7 @@ class TimelineCache(threading.Thread):
         self.last_accessed = {}  # topic -> [(access time, timestamp), ...]
         self.item_access = {}  # topic -> timestamp -> access time
         self.max_cache_size = max_cache_size  # max number of items to cache (per topic)
+        self.generation = 0  # incremented by clear(), items loaded before it are dropped
         self.queue = Queue()
         self.setDaemon(True)
         self.start()
@@ -66,16 +72,18 @@ class TimelineCache(threading.Thread):
             # self used to signal a change in stop_flag
             if entry == self:
                 continue
+            if self.batch_loader:
+                self._load_batch(entry)
+                continue
             # Check we haven't already cached it
             topic, stamp, time_threshold, item_details = entry
 
             if not self.get_item(topic, stamp, time_threshold):
                 # Load the item
+                generation = self.generation
                 msg_stamp, item = self.loader(topic, stamp, item_details)
-                if item:
-                    # Store in the cache
-                    self.cache_item(topic, msg_stamp, item)
-
+                # Store in the cache, unless it was cleared while loading
+                if item and self.cache_item(topic, msg_stamp, item, generation):
                     if self.listener:
                         self.listener(topic, msg_stamp, item)
 #                else:
@@ -85,11 +93,47 @@ class TimelineCache(threading.Thread):
 #                        qWarning('Failed to load cache item')
             self.queue.task_done()
 
+    def _load_batch(self, entry):
+        """
+        Loads the entry together with all entries queued after it.
+        """
+        entries = [entry]
+        while len(entries) < self.max_batch_size:
+            try:
+                entry = self.queue.get_nowait()
+            except Empty:
+                break
+            if entry == self:
+                break
+            entries.append(entry)
+
+        # Check we haven't already cached them
+        pending = [(topic, stamp, time_threshold, item_details) for topic, stamp, time_threshold, item_details in entries
+                   if not self.get_item(topic, stamp, time_threshold)]
+        if pending:
+            generation = self.generation
+            for topic, msg_stamp, item in self.batch_loader(pending):
+                if self.stop_flag:
+                    break
+                if item and self.cache_item(topic, msg_stamp, item, generation):
+                    if self.listener:
+                        self.listener(topic, msg_stamp, item)
+
+        for _ in entries:
+            self.queue.task_done()
+
     def enqueue(self, entry):
         self.queue.put(entry)
 
-    def cache_item(self, topic, t, item):
+    def cache_item(self, topic, t, item, generation=None):
+        """
+        :param generation: value of generation when the item started loading, the item is dropped if the cache was
+                           cleared since, ''int''
+        :returns: whether the item was cached, ''bool''
+        """
         with self.lock:
+            if generation is not None and generation != self.generation:
+                return False
             if topic not in self.items:
                 self.items[topic] = []
             topic_cache = self.items[topic]
@@ -101,6 +145,7 @@ class TimelineCache(threading.Thread):
             self._update_last_accessed(topic, t.to_sec())
 
             self._limit_cache()
+            return True
 
     def get_item(self, topic, stamp, time_threshold):
         with self.lock:
@@ -133,6 +178,31 @@ class TimelineCache(threading.Thread):
                         return cache_item
             return None
 
+    def get_statistics(self, item_bytes=None):
+        """
+        :param item_bytes: returns the estimated size of an item, ''function''
+        :returns: number of cached items (and their bytes if item_bytes is given) by topic and the number of items
+                  queued to be loaded, ''dict''
+        """
+        statistics = {'queued': self.queue.qsize()}
+        with self.lock:
+            for topic, topic_cache in self.items.items():
+                topic_statistics = {'items': len(topic_cache)}
+                if item_bytes is not None:
+                    topic_statistics['bytes'] = sum(item_bytes(item) for _, item in topic_cache)
+                statistics[topic] = topic_statistics
+        return statistics
+
+    def clear(self):
+        """
+        Removes all items from the cache. Items that are being loaded are dropped when they finish.
+        """
+        with self.lock:
+            self.generation += 1
+            self.items.clear()
+            self.last_accessed.clear()
+            self.item_access.clear()
+
     def _update_last_accessed(self, topic, stamp):
         """
         Maintains a sorted list of cache accesses by timestamp for each topic.
@@ -0,0 +1,307 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Message rate and bandwidth of the topics per pixel column of the timeline.
+"""
+
+import collections
+import threading
+
+import numpy
+
+from . import bag_helper
+
+
+class TimelineDensity(object):
+    """
+    Computes how many messages or bytes per second each topic has in every pixel column of the timeline.
+
+    Rates are computed from the index cache of the TimelineFrame. Bandwidths are computed from the message sizes
+    found in the connection and chunk indexes of the bags, which are gathered by a background thread.
+    The densities are cached per topic and zoom level.
+    """
+    RATE = 'rate'
+    BANDWIDTH = 'bandwidth'
+
+    def __init__(self, timeline_frame, max_cached_zoom_levels=8):
+        """
+        :param timeline_frame: frame whose topics are measured, ''TimelineFrame''
+        :param max_cached_zoom_levels: number of zoom levels to keep the densities of per topic, ''int''
+        """
+        self._timeline_frame = timeline_frame
+        self._max_cached_zoom_levels = max_cached_zoom_levels
+
+        self.mode = None  # None, RATE or BANDWIDTH
+
+        self._lock = threading.Lock()
+        self._cumulative = {}  # (mode, topic) -> (key, stamps, cumulative weights or None)
+        self._densities = {}  # (mode, topic) -> OrderedDict of zoom level -> densities
+
+        self._sizes = {}  # topic -> (stamps, message sizes)
+        self._bags_key = None  # the bags of the timeline, as of their last update
+        self._sizes_key = None  # the bags the sizes were gathered from
+        self._sizes_version = 0
+        self._sizes_thread = None
+
+    def set_mode(self, mode):
+        """
+        :param mode: None to switch the densities off, RATE or BANDWIDTH, ''str''
+        """
+        self.mode = mode
+        if mode == TimelineDensity.BANDWIDTH:
+            self._update_sizes()
+
+    def get_version(self, topic):
+        """
+        :returns: identifies the inputs of the densities of the topic, for caching what is drawn from them, ''tuple''
+        """
+        if self.mode == TimelineDensity.BANDWIDTH:
+            return (self.mode, self._sizes_version)
+        return (self.mode,)
+
+    def bags_updated(self):
+        """
+        Called by the timeline, without its lock held, when bags are added or their index has grown. The message sizes
+        are gathered again if the bandwidths are shown.
+        """
+        timeline = self._timeline_frame.scene()
+        if timeline is None:
+            return
+        with timeline._bag_lock:
+            bags_key = tuple((id(bag), bag_helper.get_file_size(bag), sum(len(index) for index in bag._connection_indexes.values()))
+                             for bag in timeline._bags)
+        with self._lock:
+            self._bags_key = bags_key
+        if self.mode == TimelineDensity.BANDWIDTH:
+            self._update_sizes()
+
+    def get_densities(self, topic, stamp_left, stamp_right, columns):
+        """
+        :param topic: topic to measure, ''str''
+        :param stamp_left: stamp at the left edge of the first column, ''float''
+        :param stamp_right: stamp at the right edge of the last column, ''float''
+        :param columns: number of columns, ''int''
+        :returns: messages or bytes per second in each column or None if they aren't known (yet), ''numpy.array''
+        """
+        if self.mode is None or columns < 1 or stamp_right <= stamp_left:
+            return None
+
+        cumulative = self._get_cumulative(topic)
+        if cumulative is None:
+            return None
+        key, stamps, weights = cumulative
+
+        cache_key = (self.mode, topic)
+        zoom_key = (key, stamp_left, stamp_right, columns)
+        cached = self._densities.setdefault(cache_key, collections.OrderedDict())
+        densities = cached.pop(zoom_key, None)
+        if densities is None:
+            edges = numpy.linspace(stamp_left, stamp_right, columns + 1)
+            indexes = numpy.searchsorted(stamps, edges, side='left')
+            if weights is None:
+                totals = numpy.diff(indexes)
+            else:
+                totals = numpy.diff(weights[indexes])
+            densities = totals / ((stamp_right - stamp_left) / float(columns))
+            while len(cached) >= self._max_cached_zoom_levels:
+                cached.popitem(last=False)
+        cached[zoom_key] = densities
+        return densities
+
+    def format_density(self, density):
+        """
+        :returns: human-readable density in the current mode, ''str''
+        """
+        if self.mode == TimelineDensity.BANDWIDTH:
+            return bag_helper.filesize_to_str(max(1, density)) + '/s'
+        return '%.1f msgs/s' % density
+
+    def stop(self):
+        if self._sizes_thread:
+            self._sizes_thread.stop()
+
+    def _get_cumulative(self, topic):
+        """
+        :returns: (key, stamps, running total of the message sizes or None to count messages) of the topic, ''tuple''
+        """
+        if self.mode == TimelineDensity.RATE:
+            all_stamps = self._timeline_frame.index_cache.get(topic)
+            if not all_stamps:
+                return None
+            key = (id(all_stamps), len(all_stamps))
+        else:
+            with self._lock:
+                sizes = self._sizes.get(topic)
+            if sizes is None:
+                return None
+            key = self._sizes_version
+
+        cached = self._cumulative.get((self.mode, topic))
+        if cached is not None and cached[0] == key:
+            return cached
+
+        if self.mode == TimelineDensity.RATE:
+            cached = (key, numpy.array(all_stamps[:key[1]], dtype=numpy.float64), None)
+        else:
+            stamps, message_sizes = sizes
+            weights = numpy.zeros(len(message_sizes) + 1, dtype=numpy.float64)
+            numpy.cumsum(message_sizes, out=weights[1:])
+            cached = (key, stamps, weights)
+        self._cumulative[(self.mode, topic)] = cached
+        return cached
+
+    def _update_sizes(self):
+        """
+        Starts gathering the message sizes again if bags were added or have grown since they were last gathered.
+        """
+        timeline = self._timeline_frame.scene()
+        if timeline is None:
+            return
+        with timeline._bag_lock:
+            bags = list(timeline._bags)
+        with self._lock:
+            if self._bags_key == self._sizes_key or self._sizes_thread is not None:
+                # unchanged, or gathered again when the running thread is done
+                return
+            self._sizes_key = self._bags_key
+            self._sizes_thread = MessageSizeThread(self, timeline, bags)
+
+    def _set_sizes(self, sizes):
+        """
+        Called by the MessageSizeThread when it is done.
+        """
+        with self._lock:
+            self._sizes = sizes
+            self._sizes_version += 1
+            self._sizes_thread = None
+        if self.mode == TimelineDensity.BANDWIDTH:
+            self._update_sizes()
+
+
+class MessageSizeThread(threading.Thread):
+    """
+    Gathers the message sizes of all topics in the bags.
+    """
+    def __init__(self, density, timeline, bags):
+        threading.Thread.__init__(self)
+
+        self.density = density
+        self.timeline = timeline
+        self.bags = bags
+
+        self._stop_flag = False
+
+        self.setDaemon(True)
+        self.start()
+
+    def run(self):
+        topic_sizes = {}
+        for bag in self.bags:
+            if self._stop_flag:
+                return
+            with self.timeline._bag_lock:
+                connection_entries = [(c.topic, list(bag._connection_indexes.get(c.id, []))) for c in bag._get_connections()]
+                chunk_sizes = dict((pos, header.uncompressed_size) for pos, header in bag._chunk_headers.items())
+            for topic, sizes in get_message_sizes(connection_entries, chunk_sizes).items():
+                topic_sizes.setdefault(topic, []).append(sizes)
+
+        merged = {}
+        for topic, sizes in topic_sizes.items():
+            stamps = numpy.concatenate([s for s, _ in sizes])
+            message_sizes = numpy.concatenate([m for _, m in sizes])
+            order = numpy.argsort(stamps, kind='mergesort')
+            merged[topic] = (stamps[order], message_sizes[order])
+
+        if not self._stop_flag:
+            self.density._set_sizes(merged)
+            self.timeline.request_update()
+
+    def stop(self):
+        self._stop_flag = True
+
+
+def get_message_sizes(connection_entries, chunk_sizes):
+    """
+    Compute the size of every message record of a bag from its index entries.
+
+    A record extends to the next record in the same chunk, or to the end of its chunk.
+    :param connection_entries: (topic, list of index entries) of each connection in the bag, ''list''
+    :param chunk_sizes: uncompressed size of the chunks by position, ''dict(int, int)''
+    :returns: topic -> (stamps, sizes) sorted by stamp, ''dict(str, (numpy.array, numpy.array))''
+    """
+    total = sum(len(entries) for _, entries in connection_entries)
+    if total == 0:
+        return {}
+
+    stamps = numpy.empty(total, dtype=numpy.float64)
+    chunk_positions = numpy.empty(total, dtype=numpy.int64)
+    offsets = numpy.empty(total, dtype=numpy.int64)
+    start = 0
+    for _, entries in connection_entries:
+        end = start + len(entries)
+        stamps[start:end] = [entry.time.to_sec() for entry in entries]
+        # bag format 1.2 index entries have no chunk and an absolute offset
+        chunk_positions[start:end] = [getattr(entry, 'chunk_pos', 0) for entry in entries]
+        offsets[start:end] = [entry.offset for entry in entries]
+        start = end
+
+    order = numpy.lexsort((offsets, chunk_positions))
+    sorted_chunks = chunk_positions[order]
+    sorted_offsets = offsets[order]
+
+    record_ends = numpy.empty(total, dtype=numpy.int64)
+    record_ends[:-1] = sorted_offsets[1:]
+    last_in_chunk = numpy.ones(total, dtype=bool)
+    last_in_chunk[:-1] = sorted_chunks[1:] != sorted_chunks[:-1]
+    last_indexes = numpy.nonzero(last_in_chunk)[0]
+    # the size of a chunk that is still being written isn't known yet
+    record_ends[last_indexes] = [chunk_sizes.get(chunk, offset) for chunk, offset
+                                 in zip(sorted_chunks[last_indexes].tolist(), sorted_offsets[last_indexes].tolist())]
+
+    sizes = numpy.empty(total, dtype=numpy.int64)
+    sizes[order] = record_ends - sorted_offsets
+
+    topic_slices = {}
+    start = 0
+    for topic, entries in connection_entries:
+        end = start + len(entries)
+        topic_slices.setdefault(topic, []).append(slice(start, end))
+        start = end
+
+    topic_sizes = {}
+    for topic, slices in topic_slices.items():
+        topic_stamps = numpy.concatenate([stamps[s] for s in slices])
+        topic_message_sizes = numpy.concatenate([sizes[s] for s in slices])
+        topic_order = numpy.argsort(topic_stamps, kind='mergesort')
+        topic_sizes[topic] = (topic_stamps[topic_order], topic_message_sizes[topic_order])
+    return topic_sizes
@@ -33,14 +33,20 @@
 
 from python_qt_binding.QtCore import qDebug, QPointF, QRectF, Qt, qWarning, Signal
 from python_qt_binding.QtGui import QBrush, QCursor, QColor, QFont, \
-                                    QFontMetrics, QPen, QPolygonF
+                                    QFontMetrics, QPainter, QPen, QPixmap, QPolygonF
 from python_qt_binding.QtWidgets import QGraphicsItem
 import rospy
 
 import bisect
+import math
 import threading
 
+import numpy
+
+from rqt_bag import bag_helper
+
 from .index_cache_thread import IndexCacheThread
+from .timeline_density import TimelineDensity
 from .plugins.raw_view import RawView
 
 
@@ -85,6 +91,7 @@ class TimelineFrame(QGraphicsItem):
         self._history_width = 0
         self._history_bottom = 0
         self._history_bounds = {}
+        self._density_bounds = {}  # topic -> bounds of the density strip under its history
         self._margin_left = 4
         self._margin_right = 20
         self._margin_bottom = 20
@@ -127,6 +134,11 @@ class TimelineFrame(QGraphicsItem):
         self._topic_vertical_padding = 4
         self._topic_name_max_percent = 25.0  # percentage of the horiz space that can be used for topic display
 
+        # Search Rendering
+        self.search_markers = {}  # topic -> sorted stamps in secs of the messages matching the last search
+        self._stamp_arrays = {}  # topic -> (index cache, array of its stamps, number of stamps in the array)
+        self._search_marker_color = QColor(220, 40, 40, 200)
+
         # Time Rendering
         self._time_tick_height = 5
         self._time_font_height = None
@@ -150,6 +162,10 @@ class TimelineFrame(QGraphicsItem):
         self._default_msg_combine_px = 1.0  # minimum number of pixels allowed between two bag messages before they are combined
         self._active_message_line_width = 3
 
+        # Rate/bandwidth density strips
+        self._density = TimelineDensity(self)
+        self._density_label_padding = 2
+
         # Selected Region Rendering
         self._selected_region_color = QColor(0, 179, 0, 21)
         self._selected_region_outline_top_color = QColor(0.0, 77, 0.0, 51)
@@ -173,6 +189,9 @@ class TimelineFrame(QGraphicsItem):
         self._min_zoom = 0.0001  # max zoom out (in px/s)
         self._max_zoom = 50000.0  # max zoom in  (in px/s)
 
+        # Layer Rendering
+        self._layers = {}  # layer name -> (key of the inputs the layer was rendered from, QPixmap)
+
         # Plugin management
         self._viewer_types = {}
         self._timeline_renderers = {}
@@ -194,14 +213,16 @@ class TimelineFrame(QGraphicsItem):
 
     def _set_playhead(self, playhead):
         """
-        Sets the playhead to the new position, notifies the threads and updates the scene so it will redraw
-        :signal: emits status_bar_changed_signal if the playhead is successfully set
+        Sets the playhead to the new position, notifies the threads and requests a repaint of the scene
+        :signal: requests status_bar_changed_signal if the playhead is successfully set
         :param playhead: Time to set the playhead to, ''rospy.Time()''
         """
         with self.scene()._playhead_lock:
             if playhead == self._playhead:
                 return
 
+            old_playhead = self._playhead
+            old_view = (self._stamp_left, self._stamp_right)
             self._playhead = playhead
             if self._playhead != self._end_stamp:
                 self.scene().stick_to_end = False
@@ -231,8 +252,14 @@ class TimelineFrame(QGraphicsItem):
                 with self.scene()._playhead_positions_cvs[topic]:
                     self.scene()._playhead_positions[topic] = new_playhead_position
                     self.scene()._playhead_positions_cvs[topic].notify_all()  # notify all message loaders that a new message needs to be loaded
-            self.scene().update()
-            self.scene().status_bar_changed_signal.emit()
+
+            # Only the playhead needs repainting, unless the view moved or other elements follow the playhead
+            if old_playhead is None or old_view != (self._stamp_left, self._stamp_right) or \
+                    self.scene()._listeners or self._selecting_mode == _SelectionMode.LEFT_MARKED:
+                self.scene().request_update()
+            else:
+                self.scene().request_update(self._get_playhead_rect(old_playhead).united(self._get_playhead_rect(playhead)))
+            self.scene().request_status_update()
 
     playhead = property(_get_playhead, _set_playhead)
 
@@ -274,15 +301,58 @@ class TimelineFrame(QGraphicsItem):
             return
 
         self._layout()
-        self._draw_topic_dividers(painter)
+
+        # The static parts of the frame and the topic histories are drawn from cached layers which are only
+        # rendered again when their inputs change; the selection and the playhead are drawn on top of them.
+        frame_key = self._get_frame_layer_key()
+        frame_rect = self.boundingRect()
+        self._draw_layer(painter, 'background', frame_key, frame_rect, self._draw_background)
         self._draw_selected_region(painter)
-        self._draw_time_divisions(painter)
         self._draw_topic_histories(painter)
+        self._draw_search_markers(painter)
+        self._draw_layer(painter, 'labels', frame_key, frame_rect, self._draw_labels)
+        self._draw_playhead(painter)
+    # END QGraphicsItem implementation
+
+    # Layer Functions
+
+    def _draw_layer(self, painter, name, key, rect, draw_function):
+        """
+        Draws a layer from its cached pixmap, rendering the pixmap again first if the key of the layer has changed
+        :param painter: allows access to paint functions,''QPainter''
+        :param name: name of the layer, ''str''
+        :param key: inputs the layer depends on, ''tuple''
+        :param rect: scene area covered by the layer, ''QRectF''
+        :param draw_function: function drawing the layer with the painter it's given, ''function''
+        """
+        cached = self._layers.get(name)
+        if cached is None or cached[0] != key:
+            pixmap = QPixmap(max(1, int(math.ceil(rect.width()))), max(1, int(math.ceil(rect.height()))))
+            pixmap.fill(Qt.transparent)
+            layer_painter = QPainter(pixmap)
+            layer_painter.translate(-rect.x(), -rect.y())
+            draw_function(layer_painter)
+            layer_painter.end()
+            cached = (key, pixmap)
+            self._layers[name] = cached
+        painter.drawPixmap(rect.topLeft(), cached[1])
+
+    def _get_frame_layer_key(self):
+        """
+        :returns: the inputs the frame layers and every topic layer depend on, ''tuple''
+        """
+        return (self.scene().width(), self._scene_width, self._history_left, self._history_width, self._history_top, self._history_bottom,
+                self._stamp_left, self._stamp_right, self._start_stamp, self._end_stamp, tuple(sorted(self._history_bounds.items())),
+                tuple(sorted(self._density_bounds.items())))
+
+    def _draw_background(self, painter):
+        self._draw_topic_dividers(painter)
+        self._draw_time_divisions(painter)
+
+    def _draw_labels(self, painter):
         self._draw_bag_ends(painter)
         self._draw_topic_names(painter)
         self._draw_history_border(painter)
-        self._draw_playhead(painter)
-    # END QGraphicsItem implementation
 
     # Drawing Functions
 
@@ -352,8 +422,9 @@ class TimelineFrame(QGraphicsItem):
         self._history_left = new_history_left
         self._history_width = new_history_width
 
-        # Calculate the bounds for each topic
+        # Calculate the bounds for each topic, and of its density strip when the densities are shown
         self._history_bounds = {}
+        self._density_bounds = {}
         y = self._history_top
         for topic in self.topics:
             datatype = self.scene().get_datatype(topic)
@@ -370,8 +441,14 @@ class TimelineFrame(QGraphicsItem):
 
             y += topic_height
 
+            if self._density.mode is not None:
+                density_height = self._topic_font_height + self._topic_vertical_padding
+                self._density_bounds[topic] = (self._history_left, y, self._history_width, density_height)
+                y += density_height
+
 #        new_history_bottom = max([y + h for (x, y, w, h) in self._history_bounds.values()]) - 1
-        new_history_bottom = max([y + h for (_, y, _, h) in self._history_bounds.values()]) - 1
+        all_bounds = list(self._history_bounds.values()) + list(self._density_bounds.values())
+        new_history_bottom = max([y + h for (_, y, _, h) in all_bounds]) - 1
         if new_history_bottom != self._history_bottom:
             self._history_bottom = new_history_bottom
 
@@ -380,8 +457,89 @@ class TimelineFrame(QGraphicsItem):
         Draw all topic messages
         :param painter: allows access to paint functions,''QPainter''
         """
+        # Forget the layers of topics that are gone, and the density layers when the densities are hidden
+        for name in list(self._layers.keys()):
+            if not isinstance(name, tuple):
+                continue
+            topic_bounds = self._density_bounds if name[0] == 'density' else self._history_bounds
+            if name[1] not in topic_bounds:
+                del self._layers[name]
+
+        frame_key = self._get_frame_layer_key()
         for topic in sorted(self._history_bounds.keys()):
-            self._draw_topic_history(painter, topic)
+            if topic not in self.index_cache:
+                continue
+            all_stamps = self.index_cache[topic]
+            x, y, w, h = self._history_bounds[topic]
+            topic_rect = QRectF(x, y, w, h + 1)
+            datatype = self.scene().get_datatype(topic)
+            topic_key = frame_key + (datatype, id(all_stamps), len(all_stamps))
+
+            self._draw_layer(painter, ('history', topic), topic_key, topic_rect,
+                             lambda layer_painter: self._draw_topic_history(layer_painter, topic))
+            if topic in self._density_bounds:
+                density_x, density_y, density_w, density_h = self._density_bounds[topic]
+                density_key = topic_key + self._density.get_version(topic)
+                self._draw_layer(painter, ('density', topic), density_key, QRectF(density_x, density_y, density_w, density_h + 1),
+                                 lambda layer_painter: self._draw_topic_density(layer_painter, topic))
+            self._draw_active_message(painter, topic)
+
+            renderer = None
+            if topic in self._rendered_topics:
+                renderer = self._timeline_renderers.get(datatype)
+            if renderer is None:
+                self._layers.pop(('renderer', topic), None)
+                continue
+            output_version = renderer.get_output_version(topic)
+            if output_version is None:
+                # the renderer's output can't be cached
+                self._draw_topic_renderer(painter, topic)
+            else:
+                renderer_key = topic_key + (id(renderer), renderer.msg_combine_px, output_version)
+                self._draw_layer(painter, ('renderer', topic), renderer_key, topic_rect,
+                                 lambda layer_painter: self._draw_topic_renderer(layer_painter, topic))
+
+            painter.setBrush(self._default_brush)
+            painter.setPen(self._default_pen)
+
+    def _draw_search_markers(self, painter):
+        """
+        Draw a line over the topic history at the stamps found by searching the messages of the topic, one line per
+        pixel column
+        :param painter: allows access to paint functions,''QPainter''
+        """
+        if not self.search_markers:
+            return
+        painter.setPen(QPen(self._search_marker_color))
+        for topic, stamps in list(self.search_markers.items()):
+            if topic not in self._history_bounds:
+                continue
+            _, y, _, h = self._history_bounds[topic]
+            start_index = bisect.bisect_left(stamps, self._stamp_left)
+            end_index = bisect.bisect_right(stamps, self._stamp_right)
+            drawn_x = set()
+            for stamp in stamps[start_index:end_index]:
+                x = int(self.map_stamp_to_x(stamp))
+                if x not in drawn_x:
+                    drawn_x.add(x)
+                    painter.drawLine(x, y, x, y + h)
+        painter.setPen(self._default_pen)
+
+    def add_search_markers(self, topic, stamps):
+        """
+        Can be called from any thread.
+        :param topic: topic the stamps were found in, ''str''
+        :param stamps: stamps in secs of the matching messages, ''list(float)''
+        """
+        # the list is replaced rather than changed, for the paint running at the same time
+        self.search_markers[topic] = sorted(self.search_markers.get(topic, []) + list(stamps))
+
+    def clear_search_markers(self, topic=None):
+        if topic is None:
+            self.search_markers = {}
+        else:
+            self.search_markers.pop(topic, None)
+        self.scene().request_update()
 
     def _draw_topic_history(self, painter, topic):
         """
@@ -398,70 +556,117 @@ class TimelineFrame(QGraphicsItem):
 
         datatype = self.scene().get_datatype(topic)
 
-        # Get the renderer and the message combine interval
-        renderer = None
-        msg_combine_interval = None
-        if topic in self._rendered_topics:
-            renderer = self._timeline_renderers.get(datatype)
-            if not renderer is None:
-                msg_combine_interval = self.map_dx_to_dstamp(renderer.msg_combine_px)
-        if msg_combine_interval is None:
-            msg_combine_interval = self.map_dx_to_dstamp(self._default_msg_combine_px)
-
         # Get the cache
         if topic not in self.index_cache:
             return
-        all_stamps = self.index_cache[topic]
 
-#        start_index = bisect.bisect_left(all_stamps, self._stamp_left)
-        end_index = bisect.bisect_left(all_stamps, self._stamp_right)
         # Set pen based on datatype
         datatype_color = self._datatype_colors.get(datatype, self._default_datatype_color)
-        # Iterate through regions of connected messages
-        width_interval = self._history_width / (self._stamp_right - self._stamp_left)
 
-        # Draw stamps
-        for (stamp_start, stamp_end) in self._find_regions(all_stamps[:end_index], self.map_dx_to_dstamp(self._default_msg_combine_px)):
-            if stamp_end < self._stamp_left:
-                continue
-
-            region_x_start = self._history_left + (stamp_start - self._stamp_left) * width_interval
-            if region_x_start < self._history_left:
-                region_x_start = self._history_left  # Clip the region
-            region_x_end = self._history_left + (stamp_end - self._stamp_left) * width_interval
-            region_width = max(1, region_x_end - region_x_start)
+        # Draw the regions of connected messages, clipped to the left of the history
+        stamp_starts, stamp_ends = self._get_visible_regions(topic, self.map_dx_to_dstamp(self._default_msg_combine_px))
+        xs, x_ends = self._map_regions_to_x(stamp_starts, stamp_ends)
+        xs = numpy.maximum(xs, self._history_left)
+        widths = numpy.maximum(1, x_ends - xs)
 
+        if len(xs):
             painter.setBrush(QBrush(datatype_color))
             painter.setPen(QPen(datatype_color, 1))
-            painter.drawRect(region_x_start, msg_y, region_width, msg_height)
-
-        # Draw active message
-        if topic in self.scene()._listeners:
-            curpen = painter.pen()
-            oldwidth = curpen.width()
-            curpen.setWidth(self._active_message_line_width)
-            painter.setPen(curpen)
-            playhead_stamp = None
-            playhead_index = bisect.bisect_right(all_stamps, self.playhead.to_sec()) - 1
-            if playhead_index >= 0:
-                playhead_stamp = all_stamps[playhead_index]
-                if playhead_stamp > self._stamp_left and playhead_stamp < self._stamp_right:
-                    playhead_x = self._history_left + (all_stamps[playhead_index] - self._stamp_left) * width_interval
-                    painter.drawLine(playhead_x, msg_y, playhead_x, msg_y + msg_height)
-            curpen.setWidth(oldwidth)
-            painter.setPen(curpen)
-
-        # Custom renderer
-        if renderer:
-            # Iterate through regions of connected messages
-            for (stamp_start, stamp_end) in self._find_regions(all_stamps[:end_index], msg_combine_interval):
-                if stamp_end < self._stamp_left:
-                    continue
-
-                region_x_start = self._history_left + (stamp_start - self._stamp_left) * width_interval
-                region_x_end = self._history_left + (stamp_end - self._stamp_left) * width_interval
-                region_width = max(1, region_x_end - region_x_start)
-                renderer.draw_timeline_segment(painter, topic, stamp_start, stamp_end, region_x_start, msg_y, region_width, msg_height)
+            painter.drawRects([QRectF(x, msg_y, width, msg_height) for x, width in zip(xs.tolist(), widths.tolist())])
+
+        painter.setBrush(self._default_brush)
+        painter.setPen(self._default_pen)
+
+    def _draw_topic_density(self, painter, topic):
+        """
+        Draw the message rate or bandwidth of the topic in each pixel column of the timeline, scaled to its peak, in
+        the strip under the topic's message regions.
+        :param painter: allows access to paint functions,''QPainter''
+        :param topic: the topic for which the density should be drawn, ''str''
+        """
+        x, y, w, h = self._density_bounds[topic]
+        columns = int(w)
+        densities = self._density.get_densities(topic, self._stamp_left, self._stamp_right, columns)
+        if densities is None:
+            return
+        peak = densities.max()
+        if peak <= 0:
+            return
+
+        msg_y = y + 2
+        msg_bottom = y + h
+        tops = (msg_bottom - densities * ((h - 2) / peak)).tolist()
+
+        density_polygon = QPolygonF()
+        density_polygon.append(QPointF(x, msg_bottom))
+        for column, top in enumerate(tops):
+            density_polygon.append(QPointF(x + column, top))
+            density_polygon.append(QPointF(x + column + 1, top))
+        density_polygon.append(QPointF(x + columns, msg_bottom))
+
+        datatype_color = self._datatype_colors.get(self.scene().get_datatype(topic), self._default_datatype_color)
+        painter.setBrush(QBrush(datatype_color))
+        painter.setPen(Qt.NoPen)
+        painter.drawPolygon(density_polygon)
+
+        # Label the peak so the strips of different topics can be compared
+        label = self._density.format_density(peak)
+        painter.setFont(self._topic_font)
+        painter.setPen(self._default_pen)
+        label_x = x + w - self._qfont_width(label) - self._density_label_padding
+        painter.drawText(label_x, msg_y + self._topic_font_height - self._density_label_padding, label)
+
+        painter.setBrush(self._default_brush)
+        painter.setPen(self._default_pen)
+
+    def _draw_active_message(self, painter, topic):
+        """
+        Draw a line at the message of the topic that is currently viewed.
+        :param painter: allows access to paint functions,''QPainter''
+        :param topic: the topic for which the active message should be drawn, ''str''
+        """
+        if topic not in self.scene()._listeners or topic not in self.index_cache:
+            return
+
+        _, y, _, h = self._history_bounds[topic]
+        msg_y = y + 2
+        msg_height = h - 2
+        all_stamps = self.index_cache[topic]
+        width_interval = self._history_width / (self._stamp_right - self._stamp_left)
+
+        datatype_color = self._datatype_colors.get(self.scene().get_datatype(topic), self._default_datatype_color)
+        painter.setPen(QPen(datatype_color, self._active_message_line_width))
+        playhead_index = bisect.bisect_right(all_stamps, self.playhead.to_sec()) - 1
+        if playhead_index >= 0:
+            playhead_stamp = all_stamps[playhead_index]
+            if playhead_stamp > self._stamp_left and playhead_stamp < self._stamp_right:
+                playhead_x = self._history_left + (all_stamps[playhead_index] - self._stamp_left) * width_interval
+                painter.drawLine(playhead_x, msg_y, playhead_x, msg_y + msg_height)
+
+        painter.setBrush(self._default_brush)
+        painter.setPen(self._default_pen)
+
+    def _draw_topic_renderer(self, painter, topic):
+        """
+        Let the topic's timeline renderer draw the message regions on the timeline.
+        :param painter: allows access to paint functions,''QPainter''
+        :param topic: the topic to render, ''str''
+        """
+        _, y, _, h = self._history_bounds[topic]
+        msg_y = y + 2
+        msg_height = h - 2
+
+        renderer = self._timeline_renderers.get(self.scene().get_datatype(topic))
+        if renderer is None or topic not in self.index_cache:
+            return
+        msg_combine_interval = self.map_dx_to_dstamp(renderer.msg_combine_px)
+
+        # Regions of connected messages
+        stamp_starts, stamp_ends = self._get_visible_regions(topic, msg_combine_interval)
+        if len(stamp_starts):
+            xs, x_ends = self._map_regions_to_x(stamp_starts, stamp_ends)
+            widths = numpy.maximum(1, x_ends - xs)
+            renderer.draw_timeline_segments(painter, topic, stamp_starts, stamp_ends, xs, msg_y, widths, msg_height)
 
         painter.setBrush(self._default_brush)
         painter.setPen(self._default_pen)
@@ -489,6 +694,9 @@ class TimelineFrame(QGraphicsItem):
         row = 0
         for topic in self.topics:
             (x, y, w, h) = self._history_bounds[topic]
+            if topic in self._density_bounds:
+                # the density strip is part of the topic's row
+                h += self._density_bounds[topic][3]
 
             if row % 2 == 0:
                 painter.setPen(Qt.lightGray)
@@ -565,6 +773,15 @@ class TimelineFrame(QGraphicsItem):
         painter.setBrush(self._default_brush)
         painter.setPen(self._default_pen)
 
+    def _get_playhead_rect(self, playhead):
+        """
+        :returns: area covered by the playhead drawn at the given position, ''QRectF''
+        """
+        px = self.map_stamp_to_x(playhead.to_sec())
+        pw, ph = self._playhead_pointer_size
+        top = self._history_top - ph - 1
+        return QRectF(px - pw - 1, top, 2 * pw + 2, self._history_bottom + ph + 3 - top)
+
     def _draw_history_border(self, painter):
         """
         Draw a simple black rectangle frame around the timeline view area
@@ -666,6 +883,7 @@ class TimelineFrame(QGraphicsItem):
         for renderer in self._timeline_renderers.values():
             renderer.close()
         self._index_cache_thread.stop()
+        self._density.stop()
 
     # Plugin interaction functions
 
@@ -757,6 +975,19 @@ class TimelineFrame(QGraphicsItem):
             self._rendered_topics.remove(topic)
         self.scene().update()
 
+    # Density functions
+
+    def get_density_mode(self):
+        return self._density.mode
+
+    def set_density_mode(self, mode):
+        """
+        Show the message rate or bandwidth of every topic in a strip under its message regions.
+        :param mode: None, TimelineDensity.RATE or TimelineDensity.BANDWIDTH, ''str''
+        """
+        self._density.set_mode(mode)
+        self.scene().request_update()
+
     # Index Caching functions
 
     def _update_index_cache(self, topic):
@@ -786,6 +1017,20 @@ class TimelineFrame(QGraphicsItem):
 
         end_time = self._end_stamp
 
+        # The index of bags that haven't been read yet is read up to the right of the view, the cache stops in front
+        # of the first bag left unread so that it is extended once that bag is read
+        timeline = self.scene()
+        if timeline._lazy_bags:
+            if self._stamp_right is not None:
+                timeline._load_lazy_bags(timeline._get_lazy_bags(start_time, rospy.Time.from_sec(self._stamp_right)))
+            lazy_bags = timeline._get_lazy_bags(start_time, end_time)
+            if lazy_bags:
+                end_time = min(bag_helper.get_start_stamp(bag) for bag in lazy_bags) - rospy.Duration(0, 1)
+                if end_time < start_time:
+                    if topic in self.invalidated_caches:
+                        self.invalidated_caches.remove(topic)
+                    return 0
+
         topic_cache_len = len(topic_cache)
 
         for entry in self.scene().get_entries(topic, start_time, end_time):
@@ -796,26 +1041,55 @@ class TimelineFrame(QGraphicsItem):
 
         return len(topic_cache) - topic_cache_len
 
-    def _find_regions(self, stamps, max_interval):
+    def _get_visible_regions(self, topic, max_interval):
         """
-        Group timestamps into regions connected by timestamps less than max_interval secs apart
-        :param start_stamp: a list of stamps, ''list''
-        :param stamp_step: seconds between each division, ''int''
+        Group the stamps of the topic up to the right of the view into regions connected by stamps less than
+        max_interval secs apart, keeping the regions that end in view
+        :param topic: topic of the stamps in the index cache, ''str''
+        :param max_interval: secs between stamps of a region, ''float''
+        :returns: starts and ends of the regions, ''(numpy.array, numpy.array)''
         """
-        region_start, prev_stamp = None, None
-        for stamp in stamps:
-            if prev_stamp:
-                if stamp - prev_stamp > max_interval:
-                    region_end = prev_stamp
-                    yield (region_start, region_end)
-                    region_start = stamp
-            else:
-                region_start = stamp
-
-            prev_stamp = stamp
+        stamps = self._get_stamp_array(topic)
+        stamps = stamps[:numpy.searchsorted(stamps, self._stamp_right, side='left')]
+        if len(stamps) == 0:
+            return stamps, stamps
+        gaps = numpy.flatnonzero(numpy.diff(stamps) > max_interval)
+        stamp_starts = stamps[numpy.concatenate(([0], gaps + 1))]
+        stamp_ends = stamps[numpy.concatenate((gaps, [len(stamps) - 1]))]
+        visible = stamp_ends >= self._stamp_left
+        return stamp_starts[visible], stamp_ends[visible]
+
+    def _map_regions_to_x(self, stamp_starts, stamp_ends):
+        """
+        :returns: x of the starts and ends of the regions, ''(numpy.array, numpy.array)''
+        """
+        width_interval = self._history_width / (self._stamp_right - self._stamp_left)
+        xs = self._history_left + (stamp_starts - self._stamp_left) * width_interval
+        x_ends = self._history_left + (stamp_ends - self._stamp_left) * width_interval
+        return xs, x_ends
 
-        if region_start and prev_stamp:
-            yield (region_start, prev_stamp)
+    def _get_stamp_array(self, topic):
+        """
+        :returns: the index cache of the topic as an array, extended with the stamps appended to the cache since the
+                  last call, ''numpy.array''
+        """
+        all_stamps = self.index_cache.get(topic, [])
+        cached = self._stamp_arrays.get(topic)
+        if cached is None or cached[0] is not all_stamps or cached[2] > len(all_stamps):
+            buffer = numpy.array(all_stamps, dtype=numpy.float64)
+            cached = (all_stamps, buffer, len(buffer))
+        elif cached[2] < len(all_stamps):
+            _, buffer, size = cached
+            new_size = len(all_stamps)
+            if new_size > len(buffer):
+                # grown by doubling, so appending while recording is amortized O(1)
+                grown = numpy.empty(max(new_size, 2 * len(buffer)), dtype=numpy.float64)
+                grown[:size] = buffer[:size]
+                buffer = grown
+            buffer[size:new_size] = all_stamps[size:new_size]
+            cached = (all_stamps, buffer, new_size)
+        self._stamp_arrays[topic] = cached
+        return cached[1][:cached[2]]
 
     def _get_stamps(self, start_stamp, stamp_step):
         """
@@ -930,6 +1204,24 @@ class TimelineFrame(QGraphicsItem):
     def set_timeline_view(self, stamp_left, stamp_right):
         self._stamp_left = stamp_left
         self._stamp_right = stamp_right
+        self._request_lazy_bags()
+
+    def _request_lazy_bags(self):
+        """
+        Wakes the index cache thread to read the index of the bags in view that haven't been read yet. Doesn't wait
+        for the thread when it is busy, it picks up the invalidated caches when it is done.
+        """
+        timeline = self.scene()
+        if timeline is None or not timeline._lazy_bags or self._stamp_right is None:
+            return
+        if not timeline._get_lazy_bags(None, rospy.Time.from_sec(self._stamp_right)):
+            return
+        self.invalidated_caches.update(self.topics)
+        if self.index_cache_cv.acquire(False):
+            try:
+                self.index_cache_cv.notify()
+            finally:
+                self.index_cache_cv.release()
 
     def translate_timeline(self, dstamp):
         self.set_timeline_view(self._stamp_left + dstamp, self._stamp_right + dstamp)
@@ -988,6 +1280,7 @@ class TimelineFrame(QGraphicsItem):
             return
 
         self._stamp_left, self._stamp_right = interval
+        self._request_lazy_bags()
 
         self.scene().update()
 
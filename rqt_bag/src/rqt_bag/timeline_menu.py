@@ -30,7 +30,9 @@
 # ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
-from python_qt_binding.QtWidgets import QVBoxLayout, QMenu, QWidget, QDockWidget
+from python_qt_binding.QtWidgets import QVBoxLayout, QMenu, QWidget, QDockWidget, QInputDialog, QMessageBox
+
+from .timeline_density import TimelineDensity
 
 class TopicPopupWidget(QWidget):
     def __init__(self, popup_name, timeline, viewer_type, topic):
@@ -137,6 +139,31 @@ class TimelinePopupMenu(QMenu):
                     self._thumbnail_actions[-1].setCheckable(True)
                     self._thumbnail_actions[-1].setChecked(self.timeline._timeline_frame.is_renderer_active(topic))
 
+        # create density menu items
+        submenu = self.addMenu('Density...')
+        self._density_actions = {}
+        density_modes = [(None, 'None'), (TimelineDensity.RATE, 'Messages/s'), (TimelineDensity.BANDWIDTH, 'Bytes/s')]
+        for mode, name in density_modes:
+            density_action = submenu.addAction(name)
+            density_action.setCheckable(True)
+            density_action.setChecked(self.timeline._timeline_frame.get_density_mode() == mode)
+            self._density_actions[density_action] = mode
+
+        # create search menu items
+        self._search_actions = []
+        if menu_topic is None:
+            submenu = self.addMenu('Search...')
+            for topic in self.timeline._timeline_frame.topics:
+                self._search_actions.append(submenu.addAction(topic))
+        else:
+            self._search_actions.append(self.addAction('Search...'))
+        self._cancel_search_action = None
+        if self.timeline.background_task is not None and self.timeline.background_task.startswith('Searching'):
+            self._cancel_search_action = self.addAction('Cancel Search')
+        self._clear_search_action = None
+        if self.timeline._timeline_frame.search_markers:
+            self._clear_search_action = self.addAction('Clear Search Results')
+
         # create view menu items
         self._topic_actions = []
         self._type_actions = []
@@ -185,6 +212,8 @@ class TimelinePopupMenu(QMenu):
 
         self.addSeparator()
 
+        self._diagnostics_action = self.addAction('Diagnostics')
+
         # create publish menu items
         self._publish_actions = []
         if menu_topic is None:
@@ -233,6 +262,27 @@ class TimelinePopupMenu(QMenu):
             self.timeline._timeline_frame.set_renderers_active(True)
         elif action == self._thumbnail_hide_action:
             self.timeline._timeline_frame.set_renderers_active(False)
+        elif action in self._density_actions:
+            self.timeline._timeline_frame.set_density_mode(self._density_actions[action])
+        elif action in self._search_actions:
+            if self._menu_topic is None:
+                topic = action.text()
+            else:
+                topic = self._menu_topic
+            predicate, ok = QInputDialog.getText(None, 'Search %s' % topic,
+                                                 'Find the messages in the selected region where\n'
+                                                 '(e.g. "linear.x > 2" or "status[*].level == 2"):')
+            if ok and predicate:
+                try:
+                    self.timeline.search_messages(topic, predicate)
+                except ValueError as ex:
+                    QMessageBox(QMessageBox.Warning, 'rqt_bag', str(ex), QMessageBox.Ok).exec_()
+        elif action == self._cancel_search_action:
+            self.timeline.cancel_background_task()
+        elif action == self._clear_search_action:
+            self.timeline._timeline_frame.clear_search_markers()
+        elif action == self._diagnostics_action:
+            self.timeline.show_diagnostics()
         elif action in self._thumbnail_actions:
             if self._menu_topic is None:
                 topic = action.text()
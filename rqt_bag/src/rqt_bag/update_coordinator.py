@@ -0,0 +1,148 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import threading
+import time
+
+from python_qt_binding.QtCore import QObject, QRectF, QTimer, Signal
+from python_qt_binding.QtGui import QGuiApplication
+
+
+class UpdateCoordinator(QObject):
+    """
+    Coalesces scene repaints and status bar updates, so that they happen at most once per display frame.
+
+    Requests can be made from any thread; the scene is updated from the GUI thread.
+    """
+    _schedule_signal = Signal()
+
+    def __init__(self, timeline, frame_rate=None):
+        """
+        :param timeline: scene to update, ''BagTimeline''
+        :param frame_rate: maximum number of repaints per second, defaults to the refresh rate of the primary screen, ''float''
+        """
+        super(UpdateCoordinator, self).__init__()
+        self._timeline = timeline
+
+        if frame_rate is None:
+            screen = QGuiApplication.primaryScreen()
+            frame_rate = screen.refreshRate() if screen is not None else 0.0
+            if frame_rate <= 0.0:
+                frame_rate = 60.0
+        self._frame_interval = 1.0 / frame_rate
+
+        self._lock = threading.Lock()
+        self._dirty_rect = None  # QRectF to repaint, or True to repaint the whole scene
+        self._status_dirty = False
+        self._last_flush = 0.0
+
+        self.repaints_requested = 0
+        self.repaints_performed = 0
+        self.status_updates_requested = 0
+        self.status_updates_performed = 0
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._flush)
+        self._schedule_signal.connect(self._schedule)
+
+    @property
+    def repaints_skipped(self):
+        return self.repaints_requested - self.repaints_performed
+
+    @property
+    def status_updates_skipped(self):
+        return self.status_updates_requested - self.status_updates_performed
+
+    def request_update(self, rect=None):
+        """
+        Requests a repaint of the scene
+        :param rect: area of the scene that needs to be repainted, or None for the whole scene, ''QRectF''
+        """
+        with self._lock:
+            self.repaints_requested += 1
+            if rect is None or self._dirty_rect is True:
+                self._dirty_rect = True
+            elif self._dirty_rect is None:
+                self._dirty_rect = QRectF(rect)
+            else:
+                self._dirty_rect = self._dirty_rect.united(rect)
+        self._schedule_signal.emit()
+
+    def request_status_update(self):
+        """
+        Requests status_bar_changed_signal to be emitted
+        """
+        with self._lock:
+            self.status_updates_requested += 1
+            self._status_dirty = True
+        self._schedule_signal.emit()
+
+    def get_statistics(self):
+        """
+        :returns: number of requested, performed and skipped repaints and status updates, ''dict''
+        """
+        with self._lock:
+            return {
+                'repaints_requested': self.repaints_requested,
+                'repaints_performed': self.repaints_performed,
+                'repaints_skipped': self.repaints_skipped,
+                'status_updates_requested': self.status_updates_requested,
+                'status_updates_performed': self.status_updates_performed,
+                'status_updates_skipped': self.status_updates_skipped,
+            }
+
+    def stop(self):
+        self._timer.stop()
+
+    def _schedule(self):
+        if self._timer.isActive():
+            return
+        delay = self._frame_interval - (time.time() - self._last_flush)
+        self._timer.start(max(0, int(delay * 1000)))
+
+    def _flush(self):
+        with self._lock:
+            dirty_rect, self._dirty_rect = self._dirty_rect, None
+            status_dirty, self._status_dirty = self._status_dirty, False
+            if dirty_rect is not None:
+                self.repaints_performed += 1
+            if status_dirty:
+                self.status_updates_performed += 1
+        self._last_flush = time.time()
+
+        if dirty_rect is True:
+            self._timeline.update()
+        elif dirty_rect is not None:
+            self._timeline.update(dirty_rect)
+        if status_dirty:
+            self._timeline.status_bar_changed_signal.emit()
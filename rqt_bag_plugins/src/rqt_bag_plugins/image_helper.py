@@ -36,12 +36,18 @@ try:
     from cStringIO import StringIO
 except ImportError:
     from io import StringIO
+from io import BytesIO
 import sys
 
+import numpy
 from PIL import Image
 from PIL import ImageOps
 import cairo
 
+from python_qt_binding.QtGui import QImage
+
+_BAYER_ENCODINGS = ['bayer_rggb8', 'bayer_bggr8', 'bayer_gbrg8', 'bayer_grbg8']
+
 
 def imgmsg_to_pil(img_msg, rgba=True):
     try:
@@ -91,6 +97,121 @@ def imgmsg_to_pil(img_msg, rgba=True):
         return None
 
 
+def imgmsg_to_qimage(img_msg, min_height=None):
+    """
+    Convert an image message to an RGBA QImage using numpy, without building a PIL image for raw images.
+
+    If min_height is given, the image is downsampled by taking every n-th row and column while it is converted,
+    so that the result is still at least min_height pixels high.
+
+    @param img_msg: sensor_msgs/Image or sensor_msgs/CompressedImage
+    @param min_height: smallest height in pixels the caller needs, or None for full resolution
+    @type  min_height: int
+    @return: converted image or None if the image can't be converted
+    @rtype:  QImage
+    """
+    try:
+        rgba = imgmsg_to_rgba_array(img_msg, min_height)
+    except Exception as ex:
+        print('Can\'t convert image: %s' % ex, file=sys.stderr)
+        return None
+
+    height, width = rgba.shape[:2]
+    data = rgba.tobytes()
+    # copy so that the QImage owns its pixels after data goes out of scope
+    return QImage(data, width, height, width * 4, QImage.Format_RGBA8888).copy()
+
+
+def imgmsg_to_rgba_array(img_msg, min_height=None):
+    """
+    Convert an image message to an array of shape (height, width, 4) of uint8 RGBA pixels.
+
+    @param min_height: see imgmsg_to_qimage
+    @rtype: numpy.ndarray
+    """
+    if img_msg._type == 'sensor_msgs/CompressedImage':
+        pil_img = Image.open(BytesIO(img_msg.data))
+        if min_height:
+            # let the decoder downscale (e.g. JPEG DCT scaling) before the pixels are materialized
+            width = max(1, int(pil_img.size[0] * float(min_height) / pil_img.size[1]))
+            pil_img.draft(pil_img.mode, (width, min_height))
+        step = _get_stride(pil_img.size[1], min_height)
+        if pil_img.mode == 'L':
+            return _mono_to_rgba(numpy.asarray(pil_img)[::step, ::step])
+        # same channel order as imgmsg_to_pil
+        return _channels_to_rgba(numpy.asarray(pil_img.convert('RGB'))[::step, ::step], (2, 1, 0))
+
+    step = _get_stride(img_msg.height, min_height)
+    encoding = img_msg.encoding
+    if encoding == 'mono8' or encoding in _BAYER_ENCODINGS:
+        return _mono_to_rgba(_raw_array(img_msg, numpy.uint8, 1, step)[..., 0])
+    elif encoding == 'rgb8':
+        return _channels_to_rgba(_raw_array(img_msg, numpy.uint8, 3, step), (0, 1, 2))
+    elif encoding == 'bgr8':
+        return _channels_to_rgba(_raw_array(img_msg, numpy.uint8, 3, step), (2, 1, 0))
+    elif encoding == 'rgba8':
+        return _channels_to_rgba(_raw_array(img_msg, numpy.uint8, 4, step), (0, 1, 2, 3))
+    elif encoding == 'bgra8':
+        return _channels_to_rgba(_raw_array(img_msg, numpy.uint8, 4, step), (2, 1, 0, 3))
+    elif encoding == 'mono16' or encoding == '16UC1':
+        dtype = numpy.dtype(numpy.uint16).newbyteorder('>' if img_msg.is_bigendian else '<')
+        return _mono_to_rgba(_autocontrast(_raw_array(img_msg, dtype, 1, step)[..., 0]))
+    elif encoding == '32FC1':
+        dtype = numpy.dtype(numpy.float32).newbyteorder('>' if img_msg.is_bigendian else '<')
+        return _mono_to_rgba(_autocontrast(_raw_array(img_msg, dtype, 1, step)[..., 0]))
+    else:
+        raise Exception("Unsupported image format: %s" % encoding)
+
+
+def _get_stride(height, min_height):
+    if not min_height or height <= min_height:
+        return 1
+    return max(1, height // min_height)
+
+
+def _raw_array(img_msg, dtype, channels, step):
+    """
+    View the message data as an array of shape (rows, columns, channels), keeping every step-th row and column.
+    """
+    dtype = numpy.dtype(dtype)
+    data = numpy.frombuffer(img_msg.data, dtype=numpy.uint8, count=img_msg.step * img_msg.height)
+    rows = data.reshape(img_msg.height, img_msg.step)[::step, :img_msg.width * channels * dtype.itemsize]
+    pixels = numpy.ascontiguousarray(rows).view(dtype).reshape(rows.shape[0], img_msg.width, channels)
+    return pixels[:, ::step]
+
+
+def _autocontrast(pixels):
+    """
+    Stretch the finite values of a single channel array to the full uint8 range.
+    """
+    pixels = pixels.astype(numpy.float32)
+    finite = numpy.isfinite(pixels)
+    if not finite.any():
+        return numpy.zeros(pixels.shape, numpy.uint8)
+    lo, hi = pixels[finite].min(), pixels[finite].max()
+    scale = 255.0 / (hi - lo) if hi > lo else 0.0
+    pixels = numpy.where(finite, (pixels - lo) * scale, 0.0)
+    return pixels.astype(numpy.uint8)
+
+
+def _mono_to_rgba(pixels):
+    rgba = numpy.empty(pixels.shape + (4,), numpy.uint8)
+    rgba[..., :3] = pixels[..., numpy.newaxis]
+    rgba[..., 3] = 255
+    return rgba
+
+
+def _channels_to_rgba(pixels, order):
+    """
+    @param order: index of the red, green, blue and optionally alpha channel in pixels
+    """
+    rgba = numpy.empty(pixels.shape[:2] + (4,), numpy.uint8)
+    rgba[..., :len(order)] = pixels[..., list(order)]
+    if len(order) == 3:
+        rgba[..., 3] = 255
+    return rgba
+
+
 def pil_bgr2rgb(pil_img):
     rgb2bgr = (0, 0, 1, 0,
                0, 1, 0, 0,
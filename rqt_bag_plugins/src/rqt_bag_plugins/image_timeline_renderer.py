@@ -32,45 +32,87 @@
 
 from __future__ import print_function
 import rospy
-
-# HACK workaround for upstream pillow issue python-pillow/Pillow#400
 import sys
-from python_qt_binding import QT_BINDING_MODULES
-if (
-    not QT_BINDING_MODULES['QtCore'].__name__.startswith('PyQt5') and
-    'PyQt5' in sys.modules
-):
-    sys.modules['PyQt5'] = None
-from PIL import Image
-from PIL.ImageQt import ImageQt
 
 from rqt_bag import TimelineCache, TimelineRenderer
 
 from rqt_bag_plugins import image_helper
+from rqt_bag_plugins.thumbnail_store import ThumbnailPrecomputeThread, ThumbnailStore
 
 from python_qt_binding.QtCore import Qt
 from python_qt_binding.QtGui import QBrush, QPen, QPixmap
 
 
+class _Thumbnail(object):
+    """
+    Cached thumbnail. The image is loaded by the cache thread, the pixmap is converted from it on the first paint.
+    """
+    def __init__(self, image, thumbnail_height):
+        self.image = image
+        self.thumbnail_height = thumbnail_height  # thumbnail height it was loaded for
+        self.pixmap = None
+        self.width = image.width()
+        self.height = image.height()
+
+    def get_pixmap(self):
+        if self.pixmap is None:
+            self.pixmap = QPixmap.fromImage(self.image)
+            self.image = None
+        return self.pixmap
+
+
 class ImageTimelineRenderer(TimelineRenderer):
     """
     Draws thumbnails of sensor_msgs/Image or sensor_msgs/CompressedImage in the timeline.
     """
-    def __init__(self, timeline, thumbnail_height=160):
+    def __init__(self, timeline, thumbnail_height=160, thumbnail_interval=5.0):
         super(ImageTimelineRenderer, self).__init__(timeline, msg_combine_px=40.0)
 
         self.thumbnail_height = thumbnail_height
+        self.thumbnail_gap = 6
+        self.thumbnail_interval = thumbnail_interval  # secs between precomputed thumbnails; None disables the precomputation pass
 
         self.thumbnail_combine_px = 20.0  # use cached thumbnail if it's less than this many pixels away
         self.min_thumbnail_width = 8  # don't display thumbnails if less than this many pixels across
-        self.quality = Image.NEAREST  # quality hint for thumbnail scaling
+        self.quality = Qt.FastTransformation  # quality hint for thumbnail scaling
+
+        self.thumbnail_cache = TimelineCache(self._load_thumbnail, self._thumbnail_loaded, batch_loader=self._load_thumbnails)
+        self._output_versions = {}  # topic -> number of thumbnails loaded
+        self._thumbnail_cache_height = None  # height of the cached thumbnails
+        self.thumbnail_store = ThumbnailStore()
+        self._precompute_threads = []
 
-        self.thumbnail_cache = TimelineCache(self._load_thumbnail, lambda topic, msg_stamp, thumbnail: self.timeline.scene().update())
     # TimelineRenderer implementation
 
     def get_segment_height(self, topic):
         return self.thumbnail_height
 
+    def get_output_version(self, topic):
+        return (self._thumbnail_cache_height, self._output_versions.get(topic, 0))
+
+    def get_thumbnail_draw_height(self):
+        """
+        :returns: height in pixels of the thumbnails drawn in a segment, ''int''
+        """
+        # segments are 2px shorter than the topic row and thumbnails leave a 1px border inside the segment
+        return self.thumbnail_height - 4 - self.thumbnail_gap
+
+    def get_statistics(self):
+        return {
+            'thumbnail_cache': self.thumbnail_cache.get_statistics(lambda thumbnail: 4 * thumbnail.width * thumbnail.height),
+            'thumbnail_store': self.thumbnail_store.get_statistics(),
+        }
+
+    def bag_added(self, bag):
+        """
+        Starts the thumbnail precomputation pass for the image topics in the bag
+        """
+        if not self.thumbnail_interval or bag.mode != 'r':
+            return
+        topics = sorted(set(c.topic for c in bag._get_connections() if self.timeline._timeline_renderers.get(c.datatype) is self))
+        if topics:
+            self._precompute_threads.append(ThumbnailPrecomputeThread(self, bag, topics))
+
     def draw_timeline_segment(self, painter, topic, stamp_start, stamp_end, x, y, width, height):
         """
         draws a stream of images for the topic
@@ -88,9 +130,14 @@ class ImageTimelineRenderer(TimelineRenderer):
             x = self.timeline._history_left
         max_interval_thumbnail = self.timeline.map_dx_to_dstamp(self.thumbnail_combine_px)
         max_interval_thumbnail = max(0.1, max_interval_thumbnail)
-        thumbnail_gap = 6
+        thumbnail_gap = self.thumbnail_gap
         thumbnail_x, thumbnail_y, thumbnail_height = x + 1, y + 1, height - 2 - thumbnail_gap  # leave 1px border
 
+        # Cached pixmaps are drawn unscaled, so drop them when the thumbnail height changes
+        if thumbnail_height != self._thumbnail_cache_height:
+            self.thumbnail_cache.clear()
+            self._thumbnail_cache_height = thumbnail_height
+
         # set color to white draw rectangle over messages
         painter.setBrush(QBrush(Qt.white))
         painter.drawRect(x, y, width, height - thumbnail_gap)
@@ -108,21 +155,20 @@ class ImageTimelineRenderer(TimelineRenderer):
                 stamp = self.timeline.map_x_to_stamp(thumbnail_x, clamp_to_visible=False)
                 thumbnail_bitmap = self.thumbnail_cache.get_item(topic, stamp, max_interval_thumbnail)
 
-                # Cache miss
-                if not thumbnail_bitmap:
-                    thumbnail_details = (thumbnail_height,)
+                # Cache miss, or a thumbnail loaded for a previous height
+                if not thumbnail_bitmap or thumbnail_bitmap.thumbnail_height != thumbnail_height:
+                    thumbnail_details = (thumbnail_height, max_interval_thumbnail)
                     self.thumbnail_cache.enqueue((topic, stamp, max_interval_thumbnail, thumbnail_details))
                     if not thumbnail_width:
                         break
                 else:
-                    thumbnail_width, _ = thumbnail_bitmap.size
+                    thumbnail_width = thumbnail_bitmap.width
 
                     if width > 1:
                         if available_width < thumbnail_width:
                             thumbnail_width = available_width - 1
-                    QtImage = ImageQt(thumbnail_bitmap)
-                    pixmap = QPixmap.fromImage(QtImage)
-                    painter.drawPixmap(thumbnail_x, thumbnail_y, thumbnail_width, thumbnail_height, pixmap)
+                    # blit the pixmap, cropping it at the end of the segment
+                    painter.drawPixmap(thumbnail_x, thumbnail_y, thumbnail_bitmap.get_pixmap(), 0, 0, thumbnail_width, thumbnail_height)
             thumbnail_x += thumbnail_width
 
             if width == 1:
@@ -137,50 +183,78 @@ class ImageTimelineRenderer(TimelineRenderer):
         return True
 
     def close(self):
+        for precompute_thread in self._precompute_threads:
+            precompute_thread.stop()
         if self.thumbnail_cache:
             self.thumbnail_cache.stop()
             self.thumbnail_cache.join()
 
+    def _thumbnail_loaded(self, topic, msg_stamp, thumbnail):
+        self._output_versions[topic] = self._output_versions.get(topic, 0) + 1
+        self.timeline.scene().request_update()
+
     def _load_thumbnail(self, topic, stamp, thumbnail_details):
         """
-        Loads the thumbnail from the bag
+        Loads the thumbnail from the precomputed thumbnails or the bag
         """
-        (thumbnail_height,) = thumbnail_details
+        for _, msg_stamp, thumbnail in self._load_thumbnails([(topic, stamp, None, thumbnail_details)]):
+            return msg_stamp, thumbnail
+        return None, None
 
-        # Find position of stamp using index
-        t = rospy.Time.from_sec(stamp)
-        bag, entry = self.timeline.scene().get_entry(t, topic)
-        if not entry:
-            return None, None
-        pos = entry.position
+    def _load_thumbnails(self, entries):
+        """
+        Loads a batch of thumbnails from the precomputed thumbnails or the bag, reading the messages in file order
+        :param entries: (topic, stamp, time_threshold, thumbnail_details) of each thumbnail, ''list''
+        :returns: (topic, msg_stamp, thumbnail) of each loaded thumbnail, ''generator''
+        """
+        timeline = self.timeline.scene()
+        bag_positions = []
+        requests = {}  # (bag, position) -> (topic, thumbnail height)
+        for topic, stamp, _, (thumbnail_height, time_threshold) in entries:
+            if thumbnail_height != self._thumbnail_cache_height:
+                # requested before the thumbnail height changed
+                continue
+
+            # Use a precomputed thumbnail if there is one close enough
+            msg_stamp, thumbnail = self.thumbnail_store.get(topic, stamp, time_threshold)
+            if thumbnail is not None:
+                if thumbnail.height() != thumbnail_height:
+                    thumbnail = thumbnail.scaledToHeight(thumbnail_height, self.quality)
+                yield topic, rospy.Time.from_sec(msg_stamp), _Thumbnail(thumbnail, thumbnail_height)
+                continue
 
-        # Not in the cache; load from the bag file
+            # Find position of stamp using index
+            bag, entry = timeline.get_entry(rospy.Time.from_sec(stamp), topic)
+            if not entry:
+                continue
+            request_key = (id(bag), entry.position)
+            if request_key not in requests:
+                requests[request_key] = (topic, thumbnail_height)
+                bag_positions.append((bag, entry.position))
 
-        with self.timeline.scene()._bag_lock:
-            msg_topic, msg, msg_stamp = bag._read_message(pos)
+        # Not in the cache; load from the bag files
+        for bag, position, (_, msg, msg_stamp) in timeline.read_messages(bag_positions):
+            topic, thumbnail_height = requests[(id(bag), position)]
+            thumbnail = self.make_thumbnail(topic, msg, thumbnail_height)
+            if thumbnail is not None:
+                yield topic, msg_stamp, _Thumbnail(thumbnail, thumbnail_height)
 
-        # Convert from ROS image to PIL image
+    def make_thumbnail(self, topic, msg, thumbnail_height):
+        """
+        Converts an image message to a thumbnail, disabling the renderer for the topic if it can't be decoded
+        :returns: thumbnail or None, ''QImage''
+        """
+        # Convert from ROS image to QImage, downsampling to no less than the thumbnail height while decoding
         try:
-            pil_image = image_helper.imgmsg_to_pil(msg)
+            image = image_helper.imgmsg_to_qimage(msg, thumbnail_height)
         except Exception as ex:
             print('Error loading image on topic %s: %s' % (topic, str(ex)), file=sys.stderr)
-            pil_image = None
+            image = None
 
-        if not pil_image:
+        if image is None or image.isNull():
             print('Disabling renderer on %s' % topic, file=sys.stderr)
             self.timeline.set_renderer_active(topic, False)
-            return None, None
-
-        # Calculate width to maintain aspect ratio
-        try:
-            pil_image_size = pil_image.size
-            thumbnail_width = int(round(thumbnail_height * (float(pil_image_size[0]) / pil_image_size[1])))
-            # Scale to thumbnail size
-            thumbnail = pil_image.resize((thumbnail_width, thumbnail_height), self.quality)
+            return None
 
-            return msg_stamp, thumbnail
-
-        except Exception as ex:
-            print('Error loading image on topic %s: %s' % (topic, str(ex)), file=sys.stderr)
-            raise
-            return None, None
+        # Scale to thumbnail size, maintaining the aspect ratio
+        return image.scaledToHeight(thumbnail_height, self.quality)
@@ -67,7 +67,7 @@ import math
 import codecs
 import threading
 import rospkg
-from rqt_bag import MessageView
+from rqt_bag import LazyMessage, MessageView
 
 from python_qt_binding import loadUi
 from python_qt_binding.QtCore import Qt, qWarning, Signal
@@ -107,6 +107,9 @@ class PlotView(MessageView):
     def message_cleared(self):
         pass
 
+    def get_statistics(self):
+        return self.plot_widget.plot.get_statistics()
+
 class PlotWidget(QWidget):
 
     def __init__(self, timeline, parent, topic):
@@ -173,7 +176,7 @@ class PlotWidget(QWidget):
 
         self.bag = bag
         # get first message from bag
-        msg = bag._read_message(entry.position)
+        msg = self.timeline.read_message(bag, entry.position)
         self.message_tree.set_message(msg[1])
 
         # state used by threaded resampling
@@ -198,10 +201,11 @@ class PlotWidget(QWidget):
         self.plot.redraw()
 
     def load_data(self):
-        """get a generator for the specified time range on our bag"""
-        return self.bag.read_messages(self.msgtopic,
+        """get the index entries for the specified time range on our bag"""
+        connections = list(self.bag._get_connections(self.msgtopic))
+        return list(self.bag._get_entries(connections,
                 self.start_stamp+rospy.Duration.from_sec(self.limits[0]),
-                self.start_stamp+rospy.Duration.from_sec(self.limits[1]))
+                self.start_stamp+rospy.Duration.from_sec(self.limits[1])))
 
     def resample_data(self, fields):
         if self.resample_thread:
@@ -231,48 +235,58 @@ class PlotWidget(QWidget):
             x[path] = []
             y[path] = []
 
-        # bag object is not thread-safe; lock it while we resample
+        # bag object is not thread-safe; lock it while we look up the index
         with self.timeline._bag_lock:
             try:
-                msgdata = self.load_data()
+                entries = self.load_data()
             except ValueError:
                 # bag is closed or invalid; we're done here
                 self.resampling_active = False
                 return
 
-            for entry in msgdata:
-                # detect if we're cancelled and return early
-                if not self.resampling_active:
-                    return
-
-                for path in self.resample_fields:
-                    # this resampling method is very unstable, because it picks
-                    # representative points rather than explicitly representing
-                    # the minimum and maximum values present within a sample
-                    # If the data has spikes, this is particularly bad because they
-                    # will be missed entirely at some resolutions and offsets
-                    if x[path]==[] or (entry[2]-self.start_stamp).to_sec()-x[path][-1] >= self.timestep:
-                        y_value = entry[1]
-                        for field in path.split('.'):
-                            index = None
-                            if field.endswith(']'):
-                                field = field[:-1]
-                                field, _, index = field.rpartition('[')
-                            y_value = getattr(y_value, field)
-                            if index:
-                                index = int(index)
-                                y_value = y_value[index]
-                        y[path].append(y_value)
-                        x[path].append((entry[2]-self.start_stamp).to_sec())
-
-                # TODO: incremental plot updates would go here...
-                #       we should probably do incremental updates based on time;
-                #       that is, push new data to the plot maybe every .5 or .1
-                #       seconds
-                #       time is a more useful metric than, say, messages loaded or
-                #       percentage, because it will give a reasonable refresh rate
-                #       without overloading the computer
-                # if we had a progress bar, we could emit a signal to update it here
+        # this resampling method is very unstable, because it picks
+        # representative points rather than explicitly representing
+        # the minimum and maximum values present within a sample
+        # If the data has spikes, this is particularly bad because they
+        # will be missed entirely at some resolutions and offsets
+        # The samples are picked from the index so only their messages are
+        # read, in file order
+        sample_positions = []
+        last_x = None
+        for entry in entries:
+            entry_x = (entry.time-self.start_stamp).to_sec()
+            if last_x is None or entry_x-last_x >= self.timestep:
+                sample_positions.append((self.bag, entry.position))
+                last_x = entry_x
+
+        # The plotted fields are unpacked from the serialized messages
+        # where their layout allows it, instead of deserializing them.
+        # Only the values are kept, the serialized message may be a view of
+        # the memory mapped bag
+        paths = list(self.resample_fields)
+        samples = []
+        for _, _, (_, raw_msg, t) in self.timeline.read_messages(sample_positions, raw=True):
+            # detect if we're cancelled and return early
+            if not self.resampling_active:
+                return
+            msg = LazyMessage(raw_msg[4], raw_msg[1])
+            samples.append(((t-self.start_stamp).to_sec(), [msg.get_field(path) for path in paths]))
+            del msg, raw_msg
+
+            # TODO: incremental plot updates would go here...
+            #       we should probably do incremental updates based on time;
+            #       that is, push new data to the plot maybe every .5 or .1
+            #       seconds
+            #       time is a more useful metric than, say, messages loaded or
+            #       percentage, because it will give a reasonable refresh rate
+            #       without overloading the computer
+            # if we had a progress bar, we could emit a signal to update it here
+
+        samples.sort(key=lambda sample: sample[0])
+        for sample_x, values in samples:
+            for path, value in zip(paths, values):
+                y[path].append(value)
+                x[path].append(sample_x)
 
         # update the plot with final resampled data
         for path in self.resample_fields:
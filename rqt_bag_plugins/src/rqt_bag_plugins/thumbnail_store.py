@@ -0,0 +1,305 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Precomputed thumbnails for image topics, persisted in a sidecar file next to the bag.
+
+The sidecar holds only numbers, topic names and PNG data, so a sidecar that came with a bag from elsewhere is never
+more than a bad cache: it can't run code, and if it doesn't parse it is ignored.
+
+Layout, little endian:
+    magic, version (uint32)
+    bag size (uint64), bag mtime (int64), thumbnail height (uint32), interval (float64), topic count (uint32)
+    per topic: name length (uint32), name (utf-8), thumbnail count (uint32)
+        per thumbnail: stamp (float64), PNG length (uint32), PNG data
+"""
+
+from __future__ import print_function
+import bisect
+import os
+import struct
+import sys
+import threading
+
+import rospy
+
+from python_qt_binding.QtCore import QBuffer, QByteArray, QIODevice
+from python_qt_binding.QtGui import QImage
+
+SIDECAR_SUFFIX = '.thumbs'
+SIDECAR_MAGIC = b'RQTBAGTHUMBS'
+SIDECAR_VERSION = 2
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+_struct_version = struct.Struct('<I')
+_struct_header = struct.Struct('<QqIdI')
+_struct_length = struct.Struct('<I')
+_struct_thumbnail = struct.Struct('<dI')
+
+
+class SidecarFormatError(Exception):
+    pass
+
+
+class ThumbnailStore(object):
+    """
+    Holds encoded thumbnails sampled at a fixed stamp interval, sorted by stamp per topic.
+    """
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.thumbnails = {}  # topic -> [(stamp, png data), ...]
+
+    def add(self, topic, stamp, thumbnail):
+        data = QByteArray()
+        data_buffer = QBuffer(data)
+        data_buffer.open(QIODevice.WriteOnly)
+        thumbnail.save(data_buffer, 'PNG')
+        self._insert(topic, stamp, data.data())
+
+    def get(self, topic, stamp, time_threshold):
+        """
+        Get the thumbnail closest to stamp if it is less than time_threshold secs away.
+
+        @return: (stamp, thumbnail) or (None, None)
+        """
+        with self.lock:
+            topic_thumbnails = self.thumbnails.get(topic)
+            if not topic_thumbnails:
+                return None, None
+            index = bisect.bisect_left(topic_thumbnails, (stamp, b''))
+            candidates = topic_thumbnails[max(0, index - 1):index + 1]
+            closest_stamp, closest_data = min(candidates, key=lambda entry: abs(entry[0] - stamp))
+        if abs(closest_stamp - stamp) > time_threshold:
+            return None, None
+        return closest_stamp, QImage.fromData(closest_data, 'PNG')
+
+    def get_statistics(self):
+        """
+        @return: number and encoded bytes of the thumbnails by topic
+        """
+        with self.lock:
+            return dict((topic, {'thumbnails': len(topic_thumbnails), 'bytes': sum(len(data) for _, data in topic_thumbnails)})
+                        for topic, topic_thumbnails in self.thumbnails.items())
+
+    def load(self, bag, thumbnail_height, interval):
+        """
+        Load the thumbnails from the bag's sidecar file.
+
+        @return: whether a sidecar matching the bag and the thumbnail settings was loaded
+        """
+        path = sidecar_path(bag)
+        if not os.path.isfile(path):
+            return False
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            signature, sidecar_height, sidecar_interval, thumbnails = _parse_sidecar(data)
+        except (IOError, OSError, SidecarFormatError) as ex:
+            print('Ignoring thumbnail sidecar %s: %s' % (path, str(ex)), file=sys.stderr)
+            return False
+
+        if signature != _bag_signature(bag) or sidecar_height != thumbnail_height or sidecar_interval != interval:
+            return False
+
+        for topic, topic_thumbnails in thumbnails.items():
+            for stamp, png_data in topic_thumbnails:
+                self._insert(topic, stamp, png_data)
+        return True
+
+    def save(self, bag, topics, thumbnail_height, interval):
+        """
+        Write the thumbnails of the given topics to the bag's sidecar file.
+        """
+        path = sidecar_path(bag)
+        with self.lock:
+            thumbnails = dict((topic, list(self.thumbnails.get(topic, []))) for topic in topics)
+        tmp_path = '%s.tmp%d' % (path, os.getpid())
+        try:
+            size, mtime = _bag_signature(bag)
+            with open(tmp_path, 'wb') as f:
+                f.write(SIDECAR_MAGIC + _struct_version.pack(SIDECAR_VERSION))
+                f.write(_struct_header.pack(size, mtime, thumbnail_height, interval, len(thumbnails)))
+                for topic, topic_thumbnails in thumbnails.items():
+                    name = topic.encode('utf-8')
+                    f.write(_struct_length.pack(len(name)) + name + _struct_length.pack(len(topic_thumbnails)))
+                    for stamp, png_data in topic_thumbnails:
+                        f.write(_struct_thumbnail.pack(stamp, len(png_data)))
+                        f.write(png_data)
+            os.rename(tmp_path, path)
+        except Exception as ex:
+            print('Error writing thumbnail sidecar %s: %s' % (path, str(ex)), file=sys.stderr)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _insert(self, topic, stamp, data):
+        with self.lock:
+            topic_thumbnails = self.thumbnails.setdefault(topic, [])
+            entry = (stamp, data)
+            index = bisect.bisect_left(topic_thumbnails, entry)
+            if index < len(topic_thumbnails) and topic_thumbnails[index][0] == stamp:
+                topic_thumbnails[index] = entry
+            else:
+                topic_thumbnails.insert(index, entry)
+
+
+class ThumbnailPrecomputeThread(threading.Thread):
+    """
+    Generates thumbnails for the image topics of one bag every interval secs, or loads them from the bag's sidecar.
+
+    One thread per bag.
+    """
+    def __init__(self, renderer, bag, topics):
+        threading.Thread.__init__(self)
+
+        self.renderer = renderer
+        self.bag = bag
+        self.topics = topics
+
+        self._stop_flag = False
+
+        self.setDaemon(True)
+        self.start()
+
+    def run(self):
+        store = self.renderer.thumbnail_store
+        thumbnail_height = self.renderer.get_thumbnail_draw_height()
+        interval = self.renderer.thumbnail_interval
+
+        if store.load(self.bag, thumbnail_height, interval):
+            self.renderer.timeline.scene().request_update()
+            return
+
+        for topic in self.topics:
+            if not self._precompute_topic(topic, thumbnail_height, interval):
+                return
+
+        store.save(self.bag, self.topics, thumbnail_height, interval)
+
+    def _precompute_topic(self, topic, thumbnail_height, interval):
+        """
+        @return: False if the pass was stopped or the topic could not be decoded
+        """
+        connections = [c for c in self.bag._get_connections(topic) if self.bag._connection_indexes.get(c.id)]
+        if not connections:
+            return True
+
+        timeline = self.renderer.timeline.scene()
+        start_stamp = min(self.bag._connection_indexes[c.id][0].time for c in connections).to_sec()
+        end_stamp = max(self.bag._connection_indexes[c.id][-1].time for c in connections).to_sec()
+
+        # Find the messages first, so they can be read in file order
+        entry_stamps = {}  # position -> stamp
+        stamp = start_stamp
+        while stamp <= end_stamp:
+            if self._stop_flag:
+                return False
+
+            with timeline._bag_lock:
+                entry = self.bag._get_entry_after(rospy.Time.from_sec(stamp) - rospy.Duration(0, 1), connections)
+            if entry is None:
+                break
+            entry_stamps[entry.position] = entry.time.to_sec()
+
+            stamp = max(stamp + interval, entry.time.to_sec() + interval)
+
+        for _, position, (_, msg, _) in timeline.read_messages([(self.bag, position) for position in entry_stamps]):
+            if self._stop_flag:
+                return False
+            thumbnail = self.renderer.make_thumbnail(topic, msg, thumbnail_height)
+            if thumbnail is None:
+                return False
+            self.renderer.thumbnail_store.add(topic, entry_stamps[position], thumbnail)
+
+        timeline.request_update()
+        return True
+
+    def stop(self):
+        self._stop_flag = True
+
+
+def sidecar_path(bag):
+    return bag.filename + SIDECAR_SUFFIX
+
+
+def _parse_sidecar(data):
+    """
+    @return: (bag signature, thumbnail height, interval, {topic: [(stamp, png data), ...]})
+    @raise SidecarFormatError: if data is not a sidecar of this version
+    """
+    pos = len(SIDECAR_MAGIC)
+    if data[:pos] != SIDECAR_MAGIC:
+        raise SidecarFormatError('not a thumbnail sidecar')
+    try:
+        version, = _struct_version.unpack_from(data, pos)
+        pos += _struct_version.size
+        if version != SIDECAR_VERSION:
+            raise SidecarFormatError('version %d' % version)
+        size, mtime, thumbnail_height, interval, topic_count = _struct_header.unpack_from(data, pos)
+        pos += _struct_header.size
+
+        thumbnails = {}
+        for _ in range(topic_count):
+            name_length, = _struct_length.unpack_from(data, pos)
+            pos += _struct_length.size
+            topic = _read_bytes(data, pos, name_length).decode('utf-8')
+            pos += name_length
+            count, = _struct_length.unpack_from(data, pos)
+            pos += _struct_length.size
+            topic_thumbnails = []
+            for _ in range(count):
+                stamp, png_length = _struct_thumbnail.unpack_from(data, pos)
+                pos += _struct_thumbnail.size
+                png_data = _read_bytes(data, pos, png_length)
+                pos += png_length
+                if not png_data.startswith(_PNG_SIGNATURE):
+                    raise SidecarFormatError('thumbnail is not a PNG')
+                topic_thumbnails.append((stamp, png_data))
+            thumbnails[topic] = topic_thumbnails
+    except (struct.error, UnicodeDecodeError) as ex:
+        raise SidecarFormatError(str(ex))
+    if pos != len(data):
+        raise SidecarFormatError('trailing data')
+    return (size, mtime), thumbnail_height, interval, thumbnails
+
+
+def _read_bytes(data, pos, length):
+    if pos + length > len(data):
+        raise SidecarFormatError('truncated')
+    return data[pos:pos + length]
+
+
+def _bag_signature(bag):
+    """
+    Identifies the bag contents so a stale sidecar is not reused after the bag is rewritten.
+    """
+    stat = os.stat(bag.filename)
+    return (stat.st_size, int(stat.st_mtime))
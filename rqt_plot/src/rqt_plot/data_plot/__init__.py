@@ -40,6 +40,8 @@ from python_qt_binding.QtGui import QColor
 from python_qt_binding.QtWidgets import QWidget, QHBoxLayout
 from rqt_py_common.ini_helper import pack, unpack
 
+from .curve_buffer import CurveBuffer, decimate
+
 try:
     from .pyqtgraph_data_plot import PyQtGraphDataPlot
 except ImportError as e:
@@ -106,6 +108,9 @@ class DataPlot(QWidget):
     SCALE_VISIBLE=2
     SCALE_EXTEND=4
 
+    # values kept per curve before the oldest ones are dropped
+    DEFAULT_RETENTION_SAMPLES = 1000000
+
     _colors = [Qt.blue, Qt.red, Qt.cyan, Qt.magenta, Qt.green, Qt.darkYellow, Qt.black, Qt.darkCyan, Qt.darkRed, Qt.gray]
 
     limits_changed = Signal()
@@ -130,7 +135,12 @@ class DataPlot(QWidget):
         # the backend widget that we're trying to hide/abstract
         self._data_plot_widget = None
         self._curves = {}
+        self._retention_duration = None
+        self._retention_samples = DataPlot.DEFAULT_RETENTION_SAMPLES
+        self._retention_memory = None
         self._vline = None
+        # x range and view width the curves were last decimated for
+        self._decimation_range = None
         self._redraw.connect(self._do_redraw)
 
         self._layout = QHBoxLayout()
@@ -179,6 +189,7 @@ class DataPlot(QWidget):
 
         self._data_plot_widget = selected_plot['widget_class'](self)
         self._data_plot_widget.limits_changed.connect(self.limits_changed)
+        self._data_plot_widget.limits_changed.connect(self._check_decimation)
         self._add_curve.connect(self._data_plot_widget.add_curve)
         self._layout.addWidget(self._data_plot_widget)
 
@@ -225,6 +236,9 @@ class DataPlot(QWidget):
         ylim = [float(y) for y in ylim]
         instance_settings.set_value('x_limits', pack(xlim))
         instance_settings.set_value('y_limits', pack(ylim))
+        instance_settings.set_value('retention_duration', self._retention_duration or 0)
+        instance_settings.set_value('retention_samples', self._retention_samples or 0)
+        instance_settings.set_value('retention_memory', self._retention_memory or 0)
 
     def restore_settings(self, plugin_settings, instance_settings):
         """Restore the settings for this widget
@@ -247,6 +261,12 @@ class DataPlot(QWidget):
                 self.set_ylim(ylim)
             except:
                 qWarning("Failed to restore Y limits")
+        try:
+            self.set_retention(duration=float(instance_settings.value('retention_duration', 0)),
+                               samples=int(instance_settings.value('retention_samples', DataPlot.DEFAULT_RETENTION_SAMPLES)),
+                               memory=int(instance_settings.value('retention_memory', 0)))
+        except ValueError:
+            qWarning("Failed to restore retention settings")
 
 
     def doSettingsDialog(self):
@@ -293,11 +313,45 @@ class DataPlot(QWidget):
         This causes the underlying plot to be redrawn. This is usually used
         after adding or updating the plot data"""
         if self._data_plot_widget:
+            self._decimation_range = None
             self._merged_autoscale()
-            for curve_id in self._curves:
-                curve = self._curves[curve_id]
-                self._data_plot_widget.set_values(curve_id, curve['x'], curve['y'])
-            self._data_plot_widget.redraw()
+            self._set_plot_values()
+
+    def _set_plot_values(self):
+        """Hand the curves to the backend, reduced to what can be shown
+
+        Long curves are decimated to the minimum and maximum value per pixel,
+        so drawing them does not depend on their length. The decimated range
+        reaches one view width beyond either side, so the user can pan
+        without losing the data."""
+        x_limit = self.get_xlim()
+        x_width = x_limit[1] - x_limit[0]
+        x_min, x_max = x_limit[0] - x_width, x_limit[1] + x_width
+        buckets = 3 * max(self._data_plot_widget.width(), 1)
+
+        decimated = False
+        for curve_id in self._curves:
+            data = self._curves[curve_id]['data']
+            if x_width > 0 and data.is_sorted() and len(data) > 2 * buckets:
+                values_x, values_y = decimate(data.x, data.y, x_min, x_max, buckets)
+                decimated = True
+            else:
+                # copies, the buffer may move the values before the backend
+                # draws them again
+                values_x, values_y = data.x.copy(), data.y.copy()
+            self._data_plot_widget.set_values(curve_id, values_x, values_y)
+        self._decimation_range = (x_min, x_max, x_width) if decimated else None
+        self._data_plot_widget.redraw()
+
+    def _check_decimation(self):
+        """Decimate the curves again if the user panned beyond the decimated
+        range or zoomed in on it"""
+        if self._decimation_range is None:
+            return
+        x_limit = self.get_xlim()
+        x_min, x_max, x_width = self._decimation_range
+        if x_limit[0] < x_min or x_limit[1] > x_max or x_limit[1] - x_limit[0] < x_width / 2:
+            self._set_plot_values()
 
     def _get_curve(self, curve_id):
         if curve_id in self._curves:
@@ -320,18 +374,65 @@ class DataPlot(QWidget):
         curve_color = QColor(self._colors[self._color_index % len(self._colors)])
         self._color_index += 1
 
-        self._curves[curve_id] = { 'x': numpy.array(data_x),
-                                   'y': numpy.array(data_y),
+        self._curves[curve_id] = { 'data': CurveBuffer(duration=self._retention_duration, data_x=data_x, data_y=data_y),
                                    'name': curve_name,
                                    'color': curve_color}
+        self._update_curve_capacity()
         if self._data_plot_widget:
             self._add_curve.emit(curve_id, curve_name, curve_color, self._markers_on)
 
+    def get_statistics(self):
+        """Get the number of points and the bytes of the data of each curve"""
+        statistics = {}
+        for curve_id, curve in list(self._curves.items()):
+            statistics[curve_id] = {'points': len(curve['data']),
+                                    'bytes': curve['data'].nbytes}
+        return statistics
+
+    def set_retention(self, duration=None, samples=None, memory=None):
+        """Limit the data kept for the curves
+
+        The oldest values of a curve are dropped as new ones are added, so
+        the plot can run indefinitely without growing. The memory limit is
+        split evenly between the curves.
+
+        if a parameter is not passed, that limit is not changed; 0 removes it
+
+        @param duration: secs of data kept per curve, by the x values
+        @param samples: number of values kept per curve
+        @param memory: bytes the values of all curves may take up
+        """
+        if duration is not None:
+            self._retention_duration = duration or None
+            for curve in list(self._curves.values()):
+                curve['data'].set_duration(self._retention_duration)
+        if samples is not None:
+            self._retention_samples = samples or None
+        if memory is not None:
+            self._retention_memory = memory or None
+        self._update_curve_capacity()
+
+    def get_retention(self):
+        """Get the retention limits, see set_retention
+
+        @return: (duration, samples, memory), None for no limit
+        """
+        return self._retention_duration, self._retention_samples, self._retention_memory
+
+    def _update_curve_capacity(self):
+        capacity = self._retention_samples
+        if self._retention_memory is not None and self._curves:
+            memory_capacity = CurveBuffer.get_capacity_for_bytes(self._retention_memory / len(self._curves))
+            capacity = memory_capacity if capacity is None else min(capacity, memory_capacity)
+        for curve in list(self._curves.values()):
+            curve['data'].set_capacity(capacity)
+
     def remove_curve(self, curve_id):
         """Remove the specified curve from this plot"""
         # TODO: do on UI thread with signals
         if curve_id in self._curves:
             del self._curves[curve_id]
+            self._update_curve_capacity()
         if self._data_plot_widget:
             self._data_plot_widget.remove_curve(curve_id)
 
@@ -348,14 +449,8 @@ class DataPlot(QWidget):
         order.
         """
         curve = self._get_curve(curve_id)
-        curve['x'] = numpy.append(curve['x'], values_x)
-        curve['y'] = numpy.append(curve['y'], values_y)
-
-        if sort_data:
-            # sort resulting data, so we can slice it later
-            sort_order = curve['x'].argsort()
-            curve['x'] = curve['x'][sort_order]
-            curve['y'] = curve['y'][sort_order]
+        # keep the data sorted, so we can slice it later
+        curve['data'].append(values_x, values_y, sort_data)
 
     def clear_values(self, curve_id=None):
         """Clear the values for the specified curve, or all curves
@@ -368,13 +463,10 @@ class DataPlot(QWidget):
         """
         # clear internal curve representation
         if curve_id:
-            curve = self._get_curve(curve_id)
-            curve['x'] = numpy.array([])
-            curve['y'] = numpy.array([])
+            self._get_curve(curve_id)['data'].clear()
         else:
             for curve_id in self._curves:
-                self._curves[curve_id]['x'] = numpy.array([])
-                self._curves[curve_id]['y'] = numpy.array([])
+                self._curves[curve_id]['data'].clear()
 
 
     def vline(self, x, color=RED):
@@ -419,16 +511,16 @@ class DataPlot(QWidget):
     #  * scale Y to fit the current view
     #  * increase the Y scale to fit the current view
     #
-    # TODO: incrmenetal autoscaling: only update the autoscaling bounds
-    #       when new data is added
+    # the curve buffers keep the ranges up to date as values are added, so
+    # none of this scans the data
     def _merged_autoscale(self):
         x_limit = [numpy.inf, -numpy.inf]
         if self._autoscale_x:
             for curve_id in self._curves:
-                curve = self._curves[curve_id]
-                if len(curve['x']) > 0:
-                    x_limit[0] = min(x_limit[0], curve['x'].min())
-                    x_limit[1] = max(x_limit[1], curve['x'].max())
+                x_range = self._curves[curve_id]['data'].get_x_range()
+                if x_range is not None:
+                    x_limit[0] = min(x_limit[0], x_range[0])
+                    x_limit[1] = max(x_limit[1], x_range[1])
         elif self._autoscroll:
             # get current width of plot
             x_limit = self.get_xlim()
@@ -439,9 +531,9 @@ class DataPlot(QWidget):
             
             # get largest X value
             for curve_id in self._curves:
-                curve = self._curves[curve_id]
-                if len(curve['x']) > 0:
-                    x_limit[1] = max(x_limit[1], curve['x'].max())
+                x_range = self._curves[curve_id]['data'].get_x_range()
+                if x_range is not None:
+                    x_limit[1] = max(x_limit[1], x_range[1])
 
             # set lower limit based on width
             x_limit[0] = x_limit[1] - x_width
@@ -465,22 +557,20 @@ class DataPlot(QWidget):
             for curve_id in self._curves:
                 curve = self._curves[curve_id]
                 start_index = 0
-                end_index = len(curve['x'])
+                end_index = len(curve['data'])
 
                 # if we're scaling based on the visible window, find the
                 # start and end indicies of our window
                 if self._autoscale_y & DataPlot.SCALE_VISIBLE:
                     # indexof x_limit[0] in curves['x']
-                    start_index = curve['x'].searchsorted(x_limit[0])
+                    start_index = curve['data'].x.searchsorted(x_limit[0])
                     # indexof x_limit[1] in curves['x']
-                    end_index = curve['x'].searchsorted(x_limit[1])
-
-                # region here is cheap because it is a numpy view and not a
-                # copy of the underlying data
-                region = curve['y'][start_index:end_index]
-                if len(region) > 0:
-                    y_limit[0] = min(y_limit[0], region.min())
-                    y_limit[1] = max(y_limit[1], region.max())
+                    end_index = curve['data'].x.searchsorted(x_limit[1])
+
+                y_range = curve['data'].get_y_range(start_index, end_index)
+                if y_range is not None and not numpy.isnan(y_range[0]):
+                    y_limit[0] = min(y_limit[0], y_range[0])
+                    y_limit[1] = max(y_limit[1], y_range[1])
 
                 # TODO: compute padding around new min and max values
                 #       ONLY consider data for new values; not
@@ -0,0 +1,345 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2014, Austin Hendrix
+# Copyright (c) 2011, Dorian Scholz, TU Darmstadt
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   * Neither the name of the TU Darmstadt nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import numpy
+
+
+class CurveBuffer(object):
+    """Preallocated storage for the x and y values of one curve
+
+    Values are kept in contiguous numpy arrays with spare room at the end, so
+    appending is amortized O(1) and `x` and `y` are views that need no
+    copying. Once `capacity` values are stored, each append drops the oldest
+    values. The storage grows by doubling up to a bit more than `capacity`;
+    after that the live values are moved back to the front whenever the spare
+    room runs out.
+
+    With a `duration`, values more than `duration` before the newest x are
+    dropped as well.
+
+    The minimum and maximum y of every block of BLOCK_SIZE stored values are
+    kept up to date as values are written, so the range of y over any slice
+    only needs the blocks and the values at its two ends.
+    """
+
+    MIN_LENGTH = 1024
+    BLOCK_SIZE = 256
+
+    def __init__(self, capacity=None, duration=None, data_x=None, data_y=None):
+        """
+        @param capacity: maximum number of values kept, or None for no limit
+        @param duration: range of x kept, or None for no limit
+        """
+        self._capacity = capacity
+        self._duration = duration
+        self._x = numpy.empty(0)
+        self._y = numpy.empty(0)
+        self._start = 0
+        self._end = 0
+        # False once values were appended without sorting
+        self._sorted = True
+        self._block_min = numpy.empty(0)
+        self._block_max = numpy.empty(0)
+        # the block summaries cover the stored values up to here
+        self._summary_end = 0
+        if data_x is not None and len(data_x) > 0:
+            self.append(data_x, data_y)
+
+    @property
+    def x(self):
+        return self._x[self._start:self._end]
+
+    @property
+    def y(self):
+        return self._y[self._start:self._end]
+
+    @property
+    def nbytes(self):
+        """bytes allocated for the values, including the spare room"""
+        return self._x.nbytes + self._y.nbytes + self._block_min.nbytes + self._block_max.nbytes
+
+    def __len__(self):
+        return self._end - self._start
+
+    @classmethod
+    def get_capacity_for_bytes(cls, nbytes):
+        """Get the largest capacity whose storage fits in nbytes"""
+        # two float64 arrays with a quarter of spare room, see _max_length,
+        # and two summaries per block
+        return max(int(nbytes / (20 * (1 + 1.0 / cls.BLOCK_SIZE))) - cls.BLOCK_SIZE, 1)
+
+    def get_capacity(self):
+        return self._capacity
+
+    def is_sorted(self):
+        return self._sorted
+
+    def get_x_range(self):
+        """Get the minimum and maximum x
+
+        @return: (min, max), or None if there are no values
+        """
+        if self._end == self._start:
+            return None
+        if self._sorted:
+            return self._x[self._start], self._x[self._end - 1]
+        return numpy.fmin.reduce(self.x), numpy.fmax.reduce(self.x)
+
+    def get_y_range(self, begin=0, end=None):
+        """Get the minimum and maximum of y[begin:end], ignoring NaN
+
+        @return: (min, max), or None if there are no values
+        """
+        begin += self._start
+        end = self._end if end is None else min(self._start + end, self._end)
+        if begin >= end:
+            return None
+        first_block = -(-begin // self.BLOCK_SIZE)
+        last_block = end // self.BLOCK_SIZE
+        if first_block >= last_block:
+            values = self._y[begin:end]
+            return numpy.fmin.reduce(values), numpy.fmax.reduce(values)
+
+        minimum = numpy.fmin.reduce(self._block_min[first_block:last_block])
+        maximum = numpy.fmax.reduce(self._block_max[first_block:last_block])
+        for values in (self._y[begin:first_block * self.BLOCK_SIZE], self._y[last_block * self.BLOCK_SIZE:end]):
+            if len(values):
+                minimum = numpy.fmin(minimum, numpy.fmin.reduce(values))
+                maximum = numpy.fmax(maximum, numpy.fmax.reduce(values))
+        return minimum, maximum
+
+    def get_duration(self):
+        return self._duration
+
+    def set_duration(self, duration):
+        """Change the range of x kept, dropping the values before it"""
+        self._duration = duration
+        self._evict_old()
+
+    def set_capacity(self, capacity):
+        """Change the maximum number of values kept, dropping the oldest ones
+        if there are more"""
+        self._capacity = capacity
+        self._trim()
+        if capacity is not None and len(self._x) > self._max_length():
+            self._reallocate(self._max_length())
+
+    def clear(self):
+        self._x = numpy.empty(0)
+        self._y = numpy.empty(0)
+        self._start = 0
+        self._end = 0
+        self._sorted = True
+        self._block_min = numpy.empty(0)
+        self._block_max = numpy.empty(0)
+        self._summary_end = 0
+
+    def append(self, values_x, values_y, sort_data=True):
+        """Append values, keeping the stored values sorted by x
+
+        Values that come after the stored ones are copied to the end without
+        sorting. Otherwise, only the stored values from the first new x on
+        are merged with the new values.
+
+        @param sort_data: if False, the values are appended as they are
+        """
+        values_x = numpy.asarray(values_x, dtype=float)
+        values_y = numpy.asarray(values_y, dtype=float)
+        if len(values_x) == 0:
+            return
+        if not sort_data:
+            self._sorted = False
+
+        if sort_data and not _is_sorted(values_x):
+            order = values_x.argsort(kind='mergesort')
+            values_x = values_x[order]
+            values_y = values_y[order]
+
+        if not sort_data or self._end == self._start or values_x[0] >= self._x[self._end - 1]:
+            if self._capacity is not None and len(values_x) >= self._capacity:
+                values_x = values_x[len(values_x) - self._capacity:]
+                values_y = values_y[len(values_y) - self._capacity:]
+                self._start = self._end
+            if self._capacity is not None:
+                self._start = max(self._start, self._end + len(values_x) - self._capacity)
+            self._reserve(len(values_x))
+            self._x[self._end:self._end + len(values_x)] = values_x
+            self._y[self._end:self._end + len(values_y)] = values_y
+            self._end += len(values_x)
+            self._summarize(self._end - len(values_x))
+            self._evict_old()
+            return
+
+        self._reserve(len(values_x))
+        position = self._start + self.x.searchsorted(values_x[0], side='right')
+        merged_x = numpy.concatenate((self._x[position:self._end], values_x))
+        merged_y = numpy.concatenate((self._y[position:self._end], values_y))
+        # both parts are sorted, which mergesort takes advantage of
+        order = merged_x.argsort(kind='mergesort')
+        self._x[position:position + len(order)] = merged_x[order]
+        self._y[position:position + len(order)] = merged_y[order]
+        self._end = position + len(order)
+        self._summarize(position)
+        self._trim()
+        self._evict_old()
+
+    def _trim(self):
+        if self._capacity is not None and len(self) > self._capacity:
+            self._start = self._end - self._capacity
+
+    def _evict_old(self):
+        """Drop the values more than duration before the newest x"""
+        if self._duration is None or self._end == self._start:
+            return
+        values_x = self.x
+        if self._sorted:
+            cutoff = values_x[-1] - self._duration
+            self._start += values_x.searchsorted(cutoff)
+        else:
+            # only drop the oldest values, the x order is not known
+            newer = values_x >= values_x.max() - self._duration
+            self._start += int(newer.argmax())
+
+    def _max_length(self):
+        return self._capacity + max(self._capacity // 4, 1)
+
+    def _reserve(self, count):
+        """Make room for count more values after the stored ones"""
+        if self._end + count <= len(self._x):
+            return
+        needed = len(self) + count
+        length = len(self._x)
+        if needed * 2 > length:
+            length = max(needed * 2, self.MIN_LENGTH)
+            if self._capacity is not None:
+                length = max(min(length, self._max_length()), needed)
+        if length != len(self._x):
+            self._reallocate(length)
+        else:
+            # enough room, but it is in front of the values
+            size = len(self)
+            self._x[:size] = self._x[self._start:self._end]
+            self._y[:size] = self._y[self._start:self._end]
+            self._start, self._end = 0, size
+            self._summarize(0)
+
+    def _reallocate(self, length):
+        size = len(self)
+        x = numpy.empty(length)
+        y = numpy.empty(length)
+        x[:size] = self.x
+        y[:size] = self.y
+        self._x, self._y = x, y
+        self._start, self._end = 0, size
+        blocks = -(-length // self.BLOCK_SIZE)
+        self._block_min = numpy.empty(blocks)
+        self._block_max = numpy.empty(blocks)
+        self._summarize(0)
+
+    def _summarize(self, begin):
+        """Update the block summaries after the values from begin to the end
+        were written"""
+        block = begin // self.BLOCK_SIZE
+        block_start = block * self.BLOCK_SIZE
+        block_end = min(block_start + self.BLOCK_SIZE, self._end)
+        if begin < self._end:
+            # the summary of the first block still covers the values before
+            # begin if nothing else was written since
+            extend = begin > block_start and begin == self._summary_end
+            values = self._y[begin if extend else block_start:block_end]
+            minimum = numpy.fmin.reduce(values)
+            maximum = numpy.fmax.reduce(values)
+            if extend:
+                minimum = numpy.fmin(minimum, self._block_min[block])
+                maximum = numpy.fmax(maximum, self._block_max[block])
+            self._block_min[block] = minimum
+            self._block_max[block] = maximum
+
+            # the rest of the blocks at once
+            full_blocks = (self._end - block_end) // self.BLOCK_SIZE
+            full_end = block_end + full_blocks * self.BLOCK_SIZE
+            if full_blocks:
+                values = self._y[block_end:full_end].reshape(full_blocks, self.BLOCK_SIZE)
+                self._block_min[block + 1:block + 1 + full_blocks] = numpy.fmin.reduce(values, axis=1)
+                self._block_max[block + 1:block + 1 + full_blocks] = numpy.fmax.reduce(values, axis=1)
+            if full_end < self._end:
+                values = self._y[full_end:self._end]
+                self._block_min[block + 1 + full_blocks] = numpy.fmin.reduce(values)
+                self._block_max[block + 1 + full_blocks] = numpy.fmax.reduce(values)
+        self._summary_end = self._end
+
+
+def decimate(values_x, values_y, x_min, x_max, buckets):
+    """Reduce values sorted by x to the ones that make a difference on screen
+
+    The range from x_min to x_max is split into buckets of equal width, e.g.
+    one per pixel, and only the values with the minimum and the maximum y of
+    each bucket are kept, in their order. The values right before and after
+    the range are kept too, so lines run to the edges.
+
+    @return: (x, y) arrays of at most 2 * buckets + 2 values
+    """
+    inner_start = values_x.searchsorted(x_min)
+    inner_end = values_x.searchsorted(x_max, side='right')
+    start = max(inner_start - 1, 0)
+    end = min(inner_end + 1, len(values_x))
+    if inner_end - inner_start <= 2 * buckets:
+        return values_x[start:end].copy(), values_y[start:end].copy()
+
+    y = values_y[inner_start:inner_end]
+    count = len(y)
+    edges = numpy.linspace(x_min, x_max, buckets + 1)[1:-1]
+    bucket_starts = numpy.unique(numpy.concatenate(([0], values_x[inner_start:inner_end].searchsorted(edges))))
+    bucket_starts = bucket_starts[bucket_starts < count]
+    bucket_sizes = numpy.diff(numpy.append(bucket_starts, count))
+
+    # fmin and fmax ignore NaN values, so the extremes of a bucket with gaps are kept
+    positions = numpy.arange(count)
+    min_positions = _first_positions(y, positions, numpy.fmin.reduceat(y, bucket_starts), bucket_starts, bucket_sizes)
+    max_positions = _first_positions(y, positions, numpy.fmax.reduceat(y, bucket_starts), bucket_starts, bucket_sizes)
+    indexes = numpy.column_stack((numpy.minimum(min_positions, max_positions),
+                                  numpy.maximum(min_positions, max_positions))).ravel() + inner_start
+    indexes = numpy.concatenate((numpy.arange(start, inner_start), indexes, numpy.arange(inner_end, end)))
+    return values_x[indexes], values_y[indexes]
+
+
+def _first_positions(y, positions, bucket_values, bucket_starts, bucket_sizes):
+    """Get the position of the first y equal to the value of its bucket"""
+    matches = y == numpy.repeat(bucket_values, bucket_sizes)
+    first = numpy.minimum.reduceat(numpy.where(matches, positions, len(y)), bucket_starts)
+    # only buckets of NaN values match nothing
+    return numpy.where(first == len(y), bucket_starts, first)
+
+
+def _is_sorted(values):
+    return len(values) < 2 or bool((values[1:] >= values[:-1]).all())
@@ -51,13 +51,15 @@ class Plot(Plugin):
         self._context = context
 
         self._args = self._parse_args(context.argv())
-        self._widget = PlotWidget(initial_topics=self._args.topics, start_paused=self._args.start_paused)
+        self._widget = PlotWidget(initial_topics=self._args.topics, start_paused=self._args.start_paused,
+                                  raw=self._args.raw)
         self._data_plot = DataPlot(self._widget)
 
         # disable autoscaling of X, and set a sane default range
         self._data_plot.set_autoscale(x=False)
         self._data_plot.set_autoscale(y=DataPlot.SCALE_EXTEND|DataPlot.SCALE_VISIBLE)
         self._data_plot.set_xlim([0, 10.0])
+        self._set_retention_from_args()
 
         self._widget.switch_data_plot_widget(self._data_plot)
         if context.serial_number() > 1:
@@ -108,8 +110,24 @@ class Plot(Plugin):
             help='Start in paused state')
         group.add_argument('-e', '--empty', action='store_true', dest='start_empty',
             help='Start without restoring previous topics')
+        group.add_argument('--raw', action='store_true', dest='raw',
+            help='Read numeric fields directly from the serialized messages where possible, without deserializing them')
+        group.add_argument('--history', type=float, dest='history_duration', metavar='SECS',
+            help='Keep only the last SECS seconds of data of each curve (0 for no limit)')
+        group.add_argument('--history-samples', type=int, dest='history_samples', metavar='N',
+            help='Keep only the last N values of each curve (0 for no limit, default %d)' % DataPlot.DEFAULT_RETENTION_SAMPLES)
+        group.add_argument('--history-memory', type=float, dest='history_memory', metavar='MB',
+            help='Limit the data of all curves to MB megabytes (0 for no limit)')
         group.add_argument('topics', nargs='*', default=[], help='Topics to plot')
 
+    def _set_retention_from_args(self):
+        memory = None
+        if self._args.history_memory is not None:
+            memory = int(self._args.history_memory * 1024 * 1024)
+        self._data_plot.set_retention(duration=self._args.history_duration,
+                                      samples=self._args.history_samples,
+                                      memory=memory)
+
     def _update_title(self):
         self._widget.setWindowTitle(self._data_plot.getTitle())
         if self._context.serial_number() > 1:
@@ -134,6 +152,8 @@ class Plot(Plugin):
                     self._widget.add_topic(topic)
 
         self._data_plot.restore_settings(plugin_settings, instance_settings)
+        # the command line takes precedence over the saved settings
+        self._set_retention_from_args()
 
     def trigger_configuration(self):
         self._data_plot.doSettingsDialog()
@@ -44,7 +44,7 @@ import rospy
 from rqt_py_common.topic_completer import TopicCompleter
 from rqt_py_common import topic_helpers
 
-from . rosplot import ROSData, RosPlotException
+from . rosplot import ROSData, RosPlotException, parse_field
 
 def get_plot_fields(topic_name):
     topic_type, real_topic, _ = topic_helpers.get_topic_type(topic_name)
@@ -58,11 +58,12 @@ def get_plot_fields(topic_name):
 
     fields = [f for f in field_name.split('/') if f]
 
+    has_slice = False
     for field in fields:
-        # parse the field name for an array index
+        # parse the field name for an array index, [*] or slice
         try:
-            field, _, field_index = roslib.msgs.parse_type(field)
-        except roslib.msgs.MsgSpecException:
+            field, field_index = parse_field(field)
+        except ValueError:
             message = "invalid field %s in topic %s" % ( field, real_topic )
             return [], message
 
@@ -71,6 +72,14 @@ def get_plot_fields(topic_name):
             return [], message
         slot_type = field_class._slot_types[field_class.__slots__.index(field)]
         slot_type, slot_is_array, array_size = roslib.msgs.parse_type(slot_type)
+        if field_index is not None and not slot_is_array:
+            message = "field %s in topic %s is not an array" % ( field, real_topic )
+            return [], message
+        if isinstance(field_index, slice):
+            if has_slice:
+                message = "only one [*] or slice allowed in %s" % ( topic_name )
+                return [], message
+            has_slice = True
         is_array = slot_is_array and field_index is None
 
         field_class = topic_helpers.get_type_class(slot_type)
@@ -78,12 +87,18 @@ def get_plot_fields(topic_name):
     if field_class in (int, float, bool):
         topic_kind = 'boolean' if field_class == bool else 'numeric'
         if is_array:
+            if has_slice:
+                message = "topic %s is an array of %s arrays" % ( topic_name, topic_kind )
+                return [], message
             if array_size is not None:
                 message = "topic %s is fixed-size %s array" % ( topic_name, topic_kind )
                 return [ "%s[%d]" % (topic_name, i) for i in range(array_size) ], message
             else:
-                message = "topic %s is variable-size %s array" % ( topic_name, topic_kind )
-                return [], message
+                message = "topic %s is variable-size %s array, plotted as one curve per element" % ( topic_name, topic_kind )
+                return [ "%s[*]" % topic_name ], message
+        elif has_slice:
+            message = "topic %s selects %s values, plotted as one curve per element" % ( topic_name, topic_kind )
+            return [ topic_name ], message
         else:
             message = "topic %s is %s" % ( topic_name, topic_kind )
             return [ topic_name ], message
@@ -113,11 +128,13 @@ def is_plottable(topic_name):
 class PlotWidget(QWidget):
     _redraw_interval = 40
 
-    def __init__(self, initial_topics=None, start_paused=False):
+    def __init__(self, initial_topics=None, start_paused=False, raw=False):
         super(PlotWidget, self).__init__()
         self.setObjectName('PlotWidget')
 
         self._initial_topics = initial_topics
+        # read fields from the serialized messages where possible
+        self._raw = raw
 
         rp = rospkg.RosPack()
         ui_file = os.path.join(rp.get_path('rqt_plot'), 'resource', 'plot.ui')
@@ -138,6 +155,7 @@ class PlotWidget(QWidget):
 
         self._start_time = rospy.get_time()
         self._rosdata = {}
+        self._topic_curves = {}  # topic name -> names of its curves in the plot
         self._remove_topic_menu = QMenu()
 
         # init and start update timer for plot
@@ -165,8 +183,9 @@ class PlotWidget(QWidget):
             self._initial_topics = None
         else:
             for topic_name, rosdata in self._rosdata.items():
-                data_x, data_y = rosdata.next()
-                self.data_plot.add_curve(topic_name, topic_name, data_x, data_y)
+                for curve_name in self._topic_curves[topic_name]:
+                    self.data_plot.add_curve(curve_name, curve_name, [], [])
+                self._add_values(topic_name, rosdata)
 
         self._subscribed_topics_changed()
 
@@ -239,15 +258,30 @@ class PlotWidget(QWidget):
             needs_redraw = False
             for topic_name, rosdata in self._rosdata.items():
                 try:
-                    data_x, data_y = rosdata.next()
-                    if data_x or data_y:
-                        self.data_plot.update_values(topic_name, data_x, data_y)
+                    if self._add_values(topic_name, rosdata):
                         needs_redraw = True
                 except RosPlotException as e:
                     qWarning('PlotWidget.update_plot(): error in rosplot: %s' % e)
             if needs_redraw:
                 self.data_plot.redraw()
 
+    def _add_values(self, topic_name, rosdata):
+        """Hand the new data of a topic to the plot, adding the curves that
+        appear, e.g. for new elements of a [*] field
+
+        :returns: whether there was new data
+        """
+        has_data = False
+        curves = self._topic_curves[topic_name]
+        for curve_name, data_x, data_y in rosdata.next_curves():
+            if curve_name not in curves:
+                self.data_plot.add_curve(curve_name, curve_name, data_x, data_y)
+                curves.append(curve_name)
+            elif len(data_x):
+                self.data_plot.update_values(curve_name, data_x, data_y)
+            has_data = has_data or len(data_x) > 0
+        return has_data
+
     def _subscribed_topics_changed(self):
         self._update_remove_topic_menu()
         if not self.pause_button.isChecked():
@@ -278,13 +312,13 @@ class PlotWidget(QWidget):
             if topic_name in self._rosdata:
                 qWarning('PlotWidget.add_topic(): topic already subscribed: %s' % topic_name)
                 continue
-            self._rosdata[topic_name] = ROSData(topic_name, self._start_time)
+            self._rosdata[topic_name] = ROSData(topic_name, self._start_time, raw=self._raw)
             if self._rosdata[topic_name].error is not None:
                 qWarning(str(self._rosdata[topic_name].error))
                 del self._rosdata[topic_name]
             else:
-                data_x, data_y = self._rosdata[topic_name].next()
-                self.data_plot.add_curve(topic_name, topic_name, data_x, data_y)
+                self._topic_curves[topic_name] = []
+                self._add_values(topic_name, self._rosdata[topic_name])
                 topics_changed = True
 
         if topics_changed:
@@ -293,20 +327,24 @@ class PlotWidget(QWidget):
     def remove_topic(self, topic_name):
         self._rosdata[topic_name].close()
         del self._rosdata[topic_name]
-        self.data_plot.remove_curve(topic_name)
+        for curve_name in self._topic_curves.pop(topic_name):
+            self.data_plot.remove_curve(curve_name)
 
         self._subscribed_topics_changed()
 
     def clear_plot(self):
-        for topic_name, _ in self._rosdata.items():
-            self.data_plot.clear_values(topic_name)
+        for curve_names in self._topic_curves.values():
+            for curve_name in curve_names:
+                self.data_plot.clear_values(curve_name)
         self.data_plot.redraw()
 
     def clean_up_subscribers(self):
         for topic_name, rosdata in self._rosdata.items():
             rosdata.close()
-            self.data_plot.remove_curve(topic_name)
+            for curve_name in self._topic_curves[topic_name]:
+                self.data_plot.remove_curve(curve_name)
         self._rosdata = {}
+        self._topic_curves = {}
 
         self._subscribed_topics_changed()
 
@@ -33,13 +33,17 @@
 # POSSIBILITY OF SUCH DAMAGE.
 #
 
-import string
+import re
+import struct
 import sys
 import threading
 import time
 
+import numpy
+
 import rosgraph
 import roslib.message
+import roslib.msgs
 import roslib.names
 import rospy
 from std_msgs.msg import Bool
@@ -88,15 +92,105 @@ def get_topic_type(topic):
         return None, None, None
 
 
+class TopicSubscription(object):
+    """
+    Subscriber to ROS topic shared by the ROSData of all plotted fields of the topic
+
+    Each message is received and deserialized once and handed to every ROSData.
+    In raw mode, the serialized messages are received instead, the fields of
+    ROSData with a raw accessor are unpacked from them directly, and the
+    message is only deserialized if some other ROSData needs it.
+    """
+
+    _lock = threading.Lock()
+    _subscriptions = {}  # (topic, type, raw) -> TopicSubscription
+
+    def __init__(self, real_topic, data_class, raw=False):
+        self._key = (real_topic, data_class._type, raw)
+        self._data_class = data_class
+        self._listeners = []
+        if raw:
+            self.sub = rospy.Subscriber(real_topic, rospy.AnyMsg, self._raw_cb)
+        else:
+            self.sub = rospy.Subscriber(real_topic, data_class, self._ros_cb)
+
+    @classmethod
+    def add(cls, real_topic, data_class, rosdata, raw=False):
+        """
+        Hand the messages of the topic to rosdata, subscribing to it if needed
+        """
+        with cls._lock:
+            key = (real_topic, data_class._type, raw)
+            if key not in cls._subscriptions:
+                cls._subscriptions[key] = TopicSubscription(real_topic, data_class, raw)
+            subscription = cls._subscriptions[key]
+            subscription._listeners = subscription._listeners + [rosdata]
+            return subscription
+
+    def remove(self, rosdata):
+        """
+        Stop handing messages to rosdata, unsubscribing if it was the last one
+        """
+        with TopicSubscription._lock:
+            self._listeners = [l for l in self._listeners if l is not rosdata]
+            if not self._listeners:
+                self.sub.unregister()
+                if TopicSubscription._subscriptions.get(self._key) is self:
+                    del TopicSubscription._subscriptions[self._key]
+
+    def _ros_cb(self, msg):
+        """
+        ROS subscriber callback
+        :param msg: ROS message data
+        """
+        # #944: use message header time if present
+        if msg.__class__._has_header:
+            stamp = msg.header.stamp.to_sec()
+        else:
+            stamp = rospy.get_time()
+        # the list is replaced, not changed, when listeners come and go
+        for rosdata in self._listeners:
+            rosdata._add(msg, stamp)
+
+    def _raw_cb(self, raw_msg):
+        """
+        ROS subscriber callback for the serialized messages
+        :param raw_msg: ROS message data, ``rospy.AnyMsg``
+        """
+        buff = raw_msg._buff
+        if self._data_class._has_header:
+            # the stamp follows the seq of the header
+            secs, nsecs = _struct_stamp.unpack_from(buff, 4)
+            stamp = secs + nsecs * 1e-9
+        else:
+            stamp = rospy.get_time()
+        msg = None
+        for rosdata in self._listeners:
+            if rosdata.raw_accessor is not None and rosdata._add_raw(buff, stamp):
+                continue
+            if msg is None:
+                msg = self._data_class()
+                msg.deserialize(buff)
+            rosdata._add(msg, stamp)
+
+
 class ROSData(object):
     """
-    Subscriber to ROS topic that buffers incoming data
+    Buffers the incoming data of a field of a ROS topic
+
+    A field path with ``[*]`` or a slice, e.g. ``/joint_states/position[*]``, selects
+    many values per message, which are plotted as one curve per array element.
     """
 
-    def __init__(self, topic, start_time):
+    def __init__(self, topic, start_time, raw=False):
+        """
+        :param raw: unpack the field from the serialized messages where the message definition
+          allows it, instead of deserializing them, ``bool``
+        """
         self.name = topic
         self.start_time = start_time
         self.error = None
+        self.raw_accessor = None
 
         self.lock = threading.Lock()
         self.buff_x = []
@@ -104,35 +198,54 @@ class ROSData(object):
 
         topic_type, real_topic, fields = get_topic_type(topic)
         if topic_type is not None:
-            self.field_evals = generate_field_evals(fields)
+            self.field_accessor, self.field_slice, self.element_path = compile_field_accessor(fields)
+            self.real_topic = real_topic
             data_class = roslib.message.get_message_class(topic_type)
-            self.sub = rospy.Subscriber(real_topic, data_class, self._ros_cb)
+            if raw and self.field_accessor is not None and self.field_slice is None:
+                try:
+                    self.raw_accessor = RawFieldAccessor(data_class, fields)
+                except ValueError:
+                    # e.g. behind an array of strings, deserialize instead
+                    pass
+            self.sub = TopicSubscription.add(real_topic, data_class, self, raw)
         else:
             self.error = RosPlotException("Can not resolve topic type of %s" % topic)
 
     def close(self):
-        self.sub.unregister()
+        self.sub.remove(self)
 
-    def _ros_cb(self, msg):
+    def _add(self, msg, stamp):
         """
-        ROS subscriber callback
+        Buffer the field of a message
         :param msg: ROS message data
+        :param stamp: time of the message, ``float``
         """
         try:
             self.lock.acquire()
             try:
                 self.buff_y.append(self._get_data(msg))
-                # #944: use message header time if present
-                if msg.__class__._has_header:
-                    self.buff_x.append(msg.header.stamp.to_sec() - self.start_time)
-                else:
-                    self.buff_x.append(rospy.get_time() - self.start_time)
-                #self.axes[index].plot(datax, buff_y)
+                self.buff_x.append(stamp - self.start_time)
             except AttributeError as e:
                 self.error = RosPlotException("Invalid topic spec [%s]: %s" % (self.name, str(e)))
         finally:
             self.lock.release()
 
+    def _add_raw(self, buff, stamp):
+        """
+        Buffer the field of a serialized message
+        :param buff: serialized ROS message data, ``str``
+        :param stamp: time of the message, ``float``
+        :returns: False if the field could not be unpacked, ``bool``
+        """
+        try:
+            value = float(self.raw_accessor.get(buff))
+        except (struct.error, IndexError):
+            return False
+        with self.lock:
+            self.buff_y.append(value)
+            self.buff_x.append(stamp - self.start_time)
+        return True
+
     def next(self):
         """
         Get the next data in the series
@@ -151,55 +264,304 @@ class ROSData(object):
             self.lock.release()
         return buff_x, buff_y
 
+    def next_curves(self):
+        """
+        Get the next data of each curve of the series, which is one curve, or
+        one per array element if the field path has ``[*]`` or a slice
+
+        :returns: [(curve name, [xdata], [ydata])]
+        """
+        buff_x, buff_y = self.next()
+        if self.field_slice is None:
+            return [(self.name, buff_x, buff_y)]
+        if not buff_y:
+            return []
+
+        lengths = [len(values) for values in buff_y]
+        curves = []
+        if min(lengths) == max(lengths):
+            # one row per message, one column per element
+            values = numpy.vstack(buff_y)
+            for i in range(values.shape[1]):
+                curves.append((self.get_element_name(i), buff_x, values[:, i]))
+        else:
+            for i in range(max(lengths)):
+                data_x = [x for x, length in zip(buff_x, lengths) if length > i]
+                data_y = [values[i] for values in buff_y if len(values) > i]
+                curves.append((self.get_element_name(i), data_x, data_y))
+        return curves
+
+    def get_element_name(self, i):
+        """
+        :param i: index into the values selected by ``[*]`` or the slice, ``int``
+        :returns: name of the curve of the element, ``str``
+        """
+        start = self.field_slice.start or 0
+        step = self.field_slice.step or 1
+        if start >= 0 and step > 0:
+            return self.real_topic + self.element_path % (start + i * step)
+        # the index into the array depends on its length
+        return '%s[%d]' % (self.name, i)
+
     def _get_data(self, msg):
         val = msg
         try:
-            if not self.field_evals:
+            if self.field_accessor is None:
                 if isinstance(val, Bool):
                     # extract boolean field from bool messages
                     val = val.data
                 return float(val)
-            for f in self.field_evals:
-                val = f(val)
-            return float(val)
+            val = self.field_accessor(val)
+            if self.field_slice is None:
+                return float(val)
+            if isinstance(val, bytes):
+                # uint8 arrays
+                return numpy.frombuffer(val, dtype=numpy.uint8).astype(float)
+            return numpy.asarray(val, dtype=float)
         except IndexError:
             self.error = RosPlotException("[%s] index error for: %s" % (self.name, str(val).replace('\n', ', ')))
-        except TypeError:
+        except (TypeError, ValueError):
             self.error = RosPlotException("[%s] value was not numeric: %s" % (self.name, val))
 
 
-def _array_eval(field_name, slot_num):
+# struct formats of the primitive types, see genpy
+_primitive_structs = dict((field_type, struct.Struct(fmt)) for field_type, fmt in [
+    ('bool', '<B'), ('int8', '<b'), ('uint8', '<B'), ('byte', '<b'), ('char', '<B'),
+    ('int16', '<h'), ('uint16', '<H'), ('int32', '<i'), ('uint32', '<I'),
+    ('int64', '<q'), ('uint64', '<Q'), ('float32', '<f'), ('float64', '<d')])
+_time_size = 8
+_struct_I = _primitive_structs['uint32']
+_struct_stamp = struct.Struct('<2I')
+
+
+class RawFieldAccessor(object):
+    """
+    Unpacks one numeric field from serialized messages of a type, without deserializing them
+
+    The position of the field is computed from the message definition: fixed-size fields in front of
+    it add a constant offset, strings and arrays of fixed-size elements are skipped by reading their
+    length. If the offset is constant, getting the field is a single ``struct.unpack_from``.
+    """
+
+    def __init__(self, data_class, fields):
+        """
+        :param data_class: message class, ``type``
+        :param fields: field path without ``[*]`` or slices, e.g. ``/orientation/x``, ``str``
+        :raises: :exc:`ValueError` if the field cannot be located in the serialized message,
+          e.g. behind an array of strings, or is not numeric
+        """
+        self._fields = fields
+        # ('fixed', size), ('string', None), ('array', element size) or ('index', (index, element size))
+        self._steps = []
+        field_type = data_class._type
+        for field in [f for f in fields.split('/') if f]:
+            field_name, index = parse_field(field)
+            field_type = self._add_field_steps(field_type, field_name)
+            if index is not None:
+                field_type = self._add_index_steps(field_type, index)
+        if field_type not in _primitive_structs:
+            raise ValueError('%s: %s is not numeric' % (fields, field_type))
+        self._unpack_from = _primitive_structs[field_type].unpack_from
+        if all(step == 'fixed' for step, _ in self._steps):
+            offset = sum(size for _, size in self._steps)
+            unpack_from = self._unpack_from
+            self.get = lambda buff: unpack_from(buff, offset)[0]
+
+    def get(self, buff):
+        """
+        :param buff: serialized message, ``str``
+        :returns: value of the field
+        """
+        pos = 0
+        for step, arg in self._steps:
+            if step == 'fixed':
+                pos += arg
+            elif step == 'string':
+                pos += 4 + _struct_I.unpack_from(buff, pos)[0]
+            elif step == 'array':
+                pos += 4 + _struct_I.unpack_from(buff, pos)[0] * arg
+            else:
+                index, element_size = arg
+                if index >= _struct_I.unpack_from(buff, pos)[0]:
+                    raise IndexError('%s: index out of range' % self._fields)
+                pos += 4 + index * element_size
+        return self._unpack_from(buff, pos)[0]
+
+    def _add_fixed(self, size):
+        if self._steps and self._steps[-1][0] == 'fixed':
+            self._steps[-1] = ('fixed', self._steps[-1][1] + size)
+        else:
+            self._steps.append(('fixed', size))
+
+    def _add_field_steps(self, msg_type, field_name):
+        """
+        Add the steps skipping the fields of msg_type in front of field_name
+        :returns: type of the field, ``str``
+        """
+        msg_class = _get_message_class(msg_type)
+        if msg_class is None or field_name not in msg_class.__slots__:
+            raise ValueError('%s has no field %s' % (msg_type, field_name))
+        for slot, slot_type in zip(msg_class.__slots__, msg_class._slot_types):
+            if slot == field_name:
+                return slot_type
+            self._add_skip_steps(slot_type)
+
+    def _add_index_steps(self, array_type, index):
+        """
+        Add the steps to the element at index of an array of fixed-size elements
+        :returns: type of the elements, ``str``
+        """
+        element_type, is_array, length = roslib.msgs.parse_type(array_type)
+        element_size = _get_fixed_size(element_type)
+        if not is_array or element_size is None or index < 0:
+            raise ValueError('%s: cannot index %s' % (self._fields, array_type))
+        if length is None:
+            self._steps.append(('index', (index, element_size)))
+        else:
+            if index >= length:
+                raise ValueError('%s: index out of range' % self._fields)
+            self._add_fixed(index * element_size)
+        return element_type
+
+    def _add_skip_steps(self, field_type):
+        """
+        Add the steps skipping a field of field_type
+        """
+        size = _get_fixed_size(field_type)
+        if size is not None:
+            self._add_fixed(size)
+            return
+        if field_type == 'string':
+            self._steps.append(('string', None))
+            return
+        element_type, is_array, length = roslib.msgs.parse_type(field_type)
+        if is_array:
+            element_size = _get_fixed_size(element_type)
+            if length is None:
+                if element_size is None:
+                    raise ValueError('%s: cannot skip %s' % (self._fields, field_type))
+                self._steps.append(('array', element_size))
+            else:
+                for _ in range(length):
+                    self._add_skip_steps(element_type)
+            return
+        msg_class = _get_message_class(field_type)
+        if msg_class is None:
+            raise ValueError('%s: unknown type %s' % (self._fields, field_type))
+        for slot_type in msg_class._slot_types:
+            self._add_skip_steps(slot_type)
+
+
+def _get_fixed_size(field_type):
     """
-    :param field_name: name of field to index into, ``str``
-    :param slot_num: index of slot to return, ``str``
-    :returns: fn(msg_field)->msg_field[slot_num]
+    :returns: serialized size of the type, or ``None`` if it varies, ``int``
     """
-    def fn(f):
-        return getattr(f, field_name).__getitem__(slot_num)
-    return fn
+    if field_type in _primitive_structs:
+        return _primitive_structs[field_type].size
+    if field_type in ('time', 'duration'):
+        return _time_size
+    if field_type == 'string':
+        return None
+    element_type, is_array, length = roslib.msgs.parse_type(field_type)
+    if is_array:
+        element_size = _get_fixed_size(element_type)
+        if length is None or element_size is None:
+            return None
+        return length * element_size
+    msg_class = _get_message_class(field_type)
+    if msg_class is None:
+        return None
+    size = 0
+    for slot_type in msg_class._slot_types:
+        slot_size = _get_fixed_size(slot_type)
+        if slot_size is None:
+            return None
+        size += slot_size
+    return size
 
 
-def _field_eval(field_name):
+def _get_message_class(msg_type):
+    if msg_type == 'Header':
+        msg_type = 'std_msgs/Header'
+    try:
+        return roslib.message.get_message_class(msg_type)
+    except Exception:
+        return None
+
+
+_FIELD_PATTERN = re.compile(r'^([A-Za-z_]\w*)(?:\[([^\]]*)\])?$')
+
+
+def parse_field(field):
     """
-    :param field_name: name of field to return, ``str``
-    :returns: fn(msg_field)->msg_field.field_name
+    Parse one level of a field path
+
+    :param field: field name with an optional index, ``[*]`` or slice, e.g. ``position[2:4]``, ``str``
+    :returns: field name, and ``None``, the index or a ``slice``, ``(str, object)``
+    :raises: :exc:`ValueError` if the field cannot be parsed
     """
-    def fn(f):
-        return getattr(f, field_name)
-    return fn
+    match = _FIELD_PATTERN.match(field)
+    if match is None:
+        raise ValueError('invalid field [%s]' % field)
+    field_name, selector = match.groups()
+    if selector is None:
+        return field_name, None
+    if selector == '*':
+        return field_name, slice(None)
+    if ':' in selector:
+        bounds = selector.split(':')
+        if len(bounds) > 3:
+            raise ValueError('invalid slice [%s]' % field)
+        bounds = [int(b) if b.strip() else None for b in bounds]
+        field_slice = slice(*bounds)
+        if field_slice.step == 0:
+            raise ValueError('slice step cannot be zero [%s]' % field)
+        return field_name, field_slice
+    return field_name, int(selector)
+
 
+def compile_field_accessor(fields):
+    """
+    Compile a field path into one function that gets the field from a message
 
-def generate_field_evals(fields):
+    The path is turned into a single Python expression, e.g. ``msg.orientation.x``,
+    so getting the field costs no more than writing it out by hand. At most one
+    level may have ``[*]`` or a slice, which makes the function return the list
+    of selected values.
+
+    :param fields: field path, e.g. ``/orientation/x`` or ``/position[*]``, ``str``
+    :returns: fn(msg)->value or ``None`` for an empty path, the ``slice`` of the
+      path or ``None``, and the path with the slice replaced by ``[%d]``, ``(fn, slice, str)``
+    """
     try:
-        evals = []
-        fields = [f for f in fields.split('/') if f]
-        for f in fields:
-            if '[' in f:
-                field_name, rest = f.split('[')
-                slot_num = string.atoi(rest[:rest.find(']')])
-                evals.append(_array_eval(field_name, slot_num))
+        expression = 'msg'
+        field_slice = None
+        element_path = ''
+        outer = None
+        for field in [f for f in fields.split('/') if f]:
+            field_name, selector = parse_field(field)
+            expression += '.' + field_name
+            if isinstance(selector, slice):
+                if field_slice is not None:
+                    raise ValueError('only one [*] or slice per path')
+                field_slice = selector
+                element_path += '/%s[%%d]' % field_name
+                # the rest of the path applies to each element
+                outer = expression
+                expression = 'element'
+                continue
+            if selector is not None:
+                expression += '[%d]' % selector
+            element_path += '/' + field.replace('%', '%%')
+        if expression == 'msg':
+            return None, None, element_path
+        if field_slice is not None:
+            if expression == 'element':
+                expression = '%s[field_slice]' % outer
             else:
-                evals.append(_field_eval(f))
-        return evals
+                expression = '[%s for element in %s[field_slice]]' % (expression, outer)
+        namespace = {'field_slice': field_slice}
+        exec(compile('def accessor(msg):\n    return %s\n' % expression, '<field %s>' % fields, 'exec'), namespace)
+        return namespace['accessor'], field_slice, element_path
     except Exception as e:
         raise RosPlotException("cannot parse field reference [%s]: %s" % (fields, str(e)))
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2014, Austin Hendrix
+# Copyright (c) 2011, Dorian Scholz, TU Darmstadt
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   * Neither the name of the TU Darmstadt nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+
+import numpy
+
+from rqt_plot.data_plot.curve_buffer import decimate
+
+
+class TestDecimate(unittest.TestCase):
+    def test_keeps_extremes(self):
+        x = numpy.arange(1000, dtype=float)
+        y = numpy.zeros(1000)
+        y[520] = 100
+        y[530] = -50
+        decimated_x, decimated_y = decimate(x, y, 0, 999, 10)
+        self.assertTrue(len(decimated_x) <= 2 * 10 + 2)
+        self.assertIn(100, decimated_y)
+        self.assertIn(-50, decimated_y)
+        self.assertTrue((numpy.diff(decimated_x) >= 0).all())
+
+    def test_nan_in_bucket_of_extreme(self):
+        x = numpy.arange(1000, dtype=float)
+        y = numpy.zeros(1000)
+        y[520] = 100
+        y[550] = numpy.nan
+        decimated_x, decimated_y = decimate(x, y, 0, 999, 10)
+        self.assertIn(100, decimated_y)
+        self.assertIn(520, decimated_x)
+
+    def test_bucket_of_nan(self):
+        x = numpy.arange(1000, dtype=float)
+        y = numpy.zeros(1000)
+        y[500:600] = numpy.nan
+        decimated_x, decimated_y = decimate(x, y, 0, 999, 10)
+        self.assertEqual(len(decimated_x), len(decimated_y))
+        self.assertTrue(numpy.isnan(decimated_y).any())
+
+
+if __name__ == '__main__':
+    unittest.main()